@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+asyncio服务模式 - 用少量线程承载大量并发的SSE进度连接
+
+Flask/Werkzeug模式下每个打开的 /progress/<id> 连接在整个研究期间（数分钟）占用一个工作线程，
+并发观看数受线程数限制。本模式只用标准库asyncio：
+- /progress/<id>：每个连接是一个协程，由进度事件日志的回调唤醒；同一会话的所有观看者共用一个回调，
+  空闲满一个心跳间隔才发送心跳，支持 Last-Event-ID 断点续传（与Flask模式的输出一致）
+- 其它路由（首页模板、/research、/result、/metrics/... 等）：交给线程池中的Flask WSGI应用处理，
+  路由、模板和会话与Flask模式完全相同
+- /metrics/sse：当前连接数和SSE观看者数
+
+用法: python async_server.py --port 8081
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, unquote_to_bytes, urlsplit
+
+import web_interface
+
+_PROGRESS_PATH = re.compile(r"^/progress/([^/]+)$")
+_MAX_HEADER_BYTES = 64 * 1024
+_MAX_BODY_BYTES = 1024 * 1024
+
+SSE_HEADERS = [
+    ("Content-Type", "text/event-stream; charset=utf-8"),
+    ("Cache-Control", "no-cache"),
+    ("Access-Control-Allow-Origin", "*"),
+]
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _LogNotifier:
+    """把一个进度日志的追加/关闭转成事件循环中的唤醒；同一日志的所有观看者共用一个监听回调"""
+
+    def __init__(self, log, loop: asyncio.AbstractEventLoop):
+        self.log = log
+        self.loop = loop
+        self.changed = asyncio.Event()
+        self.viewers = 0
+        self._pending = False
+        log.add_listener(self._on_change)
+
+    def _on_change(self):
+        # 在写入线程中调用：合并连续的追加，每批只向事件循环投递一次唤醒
+        if not self._pending:
+            self._pending = True
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        self._pending = False
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def detach(self):
+        self.log.remove_listener(self._on_change)
+
+
+class AsyncResearchServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081, app=None, wsgi_workers: int = 16,
+                 backlog: int = 4096):
+        """
+        app: 处理非SSE路由的WSGI应用，默认为 web_interface.create_app()
+        wsgi_workers: 运行WSGI请求的线程数（与SSE连接数无关）
+        """
+        self.host = host
+        self.port = port
+        self.app = app or web_interface.create_app()
+        self.backlog = backlog
+        self._executor = ThreadPoolExecutor(max_workers=wsgi_workers, thread_name_prefix="async-wsgi")
+        self._notifiers: Dict[int, _LogNotifier] = {}
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.connections = 0
+        self.sse_viewers = 0
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=self.backlog,
+                                                  limit=_MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"🚀 asyncio服务已启动: {self.url}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    # 在后台线程中运行（测试和负载测试使用）
+    def __enter__(self):
+        started = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True, name="async-server")
+        self._thread.start()
+        started.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._loop is None or self._thread is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for task in [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]:
+                task.cancel()
+            await self._server.wait_closed()
+            self._loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop)
+        self._thread.join()
+        self._thread = None
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'connections': self.connections,
+            'sse_viewers': self.sse_viewers,
+            'watched_sessions': len(self._notifiers),
+            'requests': self.requests,
+            'threads': threading.active_count(),
+        }
+
+    # 请求处理
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            self.requests += 1
+            method, target, headers, body = request
+            path = urlsplit(target).path
+            match = _PROGRESS_PATH.match(path)
+            if method == "GET" and match:
+                query = parse_qs(urlsplit(target).query)
+                cursor = web_interface.parse_last_event_id(
+                    headers.get('last-event-id') or query.get('last_event_id', [None])[0])
+                await self._stream_progress(writer, unquote_to_bytes(match.group(1)).decode("utf-8", "replace"),
+                                            cursor)
+            elif method == "GET" and path == "/metrics/sse":
+                await self._respond(writer, 200, [("Content-Type", "application/json")],
+                                    json.dumps(self.stats()).encode("utf-8"))
+            else:
+                environ = self._environ(method, target, headers, body, writer)
+                status, response_headers, payload = await self._loop.run_in_executor(
+                    self._executor, self._run_wsgi, environ)
+                await self._respond(writer, status, response_headers, payload)
+        except _BadRequest as e:
+            await self._respond(writer, e.status, [("Content-Type", "text/plain; charset=utf-8")],
+                                str(e).encode("utf-8"))
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            print(f"⚠️ asyncio服务处理请求出错: {e}")
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise _BadRequest(413, "请求头过大")
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ")
+        if len(parts) != 3:
+            raise _BadRequest(400, "请求行格式错误")
+        method, target, _ = parts
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise _BadRequest(400, "Content-Length无效")
+        if length > _MAX_BODY_BYTES:
+            raise _BadRequest(413, "请求体过大")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, headers, payload: bytes):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        lines += [f"{name}: {value}" for name, value in headers if name.lower() not in ("content-length", "connection")]
+        lines += [f"Content-Length: {len(payload)}", "Connection: close", "", ""]
+        writer.write("\r\n".join(lines).encode("latin-1") + payload)
+        await writer.drain()
+
+    # SSE
+    async def _stream_progress(self, writer: asyncio.StreamWriter, session_id: str, cursor: int):
+        lines = ["HTTP/1.1 200 OK"] + [f"{name}: {value}" for name, value in SSE_HEADERS] + ["Connection: close", "", ""]
+        writer.write("\r\n".join(lines).encode("latin-1"))
+        session = web_interface.research_sessions.get(session_id)
+        if session is None:
+            writer.write(web_interface.sse_message({'error': '会话不存在'}).encode("utf-8"))
+            await writer.drain()
+            return
+
+        writer.write(web_interface.SSE_RETRY.encode("utf-8"))
+        log = session.progress_log
+        notifier = self._watch(log)
+        self.sse_viewers += 1
+        try:
+            while True:
+                changed = notifier.changed  # 先取唤醒事件再读日志，避免漏掉读之后的追加
+                finished = log.closed or not session.is_running
+                entries = log.read(cursor, timeout=0)
+                if entries:
+                    for seq, progress_data in entries:
+                        writer.write(web_interface.sse_message(progress_data, seq).encode("utf-8"))
+                    cursor = entries[-1][0]
+                    await writer.drain()
+                    continue
+                if finished:
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), web_interface.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(web_interface.SSE_HEARTBEAT.encode("utf-8"))
+                    await writer.drain()
+
+            for message in web_interface.final_messages(session):
+                writer.write(message.encode("utf-8"))
+            await writer.drain()
+        finally:
+            self.sse_viewers -= 1
+            self._unwatch(log)
+
+    def _watch(self, log) -> _LogNotifier:
+        notifier = self._notifiers.get(id(log))
+        if notifier is None:
+            notifier = self._notifiers[id(log)] = _LogNotifier(log, self._loop)
+        notifier.viewers += 1
+        return notifier
+
+    def _unwatch(self, log):
+        notifier = self._notifiers[id(log)]
+        notifier.viewers -= 1
+        if notifier.viewers == 0:
+            notifier.detach()
+            del self._notifiers[id(log)]
+
+    # WSGI桥接
+    def _environ(self, method: str, target: str, headers: Dict[str, str], body: bytes, writer) -> Dict[str, Any]:
+        parts = urlsplit(target)
+        peer = writer.get_extra_info("peername") or ("", 0)
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': "",
+            'PATH_INFO': unquote_to_bytes(parts.path).decode("latin-1"),
+            'QUERY_STRING': parts.query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': str(self.port),
+            'SERVER_PROTOCOL': "HTTP/1.1",
+            'REMOTE_ADDR': peer[0],
+            'CONTENT_TYPE': headers.get('content-type', ""),
+            'CONTENT_LENGTH': str(len(body)) if body else "",
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': "http",
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            if name not in ('content-type', 'content-length'):
+                environ['HTTP_' + name.upper().replace("-", "_")] = value
+        return environ
+
+    def _run_wsgi(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(" ", 1)[0])
+            response['headers'] = headers
+
+        result = self.app(environ, start_response)
+        try:
+            payload = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response['status'], response['headers'], payload
+
+
+def serve(host: str = "0.0.0.0", port: int = 8081):
+    asyncio.run(AsyncResearchServer(host, port).serve_forever())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deep Researcher Web界面（asyncio服务模式）")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+基准测试 - 多次重复运行研究场景，统计延迟分位数和资源消耗，并与基线对比
+
+每个场景（引擎 + 问题）先预热若干次，再重复运行N次，每次使用新的研究器，记录：
+墙钟时间、各阶段耗时（StageTimer）、LLM调用次数与prompt/completion token、arXiv HTTP调用次数、峰值内存（tracemalloc）。
+汇总为 p50/p95/p99 等统计量，保存为JSON基线；compare 命令在指标退化超过阈值时以非零状态退出，可用作CI门禁。
+
+运行环境：
+    mock   本地模拟LLM和arXiv服务（默认，结果可复现，无需网络）
+    replay 从research_trace录制的trace文件回放
+    live   真实LLM和arXiv
+
+用法：
+    python benchmark.py run --trials 5 --warmup 1 --out baseline.json
+    python benchmark.py run --out current.json
+    python benchmark.py compare baseline.json current.json --threshold 0.1
+"""
+
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import research_events as events
+from research_events import StageTimer
+from search_backends import iter_arxiv_tools
+
+RESULT_VERSION = 1
+
+DEFAULT_SCENARIOS = [
+    {'name': "traditional_basic", 'engine': "traditional", 'question': "什么是注意力机制？"},
+    {'name': "agent_basic", 'engine': "agent", 'question': "什么是注意力机制？"},
+]
+
+# compare时检查的指标（都是越小越好）及默认的绝对噪声下限：差值小于下限时不视为退化
+GATED_METRICS = {
+    'wall_p50': 0.01,
+    'wall_p95': 0.01,
+    'llm_calls': 0,
+    'prompt_tokens': 0,
+    'completion_tokens': 0,
+    'arxiv_calls': 0,
+    'peak_memory_mb': 0.5,
+}
+
+
+def percentile(values: List[float], p: float) -> float:
+    """线性插值的百分位数（与numpy默认方法一致）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _gateways(researcher) -> List[Any]:
+    seen = {}
+    for tool in iter_arxiv_tools(researcher.search_tool):
+        gateway = getattr(tool, 'gateway', None)
+        if gateway is not None:
+            seen[id(gateway)] = gateway
+    return list(seen.values())
+
+
+def _arxiv_calls(gateways: List[Any]) -> int:
+    return sum(g.stats()['http_calls'] for g in gateways)
+
+
+def run_trial(researcher, question: str, track_memory: bool = True) -> Dict[str, Any]:
+    """运行一次研究并采集指标"""
+    usage = {'llm_calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def on_llm_call(event):
+        usage['llm_calls'] += 1
+        usage['prompt_tokens'] += event.data.get('prompt_tokens', 0)
+        usage['completion_tokens'] += event.data.get('completion_tokens', 0)
+
+    unsubscribe = researcher.events.subscribe(on_llm_call, [events.LLM_CALL])
+    timer = StageTimer(researcher.events)
+    gateways = _gateways(researcher)
+    arxiv_before = _arxiv_calls(gateways)
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        report = researcher.research(question)
+    finally:
+        wall = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if track_memory else 0
+        if track_memory:
+            tracemalloc.stop()
+        timer.close()
+        unsubscribe()
+    return {
+        'wall': round(wall, 4),
+        'stages': {stage: round(total, 4) for stage, total in timer.totals().items()},
+        'arxiv_calls': _arxiv_calls(gateways) - arxiv_before,
+        'peak_memory_mb': round(peak / 1024 / 1024, 3),
+        'report_chars': len(report or ""),
+        **usage,
+    }
+
+
+def summarize(trials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    walls = [t['wall'] for t in trials]
+    n = len(trials)
+    stages = {}
+    for trial in trials:
+        for stage, total in trial['stages'].items():
+            stages.setdefault(stage, []).append(total)
+    return {
+        'trials': n,
+        'wall_p50': round(percentile(walls, 50), 4),
+        'wall_p95': round(percentile(walls, 95), 4),
+        'wall_p99': round(percentile(walls, 99), 4),
+        'wall_mean': round(sum(walls) / n, 4) if n else 0.0,
+        'wall_min': min(walls, default=0.0),
+        'wall_max': max(walls, default=0.0),
+        # 各阶段的平均耗时（未出现该阶段的试验按0计）
+        'stages': {stage: round(sum(values) / n, 4) for stage, values in stages.items()},
+        'llm_calls': sum(t['llm_calls'] for t in trials) / n if n else 0,
+        'prompt_tokens': sum(t['prompt_tokens'] for t in trials) / n if n else 0,
+        'completion_tokens': sum(t['completion_tokens'] for t in trials) / n if n else 0,
+        'arxiv_calls': sum(t['arxiv_calls'] for t in trials) / n if n else 0,
+        'peak_memory_mb': max((t['peak_memory_mb'] for t in trials), default=0.0),
+    }
+
+
+def run_scenario(factory: Callable[[str], Any], scenario: Dict[str, Any], trials: int = 5,
+                 warmup: int = 1, track_memory: bool = True) -> Dict[str, Any]:
+    """
+    factory(engine) 每次返回一个新的研究器（查询去重等状态不跨试验共享）
+    """
+    name = scenario['name']
+    for i in range(warmup):
+        print(f"🔥 [{name}] 预热 {i + 1}/{warmup}")
+        run_trial(factory(scenario['engine']), scenario['question'], track_memory=False)
+    results = []
+    for i in range(trials):
+        trial = run_trial(factory(scenario['engine']), scenario['question'], track_memory)
+        print(f"⏱️ [{name}] 第 {i + 1}/{trials} 次: {trial['wall']:.2f} 秒，LLM {trial['llm_calls']} 次，"
+              f"arXiv {trial['arxiv_calls']} 次")
+        results.append(trial)
+    return {**scenario, 'summary': summarize(results), 'trials': results}
+
+
+def run_benchmark(factory: Callable[[str], Any], scenarios: List[Dict[str, Any]], trials: int = 5,
+                  warmup: int = 1, track_memory: bool = True, mode: str = "custom") -> Dict[str, Any]:
+    return {
+        'version': RESULT_VERSION,
+        'created_at': time.time(),
+        'mode': mode,
+        'config': {'trials': trials, 'warmup': warmup, 'track_memory': track_memory},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'scenarios': {s['name']: run_scenario(factory, s, trials, warmup, track_memory) for s in scenarios},
+    }
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.1,
+                    metric_thresholds: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    逐场景比较门禁指标，返回全部比较项；regressed=True表示
+    当前值超过 基线 × (1 + 阈值) 且差值超过该指标的噪声下限
+    """
+    metric_thresholds = metric_thresholds or {}
+    rows = []
+    for name, base in baseline.get('scenarios', {}).items():
+        cur = current.get('scenarios', {}).get(name)
+        if cur is None:
+            continue
+        for metric, noise_floor in GATED_METRICS.items():
+            old = base['summary'].get(metric, 0)
+            new = cur['summary'].get(metric, 0)
+            limit = metric_thresholds.get(metric, threshold)
+            change = (new - old) / old if old else (math.inf if new > old else 0.0)
+            rows.append({
+                'scenario': name,
+                'metric': metric,
+                'baseline': old,
+                'current': new,
+                'change': change,
+                'regressed': new > old * (1 + limit) and new - old > noise_floor,
+            })
+    return rows
+
+
+def _print_comparison(rows: List[Dict[str, Any]]):
+    print(f"{'场景':<22}{'指标':<20}{'基线':>12}{'当前':>12}{'变化':>10}")
+    for row in rows:
+        change = "新增" if math.isinf(row['change']) else f"{row['change']:+.1%}"
+        flag = "  ❌" if row['regressed'] else ""
+        print(f"{row['scenario']:<22}{row['metric']:<20}{row['baseline']:>12.3f}{row['current']:>12.3f}"
+              f"{change:>10}{flag}")
+
+
+def _make_factory(args):
+    """按运行环境构建研究器工厂，返回 (factory, cleanup)"""
+    from deep_research_agentic_by_deepseek import DeepSeekAgenticResearcher
+    from deep_researcher import DeepResearcher
+
+    def create(engine: str):
+        if engine == "traditional":
+            researcher = DeepResearcher("deepseek-v3")
+            researcher.max_rounds = args.max_rounds
+            return researcher
+        if engine == "agent":
+            return DeepSeekAgenticResearcher("deepseek-v3")
+        raise ValueError(f"未知的引擎: {engine}")
+
+    if args.mode == "live":
+        return create, lambda: None
+
+    if args.mode == "replay":
+        from research_trace import TraceReplayer
+
+        def replay_factory(engine):
+            return TraceReplayer(args.trace, latency_scale=args.replay_latency).attach(create(engine))
+
+        return replay_factory, lambda: None
+
+    from mock_servers import MockArxivServer, MockLLMServer, attach_mock_servers
+    llm_server = MockLLMServer(latency=args.mock_latency, tokens_per_second=args.mock_tps).start()
+    arxiv_server = MockArxivServer(latency=args.mock_arxiv_latency).start()
+
+    def mock_factory(engine):
+        return attach_mock_servers(create(engine), llm_server, arxiv_server)
+
+    def cleanup():
+        llm_server.stop()
+        arxiv_server.stop()
+
+    return mock_factory, cleanup
+
+
+def _parse_metric_thresholds(items: List[str]) -> Dict[str, float]:
+    thresholds = {}
+    for item in items or []:
+        metric, _, value = item.partition("=")
+        if metric not in GATED_METRICS or not value:
+            raise SystemExit(f"无效的指标阈值: {item}（可用指标: {', '.join(GATED_METRICS)}）")
+        thresholds[metric] = float(value)
+    return thresholds
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Deep Research 基准测试")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='运行基准测试并保存结果')
+    run.add_argument('--scenarios', help='场景JSON文件：[{"name", "engine": traditional|agent, "question"}]')
+    run.add_argument('--trials', '-n', type=int, default=5, help='每个场景的重复次数 (默认: 5)')
+    run.add_argument('--warmup', type=int, default=1, help='每个场景的预热次数 (默认: 1)')
+    run.add_argument('--out', default='benchmark_results.json', help='结果文件 (默认: benchmark_results.json)')
+    run.add_argument('--mode', choices=['mock', 'replay', 'live'], default='mock', help='运行环境 (默认: mock)')
+    run.add_argument('--trace', help='replay模式使用的trace文件')
+    run.add_argument('--replay-latency', type=float, help='回放时按录制耗时的比例等待（默认不等待）')
+    run.add_argument('--mock-latency', type=float, default=0.05, help='模拟LLM首字延迟（秒，默认0.05）')
+    run.add_argument('--mock-tps', type=float, default=2000, help='模拟LLM输出速度（tokens/秒，默认2000）')
+    run.add_argument('--mock-arxiv-latency', type=float, default=0.05, help='模拟arXiv响应延迟（秒，默认0.05）')
+    run.add_argument('--max-rounds', type=int, default=3, help='传统引擎最大搜索轮数 (默认: 3)')
+    run.add_argument('--no-memory', action='store_true', help='不统计峰值内存（tracemalloc会增加耗时）')
+
+    compare = sub.add_parser('compare', help='与基线对比，指标退化超过阈值时返回非零状态')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.1, help='允许的相对退化 (默认: 0.1)')
+    compare.add_argument('--metric-threshold', action='append', metavar='METRIC=RATIO',
+                         help='单独设置某个指标的阈值，例如 wall_p95=0.25')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+        rows = compare_results(baseline, current, args.threshold, _parse_metric_thresholds(args.metric_threshold))
+        _print_comparison(rows)
+        regressions = [r for r in rows if r['regressed']]
+        if regressions:
+            print(f"\n❌ {len(regressions)} 项指标退化超过阈值")
+            return 1
+        print("\n✅ 未发现性能退化")
+        return 0
+
+    if args.mode == 'replay' and not args.trace:
+        parser.error("replay模式需要 --trace")
+    scenarios = DEFAULT_SCENARIOS
+    if args.scenarios:
+        with open(args.scenarios, encoding='utf-8') as f:
+            scenarios = json.load(f)
+
+    factory, cleanup = _make_factory(args)
+    try:
+        results = run_benchmark(factory, scenarios, args.trials, args.warmup, not args.no_memory, args.mode)
+    finally:
+        cleanup()
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print(f"\n📊 基准测试完成，结果已保存: {args.out}")
+    for name, scenario in results['scenarios'].items():
+        s = scenario['summary']
+        print(f"- {name}: p50 {s['wall_p50']:.2f}s | p95 {s['wall_p95']:.2f}s | p99 {s['wall_p99']:.2f}s | "
+              f"LLM {s['llm_calls']:.1f} 次 | token {s['prompt_tokens']:.0f}+{s['completion_tokens']:.0f} | "
+              f"arXiv {s['arxiv_calls']:.1f} 次 | 峰值内存 {s['peak_memory_mb']:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
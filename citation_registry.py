@@ -0,0 +1,116 @@
+"""
+引用登记表 - 单次研究内的citation编号、查找与内存管理
+
+每次研究开始时新建，负责分配连续的citation编号，并维护按编号和按论文ID的两个索引；
+研究结束后release()释放对论文对象的引用，只保留计数，长期运行的进程内存不会随研究次数增长。
+对外保持与原来 citations 字典相同的只读接口（键为 "citation:N"）。
+"""
+
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from search_tool import SearchResult
+from search_backends import normalize_paper_key
+
+PREFIX = "citation:"
+
+
+def citation_number(key) -> int:
+    """"citation:3" / "3" / 3 → 3"""
+    if isinstance(key, int):
+        return key
+    return int(str(key).replace(PREFIX, "").strip())
+
+
+class CitationRegistry:
+    def __init__(self, start: int = 0):
+        self._lock = threading.Lock()
+        self.count = start  # 已分配的最大编号，release后仍保留
+        self._by_number: Dict[int, SearchResult] = {}
+        self._by_paper: Dict[str, int] = {}  # 论文合并键 → 首次分配的编号
+        self.released = False
+
+    @classmethod
+    def restore(cls, results: Iterable[SearchResult], count: Optional[int] = None) -> "CitationRegistry":
+        """从已带citation的结果（如检查点）重建登记表"""
+        registry = cls()
+        for result in results:
+            citation = getattr(result, 'citation', None)
+            if citation:
+                registry._index(citation_number(citation), result)
+        registry.count = count if count is not None else max(registry._by_number, default=0)
+        return registry
+
+    def register(self, result: SearchResult) -> str:
+        """分配下一个citation编号并写回result.citation"""
+        with self._lock:
+            self.count += 1
+            self._index(self.count, result)
+            key = f"{PREFIX}{self.count}"
+        result.citation = key
+        return key
+
+    def register_all(self, results: Iterable[SearchResult]) -> List[SearchResult]:
+        results = list(results)
+        for result in results:
+            self.register(result)
+        return results
+
+    def _index(self, number: int, result: SearchResult):
+        self._by_number[number] = result
+        self._by_paper.setdefault(normalize_paper_key(result), number)
+
+    def get(self, key, default=None) -> Optional[SearchResult]:
+        try:
+            return self._by_number.get(citation_number(key), default)
+        except ValueError:
+            return default
+
+    def citation_for(self, paper: SearchResult) -> Optional[str]:
+        """按论文ID（无ID时按标题）查找首次出现时的citation"""
+        number = self._by_paper.get(normalize_paper_key(paper))
+        return f"{PREFIX}{number}" if number is not None else None
+
+    def export(self) -> List[Dict[str, Any]]:
+        """导出精简的引用列表（可JSON化），用于持久化和前端展示"""
+        return [{
+            'citation': f"{PREFIX}{number}",
+            'title': result.title,
+            'url': result.url,
+            'authors': list(result.authors or []),
+            'date_published': result.date_published,
+            'paper_id': result.paper_id,
+            'snippet': (result.snippet or "")[:300],
+        } for number, result in sorted(self._by_number.items())]
+
+    def release(self):
+        """研究结束：释放论文对象，只保留计数"""
+        with self._lock:
+            self._by_number = {}
+            self._by_paper = {}
+            self.released = True
+
+    # 兼容原来的 citations 字典接口
+    def __getitem__(self, key) -> SearchResult:
+        result = self.get(key)
+        if result is None:
+            raise KeyError(key)
+        return result
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._by_number)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def keys(self) -> List[str]:
+        return [f"{PREFIX}{n}" for n in self._by_number]
+
+    def values(self) -> List[SearchResult]:
+        return list(self._by_number.values())
+
+    def items(self) -> List[Tuple[str, SearchResult]]:
+        return [(f"{PREFIX}{n}", r) for n, r in self._by_number.items()]
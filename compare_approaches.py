@@ -7,20 +7,74 @@
 2. DeepSeek Agent原生tool调用方式 (deep_research_agentic_by_deepseek.py)
 
 通过多个测试用例来分析两种方法在效率、准确性、用户体验等方面的差异。
+各测试用例和两种方法并发运行，每次运行使用状态独立的研究器；可选的共享检索缓存
+让两种方法对相同查询看到完全相同的arXiv数据。并发运行时先检索到某个查询的一方承担网络耗时，
+后到的一方直接命中缓存，因此每次运行分别统计检索耗时（有检索进行中的墙钟时间）和引擎耗时（其余时间），
+效率对比使用引擎耗时，不受谁先检索的影响。
 """
 
+import argparse
+import itertools
+import threading
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 from deep_researcher import DeepResearcher
 from deep_research_agentic_by_deepseek import DeepSeekAgenticResearcher
+from mock_servers import MockArxivServer, MockLLMServer, attach_mock_servers
+from search_cache import SearchResultCache
+
+class _SearchClock:
+    """统计一次运行中至少有一个检索在进行的墙钟时间（并发的多个检索只计一次）"""
+    
+    def __init__(self, search_tool):
+        self.busy = 0.0
+        self._active = 0
+        self._since = 0.0
+        self._lock = threading.Lock()
+        search_papers = search_tool.search_papers
+        
+        def timed_search_papers(*args, **kwargs):
+            self._enter()
+            try:
+                return search_papers(*args, **kwargs)
+            finally:
+                self._exit()
+        
+        # 只替换本次运行fork出的检索工具实例上的方法
+        search_tool.search_papers = timed_search_papers
+    
+    def _enter(self):
+        with self._lock:
+            if self._active == 0:
+                self._since = time.perf_counter()
+            self._active += 1
+    
+    def _exit(self):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self.busy += time.perf_counter() - self._since
+
 
 class ApproachComparator:
     """方法对比器 - 系统性对比两种研究方法"""
     
-    def __init__(self):
+    def __init__(self, max_workers: int = 4, shared_cache: bool = True):
+        """
+        max_workers: 同时进行的研究数（测试用例 × 两种方法）
+        shared_cache: 两种方法共享检索缓存，相同查询只检索一次、结果完全一致
+        """
+        # 配置模板：每次运行从模板fork出状态独立的研究器，模板本身不执行研究
         self.traditional_researcher = DeepResearcher("deepseek-v3")
         self.agent_researcher = DeepSeekAgenticResearcher("deepseek-v3")
+        self.max_workers = max_workers
+        self.search_cache = SearchResultCache() if shared_cache else None
+        if self.search_cache is not None:
+            self.traditional_researcher.search_tool.cache = self.search_cache
+            self.agent_researcher.search_tool.cache = self.search_cache
+        self._run_ids = itertools.count(1)
         
         # 测试用例
         self.test_cases = [
@@ -55,16 +109,19 @@ class ApproachComparator:
             "recommendations": {}
         }
         
-        for test_case in self.test_cases:
-            print(f"\n📝 测试用例: {test_case['question']}")
-            print(f"📂 类别: {test_case['category']}")
-            print("-" * 50)
-            
-            # 执行对比测试
-            case_result = self._compare_single_case(test_case)
-            comparison_results["test_results"].append(case_result)
-            
-            print(f"✅ 测试完成: {test_case['id']}")
+        # 所有测试用例的两种方法一起提交，按测试用例的原始顺序汇总
+        print(f"⚡ {len(self.test_cases)} 个测试用例 × 2 种方法，并发数 {self.max_workers}")
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="compare") as executor:
+            runs = [(test_case,
+                     executor.submit(self._run_approach, "traditional", test_case),
+                     executor.submit(self._run_approach, "agent", test_case))
+                    for test_case in self.test_cases]
+            for test_case, traditional_run, agent_run in runs:
+                case_result = self._build_case_result(test_case, traditional_run.result(), agent_run.result())
+                comparison_results["test_results"].append(case_result)
+        
+        if self.search_cache is not None:
+            print(f"📚 共享检索缓存: {self.search_cache.stats()}")
         
         # 生成整体分析
         comparison_results["overall_analysis"] = self._generate_overall_analysis(
@@ -79,16 +136,33 @@ class ApproachComparator:
         return comparison_results
     
     def _compare_single_case(self, test_case: Dict[str, Any]) -> Dict[str, Any]:
-        """对比单个测试用例"""
-        question = test_case["question"]
-        
-        # 测试传统方法
-        print("🔧 测试传统方法...")
-        traditional_result = self._test_traditional_approach(question)
-        
-        print("🤖 测试DeepSeek Agent方法...")  
-        agent_result = self._test_agent_approach(question)
-        
+        """对比单个测试用例（两种方法依次运行）"""
+        return self._build_case_result(test_case, self._run_approach("traditional", test_case),
+                                       self._run_approach("agent", test_case))
+    
+    def _run_approach(self, approach: str, test_case: Dict[str, Any]) -> Dict[str, Any]:
+        """用状态独立的研究器运行一种方法"""
+        session_id = f"compare-{next(self._run_ids)}-{approach}-{test_case['id']}"
+        if approach == "traditional":
+            print(f"🔧 [{test_case['id']}] 测试传统方法...")
+            researcher = self.traditional_researcher.fork(session_id)
+            clock = _SearchClock(researcher.search_tool)
+            result = self._test_traditional_approach(test_case["question"], researcher)
+        else:
+            print(f"🤖 [{test_case['id']}] 测试DeepSeek Agent方法...")
+            researcher = self.agent_researcher.fork(session_id)
+            clock = _SearchClock(researcher.search_tool)
+            result = self._test_agent_approach(test_case["question"], researcher)
+        # 检索耗时取决于共享缓存中谁先检索，引擎耗时才是两种方法可比的部分
+        result["search_time"] = min(clock.busy, result["time_cost"])
+        result["engine_time"] = result["time_cost"] - result["search_time"]
+        print(f"✅ [{test_case['id']}] {result['approach']}完成，耗时 {result['time_cost']:.1f} 秒"
+              f"（检索 {result['search_time']:.1f} 秒，引擎 {result['engine_time']:.1f} 秒）")
+        return result
+    
+    def _build_case_result(self, test_case: Dict[str, Any], traditional_result: Dict[str, Any],
+                           agent_result: Dict[str, Any]) -> Dict[str, Any]:
+        """汇总一个测试用例两种方法的结果"""
         # 分析结果质量
         quality_analysis = self._analyze_result_quality(
             traditional_result, agent_result, test_case["expected_aspects"]
@@ -101,23 +175,21 @@ class ApproachComparator:
             "quality_analysis": quality_analysis
         }
     
-    def _test_traditional_approach(self, question: str) -> Dict[str, Any]:
+    def _test_traditional_approach(self, question: str, researcher: DeepResearcher = None) -> Dict[str, Any]:
         """测试传统方法"""
+        researcher = researcher or self.traditional_researcher
         try:
-            start_time = time.time()
+            start_time = time.perf_counter()
             
-            # 重置状态
-            self.traditional_researcher.citations = {}
-            self.traditional_researcher.citation_counter = 0
-            
-            result = self.traditional_researcher.research(question)
-            end_time = time.time()
+            # 每次研究自带新的citation登记表，无需手动重置
+            result = researcher.research(question)
+            end_time = time.perf_counter()
             
             return {
                 "success": True,
                 "result": result,
                 "time_cost": end_time - start_time,
-                "citations_count": self.traditional_researcher.citation_counter,
+                "citations_count": researcher.citation_counter,
                 "result_length": len(result),
                 "approach": "传统程序化调用"
             }
@@ -132,23 +204,21 @@ class ApproachComparator:
                 "approach": "传统程序化调用"
             }
     
-    def _test_agent_approach(self, question: str) -> Dict[str, Any]:
+    def _test_agent_approach(self, question: str, researcher: DeepSeekAgenticResearcher = None) -> Dict[str, Any]:
         """测试Agent方法"""
+        researcher = researcher or self.agent_researcher
         try:
-            start_time = time.time()
-            
-            # 重置状态
-            self.agent_researcher.citations = {}
-            self.agent_researcher.citation_counter = 0
+            start_time = time.perf_counter()
             
-            result = self.agent_researcher.research(question)
-            end_time = time.time()
+            # 每次研究自带新的citation登记表，无需手动重置
+            result = researcher.research(question)
+            end_time = time.perf_counter()
             
             return {
                 "success": True,
                 "result": result,
                 "time_cost": end_time - start_time,
-                "citations_count": len(self.agent_researcher.citations),
+                "citations_count": researcher.citation_counter,
                 "result_length": len(result),
                 "approach": "DeepSeek Agent原生模式"
             }
@@ -183,13 +253,17 @@ class ApproachComparator:
                 "winner": "agent" if agent_coverage > trad_coverage else "traditional" if trad_coverage > agent_coverage else "tie"
             }
         
-        # 效率分析
+        # 效率分析（按引擎耗时比较，检索耗时取决于共享缓存中谁先检索）
         if traditional["success"] and agent["success"]:
+            trad_engine = traditional["engine_time"]
+            agent_engine = agent["engine_time"]
             quality_metrics["efficiency"] = {
                 "traditional_time": traditional["time_cost"],
                 "agent_time": agent["time_cost"],
-                "winner": "agent" if agent["time_cost"] < traditional["time_cost"] else "traditional",
-                "time_diff": abs(traditional["time_cost"] - agent["time_cost"])
+                "traditional_engine_time": trad_engine,
+                "agent_engine_time": agent_engine,
+                "winner": "agent" if agent_engine < trad_engine else "traditional",
+                "time_diff": abs(trad_engine - agent_engine)
             }
         
         # 信息丰富度分析
@@ -265,6 +339,8 @@ class ApproachComparator:
         if successful_tests:
             avg_traditional_time = sum(r["traditional_result"]["time_cost"] for r in successful_tests) / len(successful_tests)
             avg_agent_time = sum(r["agent_result"]["time_cost"] for r in successful_tests) / len(successful_tests)
+            avg_traditional_engine = sum(r["traditional_result"]["engine_time"] for r in successful_tests) / len(successful_tests)
+            avg_agent_engine = sum(r["agent_result"]["engine_time"] for r in successful_tests) / len(successful_tests)
             
             avg_traditional_citations = sum(r["traditional_result"]["citations_count"] for r in successful_tests) / len(successful_tests)
             avg_agent_citations = sum(r["agent_result"]["citations_count"] for r in successful_tests) / len(successful_tests)
@@ -273,7 +349,9 @@ class ApproachComparator:
                 "average_time": {
                     "traditional": avg_traditional_time,
                     "agent": avg_agent_time,
-                    "faster": "agent" if avg_agent_time < avg_traditional_time else "traditional"
+                    "traditional_engine": avg_traditional_engine,
+                    "agent_engine": avg_agent_engine,
+                    "faster": "agent" if avg_agent_engine < avg_traditional_engine else "traditional"
                 },
                 "average_citations": {
                     "traditional": avg_traditional_citations,
@@ -385,10 +463,10 @@ class ApproachComparator:
         if "performance_comparison" in results['overall_analysis']:
             perf = results['overall_analysis']['performance_comparison']
             report += f"""
-**平均执行时间**:
-- 传统方法: {perf['average_time']['traditional']:.1f}秒
-- Agent方法: {perf['average_time']['agent']:.1f}秒
-- 更快的方法: {perf['average_time']['faster']}
+**平均执行时间**（括号内为扣除检索后的引擎耗时）:
+- 传统方法: {perf['average_time']['traditional']:.1f}秒（引擎 {perf['average_time']['traditional_engine']:.1f}秒）
+- Agent方法: {perf['average_time']['agent']:.1f}秒（引擎 {perf['average_time']['agent_engine']:.1f}秒）
+- 更快的方法（按引擎耗时）: {perf['average_time']['faster']}
 
 **平均引用数量**:
 - 传统方法: {perf['average_citations']['traditional']:.1f}篇
@@ -407,13 +485,13 @@ class ApproachComparator:
 
 **传统方法**:
 - 成功: {'✅' if result['traditional_result']['success'] else '❌'}
-- 时间: {result['traditional_result']['time_cost']:.1f}秒
+- 时间: {result['traditional_result']['time_cost']:.1f}秒（检索 {result['traditional_result']['search_time']:.1f}秒，引擎 {result['traditional_result']['engine_time']:.1f}秒）
 - 引用: {result['traditional_result']['citations_count']}篇
 - 长度: {result['traditional_result']['result_length']:,}字符
 
 **Agent方法**:
 - 成功: {'✅' if result['agent_result']['success'] else '❌'}
-- 时间: {result['agent_result']['time_cost']:.1f}秒  
+- 时间: {result['agent_result']['time_cost']:.1f}秒（检索 {result['agent_result']['search_time']:.1f}秒，引擎 {result['agent_result']['engine_time']:.1f}秒）
 - 引用: {result['agent_result']['citations_count']}篇
 - 长度: {result['agent_result']['result_length']:,}字符
 """
@@ -468,14 +546,39 @@ class ApproachComparator:
 
 def main():
     """主函数 - 执行完整的对比分析"""
+    parser = argparse.ArgumentParser(description="Deep Research 方法对比分析")
+    parser.add_argument('--mock', action='store_true',
+                        help='使用本地模拟LLM和arXiv服务（无需网络，结果可复现）')
+    parser.add_argument('--mock-latency', type=float, default=0.2, help='模拟LLM首字延迟（秒，默认0.2）')
+    parser.add_argument('--mock-tps', type=float, default=200, help='模拟LLM输出速度（tokens/秒，默认200）')
+    parser.add_argument('--mock-arxiv-latency', type=float, default=0.3, help='模拟arXiv响应延迟（秒，默认0.3）')
+    parser.add_argument('--workers', '-w', type=int, default=4, help='同时进行的研究数 (默认: 4)')
+    parser.add_argument('--no-shared-cache', action='store_true', help='两种方法不共享检索缓存')
+    args = parser.parse_args()
+    
     print("🚀 Deep Research 方法对比分析")
     print("="*60)
     
     # 创建对比器
-    comparator = ApproachComparator()
+    comparator = ApproachComparator(max_workers=args.workers, shared_cache=not args.no_shared_cache)
+    
+    llm_server = arxiv_server = None
+    if args.mock:
+        llm_server = MockLLMServer(latency=args.mock_latency, tokens_per_second=args.mock_tps).start()
+        arxiv_server = MockArxivServer(latency=args.mock_arxiv_latency).start()
+        for researcher in (comparator.traditional_researcher, comparator.agent_researcher):
+            attach_mock_servers(researcher, llm_server, arxiv_server)
+        print(f"🧪 使用本地模拟服务: LLM {llm_server.url} | arXiv {arxiv_server.url}")
     
     # 运行对比分析
-    results = comparator.run_comprehensive_comparison()
+    try:
+        results = comparator.run_comprehensive_comparison()
+    finally:
+        if args.mock:
+            print(f"🧪 模拟LLM: {llm_server.stats()}")
+            print(f"🧪 模拟arXiv: {arxiv_server.stats()}")
+            llm_server.stop()
+            arxiv_server.stop()
     
     # 生成报告
     report = comparator.generate_comparison_report(results)
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+测试共享夹具：Web界面的会话落盘目录、检查点目录和报告存储都放在临时目录，不在工作目录留下文件
+"""
+
+import pytest
+
+SERVICE_NAMES = ('research_sessions', 'research_pool', 'checkpoint_store', 'report_store')
+
+
+@pytest.fixture
+def web_services(tmp_path, monkeypatch):
+    """创建一套指向tmp_path的web_interface服务级资源，测试结束后关闭并恢复"""
+    import web_interface
+
+    for name in SERVICE_NAMES:
+        monkeypatch.setattr(web_interface, name, None)
+    web_interface.init_services(spill_dir=str(tmp_path / "sessions"), checkpoint_dir=str(tmp_path / "checkpoints"),
+                                report_store_path=str(tmp_path / "reports.db"), start_reaper=False)
+    pool, store = web_interface.research_pool, web_interface.report_store
+    yield web_interface
+    pool.shutdown(wait=False)
+    store.close()
@@ -12,9 +12,16 @@ Deep Research Agentic - 基于DeepSeek原生Tool调用规范的实现
 import time
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from search_tool import ArxivSearchTool, SearchResult
-from llm import LLM
+from search_backends import build_default_search_tool
+from citation_registry import CitationRegistry
+from tool_call_parser import ToolCallStreamParser, parse_tool_calls
+from tool_result_cache import ToolResultCache
+import research_events as events
+from research_events import EventBus
+from llm import LLM, estimate_tokens
 
 class DeepSeekAgenticResearcher:
     """
@@ -27,19 +34,60 @@ class DeepSeekAgenticResearcher:
     4. 模拟真实的DeepSeek Agent交互过程
     """
     
-    def __init__(self, llm_model: str = "deepseek-v3"):
+    def __init__(self, llm_model: str = "deepseek-v3", session_id: str = "default",
+                 search_tool: ArxivSearchTool = None, tool_executor: ThreadPoolExecutor = None):
         self.llm = LLM(llm_model)
-        self.search_tool = ArxivSearchTool()
-        self.citations = {}
-        self.citation_counter = 0
+        self.session_id = session_id
+        # 检索工具可注入；默认按环境变量决定是否启用多后端聚合
+        self.search_tool = search_tool or build_default_search_tool(session_id=session_id)
+        self._citations = CitationRegistry()  # 每次研究新建，结束后释放
         self.max_rounds = 5
+        self.events = EventBus()  # 结构化进度事件，无订阅者时零开销
+        # 同一轮工具调用的查询并发执行；arXiv请求频率由进程级网关统一限制
+        # 线程池可注入（fork出的Agent共享父Agent的线程池）
+        self.max_tool_workers = 4
+        self._tool_executor = tool_executor or ThreadPoolExecutor(max_workers=self.max_tool_workers,
+                                                                  thread_name_prefix="agent-tool")
+        self.tool_latencies = []  # 每轮工具调用的耗时
+        # 流式接收响应，每个工具调用的结束标记一到就开始检索（与模型后续生成重叠）
+        self.stream_tool_calls = True
+        # 本次研究内已执行查询的结果；重复或近似重复的查询直接引用前文结果，不再检索
+        self._tool_cache = ToolResultCache()
+        
+        # 提示词中的当前日期，None时取今天；trace回放时固定为录制日期（设置后重建系统提示词）
+        self._current_date: Optional[str] = None
         
         # 构建系统提示词 - 模拟DeepSeek的原生环境
         self.system_prompt = self._build_system_prompt()
+    
+    @property
+    def current_date(self) -> Optional[str]:
+        return self._current_date
+    
+    @current_date.setter
+    def current_date(self, value: Optional[str]):
+        self._current_date = value
+        self.system_prompt = self._build_system_prompt()
         
+    def fork(self, session_id: str) -> "DeepSeekAgenticResearcher":
+        """
+        创建状态独立的Agent（citation编号、查询去重、工具结果缓存各自独立），
+        复制配置，共享LLM、检索网关与缓存、事件总线和工具线程池
+        """
+        agent = DeepSeekAgenticResearcher(getattr(self.llm, 'model_name', ''), session_id=session_id,
+                                          search_tool=self.search_tool.fork(session_id),
+                                          tool_executor=self._tool_executor)
+        agent.llm = self.llm
+        agent.events = self.events
+        agent.max_rounds = self.max_rounds
+        agent.current_date = self.current_date
+        agent.max_tool_workers = self.max_tool_workers
+        agent.stream_tool_calls = self.stream_tool_calls
+        return agent
+    
     def _build_system_prompt(self) -> str:
         """构建DeepSeek原生风格的系统提示词"""
-        current_date = time.strftime("%Y-%m-%d, %A")
+        current_date = self._current_date or time.strftime("%Y-%m-%d, %A")
         
         return f"""The current date is {current_date}. Your primary task is to solve the user's questions, leveraging the appropriate tools as needed.
 
@@ -105,10 +153,39 @@ Your final report should be structured as a professional academic research repor
         3. 何时停止搜索
         4. 如何分析和综合结果
         """
+        self._citations = CitationRegistry()
+        self._tool_cache = ToolResultCache()
+        self.tool_latencies = []
+        try:
+            return self._research(user_question)
+        finally:
+            self._citations.release()
+            self._tool_cache.release()
+    
+    @property
+    def citations(self) -> CitationRegistry:
+        """当前研究的citation登记表"""
+        return self._citations
+    
+    @property
+    def citation_counter(self) -> int:
+        """当前（或上一次）研究分配的citation数量，登记表释放后仍可读取"""
+        return self._citations.count
+    
+    @property
+    def tool_cache_stats(self) -> Dict[str, Any]:
+        """当前（或上一次）研究的工具结果缓存统计，avoided为避免的检索次数"""
+        return self._tool_cache.stats()
+    
+    def _research(self, user_question: str) -> str:
         print(f"🤖 启动DeepSeek Agent研究模式")
         print(f"📝 研究问题: {user_question}")
         print("="*60)
         
+        bus = self.events
+        bus.emit(events.RESEARCH_START, self.session_id, question=user_question, mode="agent")
+        research_start = time.perf_counter()
+        
         # 构建完整的对话上下文
         full_context = f"""{self.system_prompt}
 
@@ -126,7 +203,8 @@ Your final report should be structured as a professional academic research repor
             
             try:
                 # 调用DeepSeek进行推理和决策
-                response = self.llm.response(current_context)
+                with bus.stage('agent_turn', self.session_id, round=round_count):
+                    response, prefetched = self._agent_turn(current_context)
                 print(f"🧠 DeepSeek响应:\n{response[:500]}..." if len(response) > 500 else f"🧠 DeepSeek响应:\n{response}")
                 
                 # 检查是否包含tool调用
@@ -134,7 +212,8 @@ Your final report should be structured as a professional academic research repor
                     print("🔧 检测到工具调用，执行搜索...")
                     
                     # 解析并执行tool调用
-                    tool_results = self._execute_tool_calls(response)
+                    with bus.stage('tool_calls', self.session_id, round=round_count):
+                        tool_results = self._execute_tool_calls(response, prefetched)
                     
                     # 更新对话历史
                     conversation_history += f"\n\nAssistant: {response}"
@@ -147,60 +226,188 @@ Your final report should be structured as a professional academic research repor
                     # 没有tool调用，说明Agent认为已经完成研究
                     print("✅ Agent完成研究，生成最终报告")
                     final_report = self._format_final_report(response, user_question)
+                    bus.emit(events.RESEARCH_END, self.session_id, duration=time.perf_counter() - research_start,
+                             rounds=round_count, report_chars=len(final_report))
                     return final_report
                     
             except Exception as e:
                 print(f"❌ Agent处理出错: {e}")
+                bus.emit(events.ERROR, self.session_id, stage='agent_turn', error=str(e))
                 return self._generate_error_report(user_question, str(e))
         
         # 达到最大轮次限制
         print(f"⚠️  达到最大轮次限制({self.max_rounds}轮)，生成当前结果")
-        return self._generate_timeout_report(user_question, conversation_history)
+        timeout_report = self._generate_timeout_report(user_question, conversation_history)
+        bus.emit(events.RESEARCH_END, self.session_id, duration=time.perf_counter() - research_start,
+                 rounds=round_count, report_chars=len(timeout_report), timed_out=True)
+        return timeout_report
+    
+    def _agent_turn(self, prompt: str):
+        """
+        执行一轮Agent推理，返回 (响应, 已提前发起的查询 {query: Future})
+        
+        LLM支持流式输出时边接收边解析，完整的arxiv_search调用立即提交检索；流式输出为空时退回非流式调用。
+        """
+        prefetched = {}
+        if not self.stream_tool_calls or not hasattr(self.llm, 'stream_response'):
+            return self._llm_response(prompt), prefetched
+        
+        parser = ToolCallStreamParser()
+        
+        def on_delta(delta):
+            for call in parser.feed(delta):
+                for query in self._call_queries(call.name, call.arguments) or []:
+                    if query not in prefetched and self._tool_cache.peek(query) is None:
+                        print(f"⚡ 工具调用已完整，提前检索: {query}")
+                        prefetched[query] = self._tool_executor.submit(
+                            self.search_tool.search_papers, [query], max_results=5
+                        )
+        
+        response = self._llm_response(prompt, on_delta)
+        if not response.strip():
+            # 流式输出为空（例如网关不支持流式）：退回非流式调用，避免把空回复当作最终答案
+            print("⚠️ 流式响应为空，改用非流式调用")
+            return self._llm_response(prompt), prefetched
+        return response, prefetched
+    
+    def _llm_response(self, prompt: str, on_delta=None) -> str:
+        """
+        调用LLM；有订阅者时发布带耗时和token用量的llm_call事件
+        
+        传入on_delta时流式调用，每个输出片段回调一次。
+        """
+        if on_delta is None and not self.events.active:
+            return self.llm.response(prompt)
+        
+        start = time.perf_counter()
+        if on_delta is not None:
+            parts = []
+            for delta in self.llm.stream_response(prompt):
+                parts.append(delta)
+                on_delta(delta)
+            response = "".join(parts)
+        else:
+            response = self.llm.response(prompt)
+        if not self.events.active:
+            return response
+        usage = getattr(self.llm, 'last_usage', None) or {
+            'prompt_tokens': estimate_tokens(prompt),
+            'completion_tokens': estimate_tokens(response),
+            'estimated': True,
+        }
+        self.events.emit(events.LLM_CALL, self.session_id, stage='agent_turn', latency=time.perf_counter() - start,
+                         prompt_chars=len(prompt), completion_chars=len(response or ""), **usage)
+        return response
     
     def _contains_tool_call(self, response: str) -> bool:
         """检查响应是否包含DeepSeek格式的tool调用"""
         return "<|tool▁calls▁begin|>" in response and "<|tool▁calls▁end|>" in response
     
-    def _execute_tool_calls(self, response: str) -> str:
-        """解析并执行DeepSeek格式的tool调用"""
+    def _call_queries(self, tool_name: str, args_str: str):
+        """arxiv_search调用的查询列表；其他工具或参数无法解析时返回None"""
+        if tool_name != "arxiv_search":
+            return None
         try:
-            # 提取tool调用部分
-            tool_pattern = r'<\|tool▁calls▁begin\|>(.*?)<\|tool▁calls▁end\|>'
-            tool_matches = re.findall(tool_pattern, response, re.DOTALL)
-            
-            if not tool_matches:
+            args = json.loads(args_str)
+        except json.JSONDecodeError:
+            return None
+        return [q.strip() for q in args.get("queries", "").split("||") if q.strip()]
+    
+    def _execute_tool_calls(self, response: str, prefetched: Dict[str, Any] = None) -> str:
+        """
+        解析并执行DeepSeek格式的tool调用
+        
+        同一轮中所有工具调用的所有查询并发执行（arXiv请求由进程级网关统一限速），
+        结果按调用和查询的原始顺序组装，citation编号与串行执行一致。
+        prefetched为流式接收时已提前发起的查询。
+        此前轮次执行过的查询（含近似重复）不再检索，返回对前文结果的紧凑引用。
+        """
+        try:
+            calls = parse_tool_calls(response)
+            if not calls:
                 return "未找到有效的工具调用"
             
-            all_results = []
+            # 解析全部工具调用：每项为查询列表，或参数解析失败时的错误信息
+            planned = []
+            for call in calls:
+                if call.name != "arxiv_search":
+                    continue
+                try:
+                    args = json.loads(call.arguments)
+                except json.JSONDecodeError as e:
+                    print(f"❌ 解析工具参数失败: {e}")
+                    planned.append(f"工具调用参数解析失败: {call.arguments}")
+                    continue
+                queries = [q.strip() for q in args.get("queries", "").split("||") if q.strip()]
+                print(f"🔍 执行搜索查询: {queries}")
+                self.events.emit(events.TOOL_CALL, self.session_id, tool="arxiv_search", queries=queries)
+                planned.append(queries)
             
-            for tool_call_block in tool_matches:
-                # 解析每个工具调用
-                call_pattern = r'<\|tool▁call▁begin\|>(.*?)<\|tool▁sep\|>(.*?)<\|tool▁call▁end\|>'
-                calls = re.findall(call_pattern, tool_call_block, re.DOTALL)
-                
-                for tool_name, args_str in calls:
-                    if tool_name.strip() == "arxiv_search":
-                        # 解析参数
+            start = time.perf_counter()
+            # 此前轮次已有结果的查询直接复用
+            cached = {}
+            for item in planned:
+                if isinstance(item, list):
+                    for query in item:
+                        if query not in cached:
+                            hit = self._tool_cache.lookup(query)
+                            if hit is not None:
+                                cached[query] = hit
+            
+            # 同一轮内重复的查询只检索一次（与串行时检索工具跳过已搜索查询的行为一致）
+            futures = dict(prefetched or {})
+            for item in planned:
+                if isinstance(item, list):
+                    for query in item:
+                        if query not in futures and query not in cached:
+                            futures[query] = self._tool_executor.submit(
+                                self.search_tool.search_papers, [query], max_results=5
+                            )
+            
+            all_results = []
+            consumed = set()
+            fresh = []  # 本轮实际检索的 (查询, 结果)
+            for item in planned:
+                if isinstance(item, str):
+                    all_results.append(item)
+                    continue
+                search_results = []
+                references = []
+                for query in item:
+                    results = []
+                    if query in cached:
+                        print(f"♻️ 复用此前查询 '{cached[query]['query']}' 的结果: {query}")
+                        references.append(self._format_cached_reference(query, cached[query]))
+                        if self.events.active:
+                            self.events.emit(events.QUERY_RESULT, self.session_id, query=query, cached=True,
+                                             count=len(cached[query]['results']))
+                        continue
+                    if query not in consumed:
+                        consumed.add(query)
                         try:
-                            args = json.loads(args_str.strip())
-                            queries_str = args.get("queries", "")
-                            queries = [q.strip() for q in queries_str.split("||") if q.strip()]
-                            
-                            print(f"🔍 执行搜索查询: {queries}")
-                            
-                            # 执行搜索
-                            search_results = []
-                            for query in queries:
-                                results = self.search_tool.search_papers([query], max_results=5)
-                                search_results.extend(results)
-                            
-                            # 格式化搜索结果为DeepSeek期望的格式
-                            formatted_results = self._format_search_results_for_deepseek(search_results)
-                            all_results.append(formatted_results)
-                            
-                        except json.JSONDecodeError as e:
-                            print(f"❌ 解析工具参数失败: {e}")
-                            all_results.append(f"工具调用参数解析失败: {args_str}")
+                            results = futures[query].result()
+                            fresh.append((query, results))
+                        except Exception as e:
+                            print(f"❌ 查询 '{query}' 失败: {e}")
+                    search_results.extend(results)
+                    if self.events.active:
+                        self.events.emit(events.QUERY_RESULT, self.session_id, query=query,
+                                         count=len(results), titles=[r.title for r in results[:3]])
+                
+                # 格式化搜索结果为DeepSeek期望的格式（按顺序分配citation）
+                if search_results or not references:
+                    references.insert(0, self._format_search_results_for_deepseek(search_results))
+                all_results.append("\n".join(references))
+            
+            # 结果已分配citation，供后续轮次引用
+            for query, results in fresh:
+                self._tool_cache.store(query, results)
+            
+            latency = time.perf_counter() - start
+            self.tool_latencies.append({'calls': len(planned), 'queries': len(futures),
+                                        'cached': len(cached), 'latency': round(latency, 3)})
+            print(f"⏱️ 本轮 {len(planned)} 个工具调用、{len(futures)} 个查询并发完成，"
+                  f"复用 {len(cached)} 个，耗时 {latency:.1f} 秒")
             
             return "\n\n".join(all_results) if all_results else "搜索未返回结果"
             
@@ -216,10 +423,7 @@ Your final report should be structured as a professional academic research repor
         formatted_text = ""
         for i, result in enumerate(results):
             # 分配citation编号
-            self.citation_counter += 1
-            citation_key = f"citation:{self.citation_counter}"
-            self.citations[citation_key] = result
-            result.citation = citation_key
+            self._citations.register(result)
             
             formatted_text += f"""[paper {i} begin]
 [paper title]{result.title}
@@ -235,12 +439,26 @@ Your final report should be structured as a professional academic research repor
         
         return formatted_text
     
+    def _format_cached_reference(self, query: str, hit: Dict[str, Any]) -> str:
+        """重复查询的紧凑引用：只列出前文已给出结果的citation和标题"""
+        same = "相同" if hit['exact'] else "近似"
+        if not hit['results']:
+            return (f"[cached query] \"{query}\" 与此前的查询 \"{hit['query']}\" {same}，"
+                    f"当时未找到相关论文，请换用不同的关键词。")
+        lines = [f"[cached query] \"{query}\" 与此前的查询 \"{hit['query']}\" {same}，"
+                 f"结果已在前文给出，可直接引用："]
+        lines.extend(f"- [{r.citation}] {r.title}" for r in hit['results'])
+        return "\n".join(lines)
+    
     def _format_final_report(self, agent_response: str, question: str) -> str:
         """格式化Agent的最终响应为标准研究报告"""
         
         # 添加统计信息
         total_papers = len(self.citations)
         unique_dates = list(set([r.date_published for r in self.citations.values() if r.date_published]))
+        tool_queries = sum(t['queries'] for t in self.tool_latencies)
+        tool_seconds = sum(t['latency'] for t in self.tool_latencies)
+        tool_cached = self._tool_cache.avoided
         
         stats_section = f"""
 
@@ -251,6 +469,7 @@ Your final report should be structured as a professional academic research repor
 ### 🔍 搜索概况
 - **检索论文**: {total_papers} 篇学术论文
 - **时间覆盖**: {min(unique_dates, default='未知')} 至 {max(unique_dates, default='未知')}
+- **工具调用**: {len(self.tool_latencies)} 轮，共 {tool_queries} 个查询，累计耗时 {tool_seconds:.1f} 秒，复用重复查询 {tool_cached} 次
 
 ### 📚 论文引用索引
 {self._generate_citation_index()}
@@ -338,12 +557,7 @@ Agent在规定轮次内完成了信息收集，展现了DeepSeek模型的自主
         start_time = time.time()
         agent_result = self.research(question)
         agent_time = time.time() - start_time
-        agent_citations = len(self.citations)
-        
-        # 重置状态，准备传统方法测试
-        traditional_citations_backup = self.citations.copy()
-        self.citations = {}
-        self.citation_counter = 0
+        agent_citations = self.citation_counter
         
         # 导入传统方法进行对比
         try:
@@ -361,9 +575,6 @@ Agent在规定轮次内完成了信息收集，展现了DeepSeek模型的自主
             traditional_time = 0
             traditional_citations = 0
         
-        # 恢复Agent结果
-        self.citations = traditional_citations_backup
-        
         # 生成对比报告
         comparison = {
             "agent_mode": {
@@ -417,7 +628,7 @@ def test_deepseek_agent():
             result = agent.research(question)
             print(f"✅ 研究完成")
             print(f"📊 报告长度: {len(result):,} 字符")
-            print(f"📚 引用论文: {len(agent.citations)} 篇")
+            print(f"📚 引用论文: {agent.citation_counter} 篇")
             
             # 保存结果
             timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -433,10 +644,6 @@ def test_deepseek_agent():
         except Exception as e:
             print(f"❌ 测试失败: {e}")
         
-        # 重置状态
-        agent.citations = {}
-        agent.citation_counter = 0
-        
         print("\n" + "="*50)
 
 if __name__ == "__main__":
@@ -1,71 +1,638 @@
+import asyncio
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from typing import List, Dict, Any, Optional
 from search_tool import ArxivSearchTool, SearchResult
-from llm import LLM
+from search_backends import build_default_search_tool, iter_arxiv_tools, normalize_paper_key
+from research_budget import BudgetExhaustedError, ResearchBudget
+from citation_registry import CitationRegistry
+from search_cache import SearchResultCache
+from report_store import ReportStore
+from report_model import ResearchReport
+from research_checkpoint import CheckpointStore, serialize_results, deserialize_results
+import research_events as events
+from research_events import EventBus
+from llm import LLM, estimate_tokens, is_error_response
+
+
+def _run_sync(coro):
+    """在同步代码中运行协程；若当前线程已有事件循环（如Jupyter），改在独立线程中运行"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+# 最终报告中统计部分的起始标记，之前的部分为核心报告
+_STATS_MARKER = "\n---\n\n## 📊 研究数据统计"
+
 
 class DeepResearcher:
-    def __init__(self, llm_model: str = "gpt-4o"):
+    # research_many为每个问题创建研究器时复制的配置项
+    _CONFIG_ATTRS = ('max_rounds', 'branching', 'max_branch_depth', 'max_branch_fanout', 'report_mode',
+                     'report_single_limit', 'map_batch_size', 'reduce_fan_in', 'synthesis_workers',
+                     'evidence_summary_chars', 'min_novelty', 'reuse_reports', 'current_date')
+    # 使用为最终报告预留的LLM调用额度的阶段（最终报告及其map-reduce综合）
+    _REPORT_STAGES = ('final_report', 'report_map', 'report_reduce')
+    
+    def __init__(self, llm_model: str = "gpt-4o", session_id: str = "default",
+                 search_tool: ArxivSearchTool = None, checkpoint_store: CheckpointStore = None,
+                 budget: ResearchBudget = None, report_store: ReportStore = None):
         self.llm = LLM(llm_model)
-        self.search_tool = ArxivSearchTool()
-        self.citations = {}  # citation编号到结果的映射
-        self.citation_counter = 0
+        self.session_id = session_id
+        # 检索工具可注入；默认按环境变量决定是否启用多后端聚合
+        self.search_tool = search_tool or build_default_search_tool(session_id=session_id)
+        self._citations = CitationRegistry()  # 每次研究新建，结束后释放
+        self.last_citations: List[Dict[str, Any]] = []  # 上一次研究的精简引用列表
+        self.last_report: Optional[ResearchReport] = None  # 上一次研究的结构化报告
+        self.last_report_failed = False  # 上一次报告是否为LLM失败后的备用报告（不写入报告存储）
+        self.current_date: Optional[str] = None  # 提示词中的当前日期，None时取今天；trace回放时固定为录制日期
+        # 报告存储：完成的报告写入存储；reuse_reports时新鲜期内的重复问题直接返回历史报告
+        self.report_store = report_store
+        self.reuse_reports = True
         self.max_rounds = 5  # 最多搜索轮数
+        # 分支探索模式：每个后续查询展开为独立的子研究并发执行
+        self.branching = False
+        self.max_branch_depth = 2  # 分支最大展开深度
+        self.max_branch_fanout = 3  # 每次最多展开的分支数
+        self.budget: Optional[ResearchBudget] = budget  # 全局预算（LLM调用/token/arXiv调用/墙钟时间）
+        # 边际收益：每轮新论文与新领域/术语占比的均值低于该阈值时提前停止（从第2轮起）
+        self.min_novelty = 0.2
+        self.novelty_stats = []  # 每轮的新颖度
+        self.stop_reason = ""  # 提前停止原因
+        # 报告综合方式：single | map_reduce | auto（论文超过report_single_limit篇时使用map_reduce）
+        self.report_mode = "auto"
+        self.report_single_limit = 20
+        self.map_batch_size = 10  # map步骤每批论文数
+        self.reduce_fan_in = 4  # reduce步骤每次合并的发现份数
+        self.synthesis_workers = 4  # map/reduce并行LLM调用数
+        self.evidence_summary_chars = 1500  # 跨轮携带的证据摘要长度上限
+        self.round_stats = []  # 每轮分析的prompt大小和耗时
+        self.checkpoint_store = checkpoint_store  # 设置后每个阶段完成都写检查点，可用resume()续跑
+        self.events = EventBus()  # 结构化进度事件，无订阅者时零开销
+        self._event_session = session_id
+        self.llm_limiter: Optional[threading.BoundedSemaphore] = None  # 多个研究器共享的LLM并发上限
+    
+    @property
+    def citations(self) -> CitationRegistry:
+        """当前研究的citation登记表（按"citation:N"查找论文）"""
+        return self._citations
+    
+    @citations.setter
+    def citations(self, value):
+        self._citations = CitationRegistry.restore(value.values() if hasattr(value, 'values') else value)
+    
+    @property
+    def citation_counter(self) -> int:
+        """当前（或上一次）研究分配的citation数量，登记表释放后仍可读取"""
+        return self._citations.count
+    
+    @citation_counter.setter
+    def citation_counter(self, value: int):
+        self._citations.count = value
         
-    def research(self, user_question: str) -> str:
+    def research(self, user_question: str, session_id: str = None) -> str:
+        """
+        执行深度研究（同步入口，供main.py等调用），内部运行research_async
+        """
+        return _run_sync(self.research_async(user_question, session_id))
+    
+    def resume(self, session_id: str) -> str:
+        """从检查点恢复研究，从最后完成的阶段继续（同步入口）"""
+        return _run_sync(self.resume_async(session_id))
+    
+    async def research_async(self, user_question: str, session_id: str = None) -> str:
         """
         执行深度研究，完全基于search_help.html的流程和prompt
+        
+        异步实现：阻塞的LLM调用放到线程中执行，同一轮的多个查询并发搜索。
+        设置了checkpoint_store时，每个阶段完成后写入检查点。
         """
+        self.last_report = None
+        cached = self._lookup_report(user_question, session_id or self.session_id)
+        if cached is not None:
+            return cached
+        
+        state = {
+            'session_id': session_id or self.session_id,
+            'question': user_question,
+            'current_date': self.current_date or time.strftime("%Y-%m-%d, %A"),
+            'stage': 'started',
+            'rounds': [],
+            'search_round': 1,
+            'current_queries': None,
+            'evidence_summary': "",
+            'search_done': False,
+            # 研究配置和预算上限：resume时按原配置继续，不依赖恢复方重新传入
+            'config': {attr: getattr(self, attr) for attr in self._CONFIG_ATTRS},
+            'budget_limits': self.budget.limits() if self.budget is not None else None,
+        }
+        self._citations = CitationRegistry()
+        self.round_stats = []
+        self.novelty_stats = []
+        self.stop_reason = ""
+        return await self._run_pipeline(state)
+    
+    def research_many(self, questions: List[str], concurrency: int = 4, llm_concurrency: int = None,
+                      on_result=None) -> List[Dict[str, Any]]:
+        """批量研究多个问题（同步入口），返回按问题顺序排列的结果记录"""
+        return _run_sync(self.research_many_async(questions, concurrency, llm_concurrency, on_result))
+    
+    async def research_many_async(self, questions: List[str], concurrency: int = 4, llm_concurrency: int = None,
+                                  on_result=None) -> List[Dict[str, Any]]:
+        """
+        并发研究多个问题
+        
+        每个问题使用独立的研究器（citation编号、查询去重、检查点会话互不干扰），
+        共享LLM客户端、进程级arXiv网关（全局限速）和检索缓存；llm_concurrency限制
+        所有问题同时进行的LLM调用数（默认等于concurrency）。
+        每个问题完成后立即调用on_result(record)，调用方可以增量落盘。
+        """
+        if self.search_tool.cache is None:
+            self.search_tool.cache = SearchResultCache()
+        llm_limiter = threading.BoundedSemaphore(llm_concurrency or concurrency)
+        slots = asyncio.Semaphore(concurrency)
+        records: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+        
+        async def run_one(index: int, question: str):
+            async with slots:
+                worker = self._batch_worker(index, llm_limiter)
+                record = {'index': index, 'question': question, 'session_id': worker.session_id}
+                start = time.perf_counter()
+                try:
+                    record['report'] = await worker.research_async(question, session_id=worker.session_id)
+                    record['papers'] = worker.citation_counter
+                except Exception as e:
+                    print(f"❌ [{index + 1}/{len(questions)}] 研究失败: {question}: {e}")
+                    record['error'] = str(e)
+                record['duration'] = round(time.perf_counter() - start, 2)
+            records[index] = record
+            if on_result is not None:
+                try:
+                    on_result(record)
+                except Exception as e:
+                    print(f"⚠️ 处理研究结果出错: {e}")
+        
+        await asyncio.gather(*(run_one(i, q) for i, q in enumerate(questions)))
+        print(f"📚 批量研究完成，检索缓存: {self.search_tool.cache.stats()}")
+        return records
+    
+    def fork(self, session_id: str) -> "DeepResearcher":
+        """
+        创建状态独立的研究器（citation编号、查询去重、预算统计各自独立），
+        复制配置，共享LLM、检索网关与缓存、事件总线、检查点和报告存储
+        """
+        worker = DeepResearcher(getattr(self.llm, 'model_name', ''), session_id=session_id,
+                                search_tool=self.search_tool.fork(session_id),
+                                checkpoint_store=self.checkpoint_store, report_store=self.report_store)
+        for attr in self._CONFIG_ATTRS:
+            setattr(worker, attr, getattr(self, attr))
+        worker.llm = self.llm
+        worker.events = self.events
+        worker.llm_limiter = self.llm_limiter
+        return worker
+    
+    def _batch_worker(self, index: int, llm_limiter: threading.BoundedSemaphore) -> "DeepResearcher":
+        """为批量研究中的一个问题创建研究器"""
+        worker = self.fork(f"{self.session_id}-{index + 1}")
+        worker.llm_limiter = llm_limiter
+        return worker
+    
+    async def resume_async(self, session_id: str) -> str:
+        """从检查点恢复研究"""
+        if self.checkpoint_store is None:
+            raise ValueError("未配置checkpoint_store，无法恢复研究")
+        state = self.checkpoint_store.load(session_id)
+        if state is None:
+            raise KeyError(f"未找到会话检查点: {session_id}")
+        
+        print(f"♻️ 从检查点恢复研究: {state['question']}（已完成阶段: {state['stage']}）")
+        for attr, value in state.get('config', {}).items():
+            if attr in self._CONFIG_ATTRS:
+                setattr(self, attr, value)
+        if state.get('budget_limits'):
+            self.budget = ResearchBudget(**state['budget_limits'])
+        # 恢复citation编号，保证续跑的新论文编号连续
+        restored = [r for rnd in state['rounds'] for r in deserialize_results(rnd['results'])]
+        self._citations = CitationRegistry.restore(restored, state.get('citation_counter'))
+        self.round_stats = state.get('round_stats', [])
+        self.novelty_stats = [rnd['novelty'] for rnd in state['rounds'] if rnd.get('novelty')]
+        self.stop_reason = state.get('stop_reason', "")
+        # 恢复查询去重记录：已搜索过的查询不再重复检索
+        for tool in iter_arxiv_tools(self.search_tool):
+            tool.searched_queries.update(state.get('searched_queries', []))
+        return await self._run_pipeline(state)
+    
+    async def _run_pipeline(self, state: Dict[str, Any]) -> str:
+        """按阶段推进研究，已完成的阶段（来自检查点）直接跳过"""
+        if state.get('stage') == 'done':
+            return self._finish_from_checkpoint(state)
+        
+        session_id = state['session_id']
+        self._event_session = session_id
+        self.events.emit(events.RESEARCH_START, session_id, question=state['question'],
+                         resumed=state['stage'] != 'started')
+        start_time = time.perf_counter()
+        self.last_report_failed = False
+        try:
+            final_answer = await self._run_stages(state)
+        except Exception as e:
+            self.events.emit(events.ERROR, session_id, stage=state['stage'], error=str(e))
+            raise
+        finally:
+            # 报告已生成（或研究失败）：释放本次研究的论文引用，只保留计数和精简引用列表
+            self.last_citations = self._citations.export()
+            self._citations.release()
+        if self._store_report(state, final_answer, time.perf_counter() - start_time):
+            state['report_stored'] = True
+            self._save_checkpoint(state, 'done')
+        self.events.emit(events.RESEARCH_END, session_id, duration=time.perf_counter() - start_time,
+                         rounds=state['search_round'], report_chars=len(final_answer))
+        return final_answer
+    
+    def _finish_from_checkpoint(self, state: Dict[str, Any]) -> str:
+        """恢复已完成的会话：从检查点重建结构化报告和引用列表，报告还没写入报告存储时补写"""
+        final_answer = state['final_answer']
+        citations = state.get('citations')
+        if citations is None:
+            # 旧检查点没有保存引用列表：由检查点中的论文（含分支论文）重新导出
+            results = [r for rnd in state['rounds'] for r in deserialize_results(rnd['results'])]
+            for finding in state.get('branch_findings', []):
+                results.extend(deserialize_results(finding['results']))
+            citations = CitationRegistry.restore(results).export()
+        self._citations.release()
+        self.last_citations = citations
+        self.last_report_failed = state.get('report_failed', False)
+        self.last_report = ResearchReport.build(
+            state['question'], final_answer, final_answer.split(_STATS_MARKER, 1)[0], citations,
+            dict(state.get('report_stats') or {'rounds': state['search_round']}, resumed=True)
+        )
+        if not state.get('report_stored') and self._store_report(state, final_answer, None):
+            state['report_stored'] = True
+            self._save_checkpoint(state, 'done')
+        return final_answer
+    
+    def _lookup_report(self, question: str, session_id: str) -> Optional[str]:
+        """新鲜期内问过相同（或近似相同）的问题时直接返回历史报告"""
+        if self.report_store is None or not self.reuse_reports:
+            return None
+        try:
+            hit = self.report_store.lookup(question)
+        except Exception as e:
+            print(f"⚠️ 查询报告存储失败: {e}")
+            return None
+        if hit is None:
+            return None
+        
+        print(f"♻️ 命中历史报告（{hit['match']}，相似度{hit['similarity']:.2f}）: {hit['question']}")
+        self.last_citations = hit['citations']
+        self.last_report = ResearchReport.build(
+            question, hit['report'], hit['report'].split(_STATS_MARKER, 1)[0], hit['citations'],
+            {'cached_report_id': hit['id'], 'match': hit['match'], 'rounds': hit['rounds'],
+             'papers': hit['papers'], 'duration': hit['duration']}
+        )
+        self._event_session = session_id
+        self.events.emit(events.RESEARCH_START, session_id, question=question, resumed=False,
+                         cached_report_id=hit['id'])
+        self._emit_report_delta(hit['report'])
+        self.events.emit(events.RESEARCH_END, session_id, duration=0.0, rounds=hit['rounds'] or 0,
+                         report_chars=len(hit['report']), cached_report_id=hit['id'])
+        return hit['report']
+    
+    def _store_report(self, state: Dict[str, Any], final_answer: str, duration: Optional[float]) -> bool:
+        """把有引用的完成报告写入报告存储；LLM失败后的备用报告不写入，避免新鲜期内被当作历史报告秒回"""
+        if self.report_store is None or not self.last_citations or self.last_report_failed:
+            return False
+        try:
+            self.report_store.save(state['question'], final_answer, self.last_citations,
+                                   session_id=state['session_id'],
+                                   duration=round(duration, 2) if duration is not None else None,
+                                   rounds=state['search_round'])
+        except Exception as e:
+            print(f"⚠️ 写入报告存储失败: {e}")
+            return False
+        return True
+    
+    async def _run_stages(self, state: Dict[str, Any]) -> str:
+        user_question = state['question']
+        session_id = state['session_id']
+        bus = self.events
+        
         print(f"🔬 开始深度研究: {user_question}")
         print("=" * 50)
         
-        current_date = time.strftime("%Y-%m-%d, %A")
+        if self.budget is not None:
+            # 恢复研究时接着检查点中的已用额度计数
+            if state.get('budget'):
+                self.budget.restore(state['budget'])
+            else:
+                self.budget.start()
         
         # 第一步：初步思考和规划
-        print("🧠 第一步：逐步思考和推理")
-        initial_analysis = self._initial_thinking(user_question, current_date)
-        print(initial_analysis)
-        
-        all_search_results = []
-        search_round = 1
-        current_queries = None
+        if 'initial_analysis' not in state:
+            print("🧠 第一步：逐步思考和推理")
+            with bus.stage('initial_thinking', session_id):
+                state['initial_analysis'] = await asyncio.to_thread(
+                    self._initial_thinking, user_question, state['current_date']
+                )
+            print(state['initial_analysis'])
+            bus.emit(events.THINKING, session_id, analysis=state['initial_analysis'])
+            self._save_checkpoint(state, 'initial_thinking')
         
         # 从初步分析中提取第一轮搜索查询
-        first_queries = self._extract_first_search_queries(user_question, initial_analysis)
-        current_queries = first_queries
+        if 'first_queries' not in state:
+            with bus.stage('query_generation', session_id):
+                state['first_queries'] = await asyncio.to_thread(
+                    self._extract_first_search_queries, user_question, state['initial_analysis']
+                )
+            state['current_queries'] = state['first_queries']
+            self._save_checkpoint(state, 'queries')
+        
+        all_search_results = [r for rnd in state['rounds'] for r in deserialize_results(rnd['results'])]
+        
+        if state.get('branch_queries') and not state['search_done']:
+            # 检查点停在分支展开过程中：从分支展开前的状态重新展开
+            print(f"🌿 重新展开 {len(state['branch_queries'][:self.max_branch_fanout])} 个并发分支")
+            await self._run_branches(state)
+            self._save_checkpoint(state, f"round_{state['search_round']}_analysis")
         
         # 开始迭代搜索循环
-        while current_queries and search_round <= self.max_rounds:
-            print(f"\n🔍 第{search_round}轮搜索")
-            print(f"搜索查询: {current_queries}")
+        while not state['search_done']:
+            search_round = state['search_round']
+            current_queries = state['current_queries']
+            if not current_queries or search_round > self.max_rounds:
+                break
             
-            # 执行当前轮搜索
-            round_results = self._conduct_search_round(current_queries)
-            all_search_results.extend(round_results)
+            pending_round = state['rounds'][-1] if state['rounds'] and state['rounds'][-1]['analysis'] is None else None
+            if pending_round is not None:
+                # 检查点停在搜索之后、分析之前：直接复用已检索到的论文
+                round_results = deserialize_results(pending_round['results'])
+            else:
+                current_queries = self._budget_search_queries(current_queries)
+                if not current_queries:
+                    print("⏹️ 研究预算已用尽，停止搜索")
+                    break
+                
+                print(f"\n🔍 第{search_round}轮搜索")
+                print(f"搜索查询: {current_queries}")
+                bus.emit(events.QUERIES, session_id, round=search_round, queries=current_queries)
+                
+                # 执行当前轮搜索（查询并发）
+                with bus.stage('search', session_id, round=search_round):
+                    round_results = await self._conduct_search_round_async(current_queries)
+                all_search_results.extend(round_results)
+                pending_round = {'round': search_round, 'queries': current_queries,
+                                 'results': serialize_results(round_results), 'analysis': None}
+                state['rounds'].append(pending_round)
+                self._save_checkpoint(state, f'round_{search_round}_search')
             
-            # 分析当前轮结果并生成后续查询
-            analysis_and_queries = self._analyze_results_and_generate_queries(
-                user_question, all_search_results, search_round
-            )
+            if not self._budget_allows_llm():
+                print("⏹️ 研究预算已用尽，跳过结果分析")
+                break
+            
+            # 增量分析：只分析本轮新论文，并带上之前的证据摘要
+            with bus.stage('analysis', session_id, round=search_round):
+                analysis_and_queries = await asyncio.to_thread(
+                    self._analyze_results_and_generate_queries,
+                    user_question, round_results, search_round, state['evidence_summary']
+                )
+            state['evidence_summary'] = analysis_and_queries.get('evidence_summary', state['evidence_summary'])
+            pending_round['analysis'] = analysis_and_queries['analysis']
             
             print(f"📊 第{search_round}轮分析：")
             print(analysis_and_queries['analysis'])
             
+            # 本轮边际收益：新论文和新领域/术语的占比
+            previous_results = all_search_results[:len(all_search_results) - len(round_results)]
+            novelty = self._round_novelty(search_round, previous_results, round_results)
+            pending_round['novelty'] = novelty
+            self.novelty_stats.append(novelty)
+            
             # 检查是否有后续查询
             next_queries = analysis_and_queries.get('next_queries')
-            if next_queries:
+            stop_reason = self._early_stop_reason(novelty) if next_queries else None
+            bus.emit(events.ANALYSIS, session_id, round=search_round, analysis=analysis_and_queries['analysis'],
+                     next_queries=next_queries, branching=bool(next_queries and self.branching),
+                     novelty=novelty['yield'], stop_reason=stop_reason)
+            if stop_reason:
+                print(f"⏹️ 提前停止搜索：{stop_reason}")
+                self.stop_reason = stop_reason
+                state['stop_reason'] = stop_reason
+                state['search_done'] = True
+            elif next_queries and self.branching:
+                # 分支模式：每个后续查询作为独立子研究并发展开
+                print(f"🌿 展开 {len(next_queries[:self.max_branch_fanout])} 个并发分支: {next_queries}")
+                # 分支展开前记录待展开的查询，中断后resume重新展开分支而不是重做本轮
+                state['branch_queries'] = next_queries
+                self._save_checkpoint(state, f'round_{search_round}_branches')
+                await self._run_branches(state)
+            elif next_queries:
                 print(f"🔮 发现需要进一步搜索: {next_queries}")
-                current_queries = next_queries
-                search_round += 1
+                state['current_queries'] = next_queries
+                state['search_round'] = search_round + 1
             else:
                 print("✅ 搜索完成，未发现需要进一步研究的问题")
-                break
+                state['search_done'] = True
+            self._save_checkpoint(state, f'round_{search_round}_analysis')
         
-        # 生成最终答案
+        branch_findings = [dict(f, results=deserialize_results(f['results']))
+                           for f in state.get('branch_findings', [])]
+        for finding in branch_findings:
+            all_search_results.extend(finding['results'])
+        
+        # 生成最终答案（使用为报告预留的预算）
+        total_rounds = state['search_round'] + len(branch_findings)
         print(f"\n📝 基于{len(all_search_results)}篇论文生成最终答案...")
-        final_answer = self._generate_final_answer(user_question, all_search_results, search_round)
+        with bus.stage('final_report', session_id, papers=len(all_search_results)):
+            final_answer = await asyncio.to_thread(
+                self._generate_final_answer, user_question, all_search_results, total_rounds, branch_findings
+            )
         
+        state['final_answer'] = final_answer
+        # 结构化报告需要的引用和统计一并写入检查点，恢复已完成的会话时据此重建
+        state['citations'] = self._citations.export()
+        state['report_stats'] = self.last_report.stats if self.last_report is not None else None
+        state['report_failed'] = self.last_report_failed
+        self._save_checkpoint(state, 'done')
         return final_answer
     
+    async def _run_branches(self, state: Dict[str, Any]):
+        """展开state['branch_queries']中的分支，记录各分支发现并结束搜索循环"""
+        with self.events.stage('branches', state['session_id'], round=state['search_round']):
+            branch_findings = await self._explore_branches(
+                state['question'], state['branch_queries'], 1, state['evidence_summary']
+            )
+        state['branch_findings'] = [dict(f, results=serialize_results(f['results'])) for f in branch_findings]
+        state['search_done'] = True
+    
+    def _llm_response(self, prompt: str, stage: str, stream: bool = False) -> str:
+        """
+        调用LLM；设置预算时先申请一次调用额度（被拒绝时抛出BudgetExhaustedError）并计入token消耗，
+        有订阅者时发布带耗时和token用量的llm_call事件
+        
+        stream=True且有订阅者时流式调用，每个片段发布为report_delta事件。
+        """
+        if self.budget is not None and not self.budget.try_llm_call(reserved=stage in self._REPORT_STAGES):
+            raise BudgetExhaustedError(f"研究预算已用尽，跳过LLM调用（{stage}）")
+        with self.llm_limiter or nullcontext():
+            if not self.events.active and self.budget is None:
+                return self.llm.response(prompt)
+            
+            start = time.perf_counter()
+            if stream and self.events.active:
+                response = self._stream_llm_response(prompt)
+            else:
+                response = self.llm.response(prompt)
+        usage = getattr(self.llm, 'last_usage', None) or {
+            'prompt_tokens': estimate_tokens(prompt),
+            'completion_tokens': estimate_tokens(response),
+            'estimated': True,
+        }
+        if self.budget is not None:
+            self.budget.add_tokens(usage['prompt_tokens'] + usage['completion_tokens'])
+        self.events.emit(events.LLM_CALL, self._event_session, stage=stage, latency=time.perf_counter() - start,
+                         prompt_chars=len(prompt), completion_chars=len(response or ""), **usage)
+        return response
+    
+    def _stream_llm_response(self, prompt: str) -> str:
+        """流式生成，边生成边发布report_delta；LLM不支持流式时整段发布"""
+        stream_response = getattr(self.llm, 'stream_response', None)
+        if stream_response is None:
+            response = self.llm.response(prompt)
+            self._emit_report_delta(response)
+            return response
+        
+        parts = []
+        for delta in stream_response(prompt):
+            parts.append(delta)
+            self._emit_report_delta(delta)
+        return "".join(parts)
+    
+    def _emit_report_delta(self, text: str, reset: bool = False):
+        if text and self.events.active:
+            self.events.emit(events.REPORT_DELTA, self._event_session, text=text, reset=reset)
+    
+    def _save_checkpoint(self, state: Dict[str, Any], stage: str):
+        """记录阶段完成并写入检查点（未配置存储时只更新内存状态）"""
+        state['stage'] = stage
+        if self.checkpoint_store is None:
+            return
+        state['citation_counter'] = self.citation_counter
+        state['round_stats'] = self.round_stats
+        state['searched_queries'] = sorted(set().union(*(tool.searched_queries
+                                                         for tool in iter_arxiv_tools(self.search_tool))))
+        if self.budget is not None:
+            state['budget'] = self.budget.snapshot()
+        try:
+            self.checkpoint_store.save(state['session_id'], state)
+        except OSError as e:
+            print(f"⚠️ 写入检查点失败: {e}")
+    
+    async def _explore_branches(self, question: str, queries: List[str], depth: int,
+                                evidence_summary: str = "") -> List[Dict[str, Any]]:
+        """
+        并发展开多个分支，按查询顺序合并各分支（及其子分支）的发现
+        
+        墙钟预算用尽时未完成的分支被取消，已完成分支的发现仍然保留。
+        """
+        tasks = [asyncio.create_task(self._explore_branch(question, query, depth, evidence_summary))
+                 for query in queries[:self.max_branch_fanout]]
+        time_left = self.budget.time_left() if self.budget is not None else None
+        if time_left is not None:
+            # 为最终报告预留时间
+            time_left = max(0.0, time_left - self.budget.reserve_seconds)
+        done, pending = await asyncio.wait(tasks, timeout=time_left)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"⏹️ 时间预算用尽，取消 {len(pending)} 个未完成分支")
+        
+        findings = []
+        for task in tasks:
+            if task in done and task.exception() is None:
+                findings.extend(task.result())
+        return findings
+    
+    async def _explore_branch(self, question: str, query: str, depth: int,
+                              evidence_summary: str = "") -> List[Dict[str, Any]]:
+        """
+        单个分支：搜索 → 分析 → （可选）继续展开子分支
+        """
+        if not self._budget_search_queries([query]):
+            return []
+        
+        print(f"🌿 [分支 深度{depth}] 搜索: {query}")
+        self.events.emit(events.QUERIES, self._event_session, round=depth + 1, queries=[query], branch=True)
+        results = await self._conduct_search_round_async([query])
+        finding = {'query': query, 'depth': depth, 'results': results, 'analysis': '', 'follow_ups': []}
+        findings = [finding]
+        
+        if not results or not self._budget_allows_llm():
+            return findings
+        
+        analysis_and_queries = await asyncio.to_thread(
+            self._analyze_results_and_generate_queries, question, results, depth + 1, evidence_summary
+        )
+        finding['analysis'] = analysis_and_queries['analysis']
+        print(f"📊 [分支 深度{depth}] '{query}' 分析完成")
+        
+        next_queries = analysis_and_queries.get('next_queries')
+        if next_queries and depth < self.max_branch_depth:
+            finding['follow_ups'] = next_queries[:self.max_branch_fanout]
+            findings.extend(await self._explore_branches(
+                question, next_queries, depth + 1, analysis_and_queries['evidence_summary']
+            ))
+        return findings
+    
+    def _round_novelty(self, round_num: int, previous: List[SearchResult],
+                       round_results: List[SearchResult]) -> Dict[str, Any]:
+        """
+        计算一轮搜索的边际收益
+        
+        paper: 本轮去重后的论文中此前未出现的比例；
+        term: 本轮论文的领域分类和标题术语中此前未出现的比例；yield为两者均值。
+        """
+        seen_papers = {normalize_paper_key(r) for r in previous}
+        seen_terms = set().union(*(self._paper_terms(r) for r in previous)) if previous else set()
+        round_papers = {normalize_paper_key(r) for r in round_results}
+        round_terms = set().union(*(self._paper_terms(r) for r in round_results)) if round_results else set()
+        
+        paper_novelty = len(round_papers - seen_papers) / len(round_papers) if round_papers else 0.0
+        term_novelty = len(round_terms - seen_terms) / len(round_terms) if round_terms else 0.0
+        return {'round': round_num, 'new_papers': len(round_papers - seen_papers),
+                'paper': round(paper_novelty, 3), 'term': round(term_novelty, 3),
+                'yield': round((paper_novelty + term_novelty) / 2, 3)}
+    
+    @staticmethod
+    def _paper_terms(result: SearchResult) -> set:
+        """论文的领域分类和标题术语（4个字母以上的英文词）"""
+        terms = {f"cat:{cat}" for cat in (result.categories or [])}
+        terms.update(re.findall(r"[a-z][a-z-]{3,}", (result.title or "").lower()))
+        return terms
+    
+    def _early_stop_reason(self, novelty: Dict[str, Any]) -> Optional[str]:
+        """边际收益过低或预算即将耗尽时返回停止原因，剩余额度留给最终报告"""
+        if novelty['round'] > 1 and novelty['yield'] < self.min_novelty:
+            return f"第{novelty['round']}轮边际收益{novelty['yield']:.2f}低于阈值{self.min_novelty:.2f}"
+        if self.budget is not None:
+            return self.budget.nearly_spent()
+        return None
+    
+    def _budget_allows_llm(self, reserved: bool = False) -> bool:
+        """是否还有LLM调用额度（只检查，实际调用时在_llm_response中计数）；未设置预算时总是允许"""
+        return self.budget is None or self.budget.can_call_llm(reserved)
+    
+    def _budget_search_queries(self, queries: List[str]) -> List[str]:
+        """按剩余arXiv调用额度截断查询列表"""
+        if self.budget is None:
+            return queries
+        return queries[:self.budget.try_search_calls(len(queries))]
+    
     def _initial_thinking(self, question: str, current_date: str) -> str:
         """
         初步思考和推理，完全参考search_help.html的风格
@@ -89,7 +656,7 @@ class DeepResearcher:
 请详细分析并说明你的推理过程："""
         
         try:
-            return self.llm.response(thinking_prompt)
+            return self._llm_response(thinking_prompt, 'initial_thinking')
         except Exception as e:
             return f"初步分析失败: {e}"
     
@@ -116,72 +683,91 @@ class DeepResearcher:
 请只返回查询字符串，无其他内容："""
         
         try:
-            response = self.llm.response(query_prompt)
+            response = self._llm_response(query_prompt, 'query_generation')
             queries = [q.strip() for q in response.split('||') if q.strip()]
             return queries[:5]
         except Exception as e:
             print(f"提取查询失败: {e}")
             return [question]  # 回退方案
     
-    def _conduct_search_round(self, queries: List[str]) -> List[SearchResult]:
+    async def _conduct_search_round_async(self, queries: List[str]) -> List[SearchResult]:
         """
-        执行一轮搜索
+        并发执行一轮搜索，结果按查询顺序分配citation，保证编号与串行执行一致
         """
-        round_results = []
+        outcomes = await asyncio.gather(
+            *[asyncio.to_thread(self.search_tool.search_papers, [query], max_results=5) for query in queries],
+            return_exceptions=True
+        )
         
-        for query in queries:
-            try:
-                results = self.search_tool.search_papers([query], max_results=5)
-                
-                # 为结果分配citation
-                for result in results:
-                    self.citation_counter += 1
-                    citation_key = f"citation:{self.citation_counter}"
-                    self.citations[citation_key] = result
-                    result.citation = citation_key
-                
-                round_results.extend(results)
-                print(f"  📄 '{query}': {len(results)}篇论文")
-                
-            except Exception as e:
-                print(f"  ❌ '{query}': {e}")
+        round_results = []
+        for query, outcome in zip(queries, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"  ❌ '{query}': {outcome}")
+                continue
+            round_results.extend(self._register_query_results(query, outcome))
         
         return round_results
     
-    def _analyze_results_and_generate_queries(self, question: str, results: List[SearchResult], round_num: int) -> Dict[str, Any]:
+    def _register_query_results(self, query: str, results: List[SearchResult]) -> List[SearchResult]:
+        """为单个查询的结果分配citation"""
+        self._citations.register_all(results)
+        
+        print(f"  📄 '{query}': {len(results)}篇论文")
+        if self.events.active:
+            self.events.emit(events.QUERY_RESULT, self._event_session, query=query, count=len(results),
+                             titles=[r.title for r in results[:3]])
+        return results
+    
+    def _analyze_results_and_generate_queries(self, question: str, results: List[SearchResult], round_num: int,
+                                              evidence_summary: str = "") -> Dict[str, Any]:
         """
         分析搜索结果并自动生成后续查询（如果需要）
         这是关键：LLM自动判断是否需要继续搜索
+        
+        增量分析：只发送本轮新论文和上一轮带下来的证据摘要，prompt大小不随轮数增长。
+        返回结果中的evidence_summary需传给下一轮。
         """
         if not results:
-            return {'analysis': '本轮未找到相关论文。', 'next_queries': None}
+            return {'analysis': '本轮未找到相关论文。', 'next_queries': None, 'evidence_summary': evidence_summary}
         
         # 构建搜索结果信息
         results_text = self._format_search_results(results)
         
+        previous_text = ""
+        if evidence_summary:
+            previous_text = f"""此前各轮的证据摘要：
+{evidence_summary}
+
+"""
+        
         # 关键prompt：让LLM分析并自动决定是否生成后续查询
         analysis_prompt = f"""基于以下第{round_num}轮arXiv搜索结果分析问题：{question}
 
-搜索结果：
+{previous_text}本轮新检索到的论文：
 {results_text}
 
 请提供：
 1. 对当前搜索结果的分析
 2. 基于现有信息对问题的回答
-3. **重要**：如果当前信息不足以完整回答问题，或发现需要深入研究的新方向，请生成2-3个后续搜索查询
+3. 把此前的证据摘要与本轮新发现合并为一份不超过{self.evidence_summary_chars}字的证据摘要，保留关键论文标题和结论
+4. **重要**：如果当前信息不足以完整回答问题，或发现需要深入研究的新方向，请生成2-3个后续搜索查询
 
 格式要求：
 分析：[你的分析内容]
 
+证据摘要：[合并后的累计证据摘要]
+
 后续查询：[如果需要继续搜索，用"||"分隔查询，例如："query1||query2||query3"。如果不需要继续搜索，写"无"]
 
 请用中文回答："""
         
+        start_time = time.time()
         try:
-            response = self.llm.response(analysis_prompt)
+            response = self._llm_response(analysis_prompt, 'analysis')
             
-            # 解析响应，提取分析和后续查询
+            # 解析响应，提取分析、证据摘要和后续查询
             analysis_part = ""
+            summary_part = ""
             next_queries = None
             
             if "后续查询：" in response:
@@ -194,16 +780,31 @@ class DeepResearcher:
             else:
                 analysis_part = response
             
+            if "证据摘要：" in analysis_part:
+                analysis_part, summary_part = [part.strip() for part in analysis_part.split("证据摘要：", 1)]
+            if not summary_part:
+                # 模型未按格式输出摘要时，用本轮分析续写旧摘要
+                summary_part = f"{evidence_summary}\n{analysis_part}".strip()
+            
             return {
                 'analysis': analysis_part,
-                'next_queries': next_queries
+                'next_queries': next_queries,
+                'evidence_summary': summary_part[-self.evidence_summary_chars:]
             }
             
         except Exception as e:
             return {
                 'analysis': f"分析失败: {e}",
-                'next_queries': None
+                'next_queries': None,
+                'evidence_summary': evidence_summary
             }
+        finally:
+            self.round_stats.append({
+                'round': round_num,
+                'new_papers': len(results),
+                'prompt_chars': len(analysis_prompt),
+                'latency': time.time() - start_time
+            })
     
     def _format_search_results(self, results: List[SearchResult]) -> str:
         """
@@ -234,15 +835,18 @@ class DeepResearcher:
             
         return formatted_text
     
-    def _generate_final_answer(self, question: str, all_results: List[SearchResult], total_rounds: int) -> str:
+    def _generate_final_answer(self, question: str, all_results: List[SearchResult], total_rounds: int,
+                               branch_findings: List[Dict[str, Any]] = None) -> str:
         """
         生成最终答案 - 分步处理避免长上下文问题
         """
         if not all_results:
-            return "抱歉，未找到相关的学术论文来回答您的问题。"
+            answer = "抱歉，未找到相关的学术论文来回答您的问题。"
+            self.last_report = ResearchReport.build(question, answer, answer, [], {'rounds': total_rounds, 'papers': 0})
+            return answer
         
         # 第一步：生成核心研究报告（精简论文信息避免超长）
-        core_report = self._generate_core_report(question, all_results)
+        core_report = self._generate_core_report(question, all_results, branch_findings)
         
         # 第二步：单独生成引用索引（不依赖LLM）
         citation_index = self._generate_citation_index(all_results)
@@ -250,13 +854,13 @@ class DeepResearcher:
         # 第三步：生成统计信息
         stats_section = self._generate_stats_section(all_results, total_rounds)
         
-        # 组合最终报告
+        # 组合最终报告（流式模式下统计信息和引用索引作为最后一段增量发出）
         final_report = f"""{core_report}
 
 ---
 
 {stats_section}
-
+{self._format_branch_findings(branch_findings)}
 ### 📖 论文引用索引
 {citation_index}
 
@@ -264,16 +868,83 @@ class DeepResearcher:
 
 *本报告基于arXiv学术数据库的实时搜索结果生成，由DeepSeek-v3大语言模型分析整理。*
 """
+        self._emit_report_delta(final_report[len(core_report):])
         
+        # 结构化报告：章节、引用表和统计信息（供前端和API直接使用）
+        self.last_report = ResearchReport.build(
+            question, final_report, core_report, self._citations.export(),
+            self._report_stats(all_results, total_rounds, branch_findings)
+        )
         return final_report
     
-    def _generate_core_report(self, question: str, all_results: List[SearchResult]) -> str:
+    def _report_stats(self, all_results: List[SearchResult], total_rounds: int,
+                      branch_findings: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """结构化报告的统计信息"""
+        dates = [r.date_published for r in all_results if r.date_published]
+        return {
+            'rounds': total_rounds,
+            'papers': len(all_results),
+            'date_range': [min(dates), max(dates)] if dates else None,
+            'categories': sorted({cat for r in all_results for cat in (r.categories or [])}),
+            'branches': len(branch_findings or []),
+            'round_stats': list(self.round_stats),
+            'novelty': list(self.novelty_stats),
+            'stop_reason': self.stop_reason or None,
+            'budget': self.budget.usage() if self.budget is not None else None,
+        }
+    
+    def _generate_core_report(self, question: str, all_results: List[SearchResult],
+                              branch_findings: List[Dict[str, Any]] = None) -> str:
         """
-        生成核心研究报告 - 使用精简的论文信息
+        生成核心研究报告
+        
+        论文较少时把精简论文信息放入单个prompt；论文超过report_single_limit篇时
+        （或report_mode为map_reduce时）改用map-reduce综合，所有论文都参与报告。
         """
-        # 精简论文信息，只保留关键内容
+        # 分支模式下附上各分支的分析结论
+        findings_text = ""
+        if branch_findings:
+            findings_lines = [f"- [{f['query']}] {f['analysis'][:400]}" for f in branch_findings if f['analysis']]
+            if findings_lines:
+                findings_text = "\n各分支研究发现：\n" + "\n".join(findings_lines) + "\n"
+        
+        mode = self.report_mode
+        if mode == "auto":
+            mode = "map_reduce" if len(all_results) > self.report_single_limit else "single"
+        if mode == "map_reduce" and self.budget is not None:
+            calls_left = self.budget.llm_calls_left(reserved=True)
+            needed = self._map_reduce_calls(len(all_results)) + 1
+            if calls_left is not None and calls_left < needed:
+                print(f"⏹️ 剩余LLM调用额度{calls_left}次，不足以map-reduce综合（需{needed}次），改用精选论文生成报告")
+                mode = "single"
+        
+        try:
+            if mode == "map_reduce":
+                print(f"🗂️ 使用map-reduce综合 {len(all_results)} 篇论文")
+                merged_findings = self._map_reduce_findings(question, all_results)
+                report_prompt = self._build_report_prompt(
+                    question, "各批论文的结构化发现（已合并）", merged_findings, findings_text
+                )
+            else:
+                report_prompt = self._build_report_prompt(
+                    question, "相关论文（精选）", self._simplify_papers(all_results[:self.report_single_limit]),
+                    findings_text
+                )
+            report = self._llm_response(report_prompt, 'final_report', stream=True)
+            if is_error_response(report):
+                raise RuntimeError(f"报告生成失败: {(report or '')[:200]}")
+            return report
+        except Exception as e:
+            # 如果还是失败，生成基础报告（已流式输出的部分作废）
+            self.last_report_failed = True
+            fallback = self._generate_fallback_report(question, all_results, str(e))
+            self._emit_report_delta(fallback, reset=True)
+            return fallback
+    
+    def _simplify_papers(self, results: List[SearchResult]) -> str:
+        """精简论文信息，只保留关键内容"""
         simplified_papers = []
-        for i, result in enumerate(all_results[:20], 1):  # 最多处理20篇论文
+        for i, result in enumerate(results, 1):
             citation = getattr(result, 'citation', f'citation:{i}')
             simplified_papers.append(f"""
 [{citation}] {result.title}
@@ -281,16 +952,19 @@ class DeepResearcher:
 摘要: {result.snippet[:200]}{'...' if len(result.snippet) > 200 else ''}
 """)
         
-        papers_text = '\n'.join(simplified_papers)
-        
+        return '\n'.join(simplified_papers)
+    
+    def _build_report_prompt(self, question: str, evidence_title: str, evidence_text: str,
+                             findings_text: str = "") -> str:
+        """构建6章节报告的prompt"""
         # 精简的prompt，专注于核心分析
-        report_prompt = f"""基于以下arXiv论文，为技术研发人员生成专业的学术研究报告。
+        return f"""基于以下arXiv论文，为技术研发人员生成专业的学术研究报告。
 
 研究问题：{question}
 
-相关论文（精选）：
-{papers_text}
-
+{evidence_title}：
+{evidence_text}
+{findings_text}
 请按以下结构生成报告：
 
 # 学术研究报告
@@ -320,12 +994,106 @@ class DeepResearcher:
 - 用中文撰写，保持专业性
 
 请生成详细报告："""
+    
+    def _map_reduce_findings(self, question: str, all_results: List[SearchResult]) -> str:
+        """
+        map：按批并行提取带citation的结构化发现；
+        reduce：每reduce_fan_in份发现并行合并一次，逐层合并直到只剩一份
+        """
+        batches = [all_results[i:i + self.map_batch_size]
+                   for i in range(0, len(all_results), self.map_batch_size)]
+        
+        with ThreadPoolExecutor(max_workers=self.synthesis_workers) as executor:
+            findings = list(executor.map(lambda batch: self._map_batch_findings(question, batch), batches))
+            
+            level = 1
+            while len(findings) > 1:
+                groups = [findings[i:i + self.reduce_fan_in] for i in range(0, len(findings), self.reduce_fan_in)]
+                print(f"   🔗 第{level}层合并: {len(findings)} 份发现 → {len(groups)} 份")
+                findings = list(executor.map(lambda group: self._reduce_findings(question, group), groups))
+                level += 1
+        
+        return findings[0] if findings else ""
+    
+    def _map_reduce_calls(self, paper_count: int) -> int:
+        """map-reduce综合paper_count篇论文需要的LLM调用次数（只有一份的组不调用LLM）"""
+        count = -(-paper_count // self.map_batch_size)
+        calls = count
+        while count > 1:
+            calls += count // self.reduce_fan_in + (1 if count % self.reduce_fan_in > 1 else 0)
+            count = -(-count // self.reduce_fan_in)
+        return calls
+    
+    def _map_batch_findings(self, question: str, batch: List[SearchResult]) -> str:
+        """map步骤：从一批论文中提取结构化发现，每条发现绑定citation"""
+        papers_text = ""
+        for i, result in enumerate(batch, 1):
+            citation = getattr(result, 'citation', f'citation:{i}')
+            content = result.content or result.snippet
+            papers_text += f"""[{citation}] {result.title}（{result.date_published}）
+{content[:800]}{'...' if len(content) > 800 else ''}
+
+"""
+        
+        map_prompt = f"""研究问题：{question}
+
+请从以下论文中提取与研究问题相关的关键发现：
+
+{papers_text}
+输出要求：
+- 每条发现一行，格式为"- [主题] 发现内容 [citation:x]"
+- 主题取"方法"、"实验结果"、"局限"、"应用"、"趋势"之一
+- 每篇相关论文至少一条发现，无关论文直接跳过
+- 只输出发现列表，不要其他内容"""
         
         try:
-            return self.llm.response(report_prompt)
-        except Exception as e:
-            # 如果还是失败，生成基础报告
-            return self._generate_fallback_report(question, all_results, str(e))
+            findings = self._llm_response(map_prompt, 'report_map')
+            if is_error_response(findings):
+                raise RuntimeError(findings)
+            return findings
+        except Exception:
+            # 单批失败时退化为论文标题列表，保证引用不丢失
+            return "\n".join(f"- [论文] {r.title} [{getattr(r, 'citation', '')}]" for r in batch)
+    
+    def _reduce_findings(self, question: str, group: List[str]) -> str:
+        """reduce步骤：合并多份发现，去重并按主题归类，保留全部citation"""
+        if len(group) == 1:
+            return group[0]
+        
+        parts = "\n\n".join(f"[发现组 {i}]\n{text}" for i, text in enumerate(group, 1))
+        reduce_prompt = f"""研究问题：{question}
+
+请合并以下多组论文发现：
+
+{parts}
+
+输出要求：
+- 合并重复或相近的发现，保留所有相关的[citation:x]引用
+- 按"方法"、"实验结果"、"局限"、"应用"、"趋势"分组，每组使用"### 主题"小标题
+- 每条发现一行，以"- "开头
+- 只输出合并后的发现，不要其他内容"""
+        
+        try:
+            merged = self._llm_response(reduce_prompt, 'report_reduce')
+            if is_error_response(merged):
+                raise RuntimeError(merged)
+            return merged
+        except Exception:
+            return "\n".join(group)
+    
+    def _format_branch_findings(self, branch_findings: List[Dict[str, Any]]) -> str:
+        """格式化分支探索发现（非分支模式返回空字符串）"""
+        if not branch_findings:
+            return ""
+        
+        lines = ["", "### 🌿 分支探索发现"]
+        for finding in branch_findings:
+            indent = "  " * (finding['depth'] - 1)
+            lines.append(f"{indent}- **{finding['query']}**（深度{finding['depth']}，{len(finding['results'])}篇论文）")
+            if finding['analysis']:
+                summary = finding['analysis'][:200] + ('...' if len(finding['analysis']) > 200 else '')
+                lines.append(f"{indent}  {summary}")
+        return "\n".join(lines) + "\n"
     
     def _generate_fallback_report(self, question: str, all_results: List[SearchResult], error: str) -> str:
         """
@@ -377,7 +1145,42 @@ class DeepResearcher:
 - **研究领域**: {len(unique_categories)} 个研究方向
 
 ### 📚 主要研究领域
-{self._format_categories(unique_categories)}"""
+{self._format_categories(unique_categories)}{self._format_round_stats()}{self._format_budget_stats()}"""
+    
+    def _format_round_stats(self) -> str:
+        """格式化每轮分析的prompt大小和耗时（增量分析下应基本持平）"""
+        if not self.round_stats:
+            return ""
+        
+        lines = ["", "### ⏱️ 每轮分析开销", "| 轮次 | 新论文 | Prompt字符数 | 耗时(秒) |", "|---|---|---|---|"]
+        for stat in self.round_stats:
+            lines.append(f"| {stat['round']} | {stat['new_papers']} | {stat['prompt_chars']:,} | {stat['latency']:.1f} |")
+        return "\n".join(lines) + "\n"
+    
+    def _format_budget_stats(self) -> str:
+        """格式化预算消耗、每轮边际收益和提前停止原因"""
+        lines = []
+        if self.budget is not None:
+            usage = self.budget.usage()
+            
+            def fmt(used, limit):
+                return f"{used:,} / {limit:,}" if limit is not None else f"{used:,}（不限）"
+            
+            lines += ["", "### 💰 预算消耗",
+                      f"- **LLM调用**: {fmt(usage['llm_calls'], usage['max_llm_calls'])}",
+                      f"- **LLM token**: {fmt(usage['tokens'], usage['max_tokens'])}",
+                      f"- **arXiv调用**: {fmt(usage['search_calls'], usage['max_search_calls'])}",
+                      f"- **耗时**: {usage['elapsed_seconds']:.1f} 秒"
+                      + (f" / {usage['max_seconds']:.0f} 秒" if usage['max_seconds'] is not None else "")]
+        if self.novelty_stats:
+            lines += ["", "### 📈 每轮边际收益", "| 轮次 | 新论文 | 论文新颖度 | 术语新颖度 | 边际收益 |",
+                      "|---|---|---|---|---|"]
+            for stat in self.novelty_stats:
+                lines.append(f"| {stat['round']} | {stat['new_papers']} | {stat['paper']:.2f} | "
+                             f"{stat['term']:.2f} | {stat['yield']:.2f} |")
+        if self.stop_reason:
+            lines += ["", f"- **提前停止**: {self.stop_reason}"]
+        return "\n".join(lines) + "\n" if lines else ""
     
     def _generate_citation_index(self, all_results: List[SearchResult]) -> str:
         """生成可点击的论文引用索引"""
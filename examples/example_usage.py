@@ -88,28 +88,27 @@ def example_batch_research():
         "强化学习在游戏AI中的突破"
     ]
     
-    results = {}
+    # 并发研究，问题之间共享arXiv网关限速和检索缓存；每完成一个立即回调
+    def on_result(record):
+        if record.get('error'):
+            print(f"  ❌ 失败: {record['question']}: {record['error']}")
+        else:
+            print(f"  ✅ 完成: {record['question']} ({record['duration']:.1f}s, {len(record['report']):,}字符)")
     
-    for i, question in enumerate(questions, 1):
-        print(f"\n[{i}/{len(questions)}] 研究: {question}")
-        
-        try:
-            start_time = time.time()
-            result = researcher.research(question)
-            end_time = time.time()
-            
-            results[question] = {
+    records = researcher.research_many(questions, concurrency=3, on_result=on_result)
+    
+    results = {}
+    for record in records:
+        if record.get('error'):
+            results[record['question']] = {'error': record['error']}
+        else:
+            result = record['report']
+            results[record['question']] = {
                 'content': result,
-                'duration': end_time - start_time,
+                'duration': record['duration'],
                 'citations': result.count('[citation:'),
                 'length': len(result)
             }
-            
-            print(f"  ✅ 完成 ({end_time - start_time:.1f}s, {len(result):,}字符)")
-            
-        except Exception as e:
-            print(f"  ❌ 失败: {e}")
-            results[question] = {'error': str(e)}
     
     # 生成批量报告摘要
     print(f"\n📊 批量研究摘要:")
@@ -117,7 +116,7 @@ def example_batch_research():
     total_citations = sum([r.get('citations', 0) for r in results.values()])
     successful = len([r for r in results.values() if 'content' in r])
     
-    print(f"- 总耗时: {total_time:.1f} 秒")
+    print(f"- 累计耗时: {total_time:.1f} 秒（并发执行，实际墙钟时间更短）")
     print(f"- 总引用: {total_citations} 个")
     print(f"- 成功率: {successful}/{len(questions)}")
 
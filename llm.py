@@ -1,5 +1,7 @@
 # 支持 gemini, claude, gpt-4o, deepseek-v3 等模型
 import os
+import re
+import threading
 import requests
 import json
 from dotenv import load_dotenv
@@ -11,12 +13,55 @@ load_dotenv()
 url = os.getenv('LLM_API_URL')
 API_KEY = os.getenv('LLM_API_KEY')
 
+# LLM.response 失败时不抛异常，而是返回以下错误文本
+ALL_PATHS_FAILED = "所有API路径都请求失败，请检查API密钥和URL"
+ERROR_PREFIX = "error: "
+
+def is_error_response(text):
+    """判断LLM返回的是否是请求失败的错误文本（或空内容）"""
+    if not text or not text.strip():
+        return True
+    return text.startswith(ERROR_PREFIX) or text.startswith(ALL_PATHS_FAILED)
+
+def estimate_tokens(text):
+    """粗略估算token数：中文约1字1token，其他约4字符1token"""
+    if not text:
+        return 0
+    cjk = len(re.findall(r'[\u4e00-\u9fff]', text))
+    return cjk + (len(text) - cjk + 3) // 4
+
 class LLM:
-    def __init__(self, model_name="deepseek-v3"):
+    def __init__(self, model_name="deepseek-v3", base_url=None, api_key=None):
         self.model_name = model_name
+        # 默认使用环境变量中的网关；基准测试时可指向本地模拟服务（mock_servers.MockLLMServer）
+        self.base_url = base_url or url
+        self.api_key = api_key or API_KEY
         self.successful_path = None  # 缓存成功的API路径
+        # 最近一次调用的token用量按线程保存，并发调用互不覆盖
+        self._local = threading.local()
+        self._usage_lock = threading.Lock()
+        self.total_usage = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    @property
+    def last_usage(self):
+        """当前线程最近一次调用的token用量（网关未返回usage时为估算值）"""
+        return getattr(self._local, 'usage', None)
+
+    def _record_usage(self, query, content, usage=None):
+        usage = usage or {}
+        record = {
+            'prompt_tokens': usage.get('prompt_tokens') or estimate_tokens(query),
+            'completion_tokens': usage.get('completion_tokens') or estimate_tokens(content),
+            'estimated': not usage,
+        }
+        self._local.usage = record
+        with self._usage_lock:
+            self.total_usage['calls'] += 1
+            self.total_usage['prompt_tokens'] += record['prompt_tokens']
+            self.total_usage['completion_tokens'] += record['completion_tokens']
 
     def response(self, query):
+        self._local.usage = None
         try:
             # 使用原始格式
             payload = json.dumps({
@@ -28,7 +73,7 @@ class LLM:
             
             # 使用Bearer令牌认证
             headers = {
-                'Authorization': f'Bearer {API_KEY}',
+                'Authorization': f'Bearer {self.api_key}',
                 'Content-Type': 'application/json'
             }
 
@@ -46,7 +91,7 @@ class LLM:
                 api_paths = [self.successful_path] + [p for p in api_paths if p != self.successful_path]
             
             for path in api_paths:
-                complete_url = url + path
+                complete_url = self.base_url + path
                 
                 response = requests.request("POST", complete_url, headers=headers, data=payload, timeout=120)  # 增加到60秒超时
                 
@@ -57,6 +102,7 @@ class LLM:
                         result = response.json()
                         if "choices" in result and len(result["choices"]) > 0:
                             content = result["choices"][0]["message"]["content"]
+                            self._record_usage(query, content, result.get("usage"))
                             # 限制内容长度到120k字符
                             if len(content) > 120000:
                                 content = content[:120000] + "\n\n[内容过长，已截断到120k字符]"
@@ -71,10 +117,84 @@ class LLM:
                     print(f"API路径 {path} 失败，状态码: {response.status_code}")
             
             # 如果所有路径都失败
-            return f"所有API路径都请求失败，请检查API密钥和URL"
+            return ALL_PATHS_FAILED
         except Exception as e:
             print(f"发生错误: {e}")
-            return f"error: {str(e)}"
+            return f"{ERROR_PREFIX}{str(e)}"
+
+    def stream_response(self, query):
+        """
+        流式调用：逐段yield模型输出（OpenAI兼容的SSE格式）
+
+        流式请求失败时退回一次非流式调用，整段yield；网关忽略stream参数返回普通JSON补全时
+        直接整段yield其内容；流中没有任何内容时同样退回非流式调用。
+        """
+        self._local.usage = None
+        payload = json.dumps({
+            "max_tokens": 128000,
+            "message": query,
+            "model": self.model_name,
+            "stream": True
+        })
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        path = self.successful_path or 'v1/chat/completions'
+
+        try:
+            response = requests.request("POST", self.base_url + path, headers=headers, data=payload,
+                                        timeout=120, stream=True)
+        except Exception as e:
+            print(f"流式请求失败，改用非流式调用: {e}")
+            response = None
+        if response is None or response.status_code != 200:
+            if response is not None:
+                print(f"流式请求失败，状态码: {response.status_code}，改用非流式调用")
+            yield self.response(query)
+            return
+
+        if 'text/event-stream' not in response.headers.get('Content-Type', ''):
+            with response:
+                try:
+                    result = response.json()
+                    content = result["choices"][0]["message"]["content"]
+                except (ValueError, KeyError, IndexError, TypeError):
+                    result, content = {}, None
+            if not content:
+                print("流式请求返回的不是SSE且无法解析内容，改用非流式调用")
+                yield self.response(query)
+                return
+            self.successful_path = path
+            self._record_usage(query, content, result.get("usage"))
+            yield content
+            return
+
+        parts = []
+        usage = None
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        if not parts:
+            print("流式响应没有内容，改用非流式调用")
+            yield self.response(query)
+            return
+        self.successful_path = path
+        self._record_usage(query, "".join(parts), usage)
 
 # 测试用的代码可以注释掉
 if __name__ == "__main__":
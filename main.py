@@ -6,8 +6,16 @@ Deep Researcher - 深度研究系统
 
 import sys
 import argparse
+import json
+import os
 import time
+import uuid
 from deep_researcher import DeepResearcher
+from research_budget import ResearchBudget
+from research_checkpoint import CheckpointStore
+from report_store import ReportStore
+from research_trace import TraceRecorder, TraceReplayer
+import research_events as events
 
 def print_banner():
     """打印欢迎横幅"""
@@ -24,6 +32,33 @@ def print_banner():
 ╚══════════════════════════════════════════════════════════════╝
 """)
 
+class ReportStreamPrinter:
+    """订阅report_delta事件，把最终报告边生成边写到stdout"""
+    
+    def __init__(self):
+        self.streamed = False
+    
+    def __call__(self, event):
+        if event.data.get('reset'):
+            print("\n\n⚠️ 报告生成中断，改用基础报告：\n")
+        elif not self.streamed:
+            print("\n" + "=" * 60)
+            print("📄 研究报告（实时生成中）")
+            print("=" * 60)
+        self.streamed = True
+        sys.stdout.write(event.data['text'])
+        sys.stdout.flush()
+
+
+def print_result(result, printer):
+    """报告已流式输出时不再重复打印全文"""
+    print("\n" + "=" * 60)
+    print("📊 研究完成！")
+    print("=" * 60)
+    if not printer.streamed:
+        print(result)
+
+
 def interactive_mode():
     """交互模式"""
     print_banner()
@@ -38,7 +73,9 @@ def interactive_mode():
     
     # 初始化研究器
     try:
-        researcher = DeepResearcher("deepseek-v3")
+        researcher = DeepResearcher("deepseek-v3", report_store=ReportStore())
+        printer = ReportStreamPrinter()
+        researcher.events.subscribe(printer, [events.REPORT_DELTA])
         print("✅ Deep Researcher 初始化成功")
     except Exception as e:
         print(f"❌ 初始化失败: {e}")
@@ -72,16 +109,14 @@ def interactive_mode():
             print("=" * 60)
             
             start_time = time.time()
+            printer.streamed = False
             result = researcher.research(question)
             end_time = time.time()
             
             research_count += 1
             
             # 显示结果
-            print("\n" + "=" * 60)
-            print("📊 研究完成！")
-            print("=" * 60)
-            print(result)
+            print_result(result, printer)
             
             # 显示统计信息
             duration = end_time - start_time
@@ -112,33 +147,56 @@ def interactive_mode():
             if retry_choice in ['n', 'no']:
                 break
 
-def single_mode(question, max_rounds=5):
-    """单次研究模式"""
+def single_mode(question, max_rounds=5, branching=False, budget=None, reuse_reports=True,
+                record=None, replay=None, replay_latency=None):
+    """单次研究模式；record/replay为trace文件路径，录制或离线回放LLM和arXiv请求"""
     print_banner()
     
     print(f"🎯 单次研究模式")
     print(f"📝 研究问题: {question}")
     print(f"🔢 最大搜索轮数: {max_rounds}")
+    if branching:
+        print("🌿 分支探索模式: 后续查询并发展开")
+    if budget is not None:
+        print(f"💰 研究预算: 时间 {budget.max_seconds or '不限'} 秒 | "
+              f"token {budget.max_tokens or '不限'} | arXiv调用 {budget.max_search_calls or '不限'} 次")
     print("=" * 60)
     
     try:
-        researcher = DeepResearcher("deepseek-v3")
+        # 回放时不读写历史报告，保证结果只取决于trace
+        researcher = DeepResearcher("deepseek-v3", checkpoint_store=CheckpointStore(), budget=budget,
+                                    report_store=None if replay else ReportStore())
+        researcher.reuse_reports = reuse_reports
+        recorder = None
+        if replay:
+            TraceReplayer(replay, latency_scale=replay_latency).attach(researcher)
+            print(f"📼 离线回放: {replay}")
+        elif record:
+            recorder = TraceRecorder(record)
+            recorder.attach(researcher)
+            print(f"📼 录制LLM和arXiv请求到: {record}")
         researcher.max_rounds = max_rounds
+        researcher.branching = branching
+        printer = ReportStreamPrinter()
+        researcher.events.subscribe(printer, [events.REPORT_DELTA])
         print("✅ Deep Researcher 初始化成功")
         
+        session_id = uuid.uuid4().hex[:12]
+        print(f"💾 检查点会话: {session_id}（中断后可用 --resume {session_id} 继续）")
         print(f"\n🔬 开始研究...")
         print("⏰ 预计耗时: 1-3分钟")
         print("=" * 60)
         
         start_time = time.time()
-        result = researcher.research(question)
+        try:
+            result = researcher.research(question, session_id=session_id)
+        finally:
+            if recorder is not None:
+                recorder.save()
         end_time = time.time()
         
         # 显示结果
-        print("\n" + "=" * 60)
-        print("📊 研究完成！")
-        print("=" * 60)
-        print(result)
+        print_result(result, printer)
         
         # 显示统计信息
         duration = end_time - start_time
@@ -155,6 +213,103 @@ def single_mode(question, max_rounds=5):
         print(f"❌ 研究失败: {e}")
         sys.exit(1)
 
+def resume_mode(session_id):
+    """从检查点恢复中断的研究"""
+    print_banner()
+    
+    store = CheckpointStore()
+    state = store.load(session_id)
+    if state is None:
+        print(f"❌ 未找到检查点: {session_id}")
+        unfinished = store.list_sessions()
+        if unfinished:
+            print("💡 可恢复的会话:")
+            for item in unfinished:
+                print(f"   • {item['session_id']}  [{item['stage']}]  {item['question']}")
+        sys.exit(1)
+    
+    # 轮数、分支和预算上限按检查点中记录的原始配置恢复（DeepResearcher.resume负责）
+    config = state.get('config', {})
+    print(f"🔢 最大搜索轮数: {config.get('max_rounds', '默认')}"
+          f"{' | 🌿 分支探索模式' if config.get('branching') else ''}")
+    limits = state.get('budget_limits')
+    if limits:
+        print(f"💰 研究预算: 时间 {limits['max_seconds'] or '不限'} 秒 | "
+              f"token {limits['max_tokens'] or '不限'} | arXiv调用 {limits['max_search_calls'] or '不限'} 次")
+    
+    try:
+        researcher = DeepResearcher("deepseek-v3", checkpoint_store=store)
+        printer = ReportStreamPrinter()
+        researcher.events.subscribe(printer, [events.REPORT_DELTA])
+        start_time = time.time()
+        result = researcher.resume(session_id)
+        
+        print_result(result, printer)
+        print(f"\n⏱️  恢复耗时: {time.time() - start_time:.1f} 秒")
+    except Exception as e:
+        print(f"❌ 恢复失败: {e}")
+        sys.exit(1)
+
+def load_completed_questions(out_path):
+    """读取已有的JSONL结果，返回已成功完成的问题（重新运行时跳过）"""
+    completed = set()
+    if not os.path.exists(out_path):
+        return completed
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 进程中断时可能留下不完整的最后一行
+            if record.get('report') and not record.get('error'):
+                completed.add(record['question'])
+    return completed
+
+def batch_mode(questions_file, out_path, max_rounds=5, concurrency=3):
+    """批量研究模式：并发研究文件中的所有问题，每完成一个就追加一行JSONL"""
+    print_banner()
+    
+    with open(questions_file, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    completed = load_completed_questions(out_path)
+    pending = [q for q in dict.fromkeys(questions) if q not in completed]
+    
+    print(f"📚 批量研究模式")
+    print(f"📝 问题数: {len(questions)}（已完成 {len(questions) - len(pending)}，待研究 {len(pending)}）")
+    print(f"⚡ 并发数: {concurrency} | 🔢 最大搜索轮数: {max_rounds}")
+    print(f"💾 结果文件: {out_path}")
+    print("=" * 60)
+    if not pending:
+        print("✅ 所有问题均已完成")
+        return
+    
+    researcher = DeepResearcher("deepseek-v3", session_id=f"batch-{uuid.uuid4().hex[:8]}")
+    researcher.max_rounds = max_rounds
+    finished = 0
+    start_time = time.time()
+    
+    with open(out_path, "a", encoding="utf-8") as out:
+        def write_record(record):
+            nonlocal finished
+            finished += 1
+            record = dict(record, finished_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            status = f"❌ {record['error']}" if record.get('error') else f"✅ {record['duration']:.1f}s"
+            print(f"\n[{finished}/{len(pending)}] {status} | {record['question']}")
+        
+        records = researcher.research_many(pending, concurrency=concurrency, on_result=write_record)
+    
+    failed = sum(1 for r in records if r.get('error'))
+    print("\n" + "=" * 60)
+    print(f"📊 批量研究完成: 成功 {len(records) - failed}，失败 {failed}，总耗时 {time.time() - start_time:.1f} 秒")
+    print(f"🗂️ 检索缓存: {researcher.search_tool.cache.stats()}")
+    backend_stats = getattr(researcher.search_tool, 'backend_stats', None)
+    if backend_stats is not None:
+        for name, stats in backend_stats().items():
+            print(f"   🔌 后端 {name}: 调用 {stats['calls']} 次，超时 {stats['timeouts']} 次，"
+                  f"平均延迟 {stats['avg_latency']:.2f}s")
+
 def show_help():
     """显示帮助信息"""
     help_text = """
@@ -238,6 +393,12 @@ def main():
   python main.py                                    # 交互模式
   python main.py "什么是Transformer架构"             # 单次研究
   python main.py "深度学习发展历史" --max-rounds 3    # 限制搜索轮数
+  python main.py "大模型推理优化" --branching         # 分支探索模式
+  python main.py "扩散模型综述" --time-budget 120     # 限定研究时间，接近上限时提前停止
+  python main.py --resume 3f2a9c1b7d4e               # 从检查点恢复中断的研究
+  python main.py --batch questions.txt --out results.jsonl  # 批量研究（每行一个问题）
+  python main.py "什么是Transformer架构" --record run.jsonl.gz  # 录制LLM和arXiv请求
+  python main.py "什么是Transformer架构" --replay run.jsonl.gz  # 离线回放，不访问外部服务
   python main.py --examples                         # 查看示例问题
         """
     )
@@ -255,6 +416,83 @@ def main():
         help='最大搜索轮数 (默认: 5)'
     )
     
+    parser.add_argument(
+        '--branching', '-b',
+        action='store_true',
+        help='分支探索模式：每个后续查询作为独立子研究并发执行'
+    )
+    
+    parser.add_argument(
+        '--time-budget',
+        type=float,
+        metavar='SECONDS',
+        help='研究时间预算（秒），接近上限时停止搜索并生成报告'
+    )
+    
+    parser.add_argument(
+        '--token-budget',
+        type=int,
+        metavar='TOKENS',
+        help='LLM token预算'
+    )
+    
+    parser.add_argument(
+        '--search-budget',
+        type=int,
+        metavar='CALLS',
+        help='arXiv调用次数预算'
+    )
+    
+    parser.add_argument(
+        '--fresh',
+        action='store_true',
+        help='忽略历史报告，重新研究（默认新鲜期内的重复问题直接返回历史报告）'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        metavar='SESSION_ID',
+        help='从检查点恢复中断的研究'
+    )
+    
+    parser.add_argument(
+        '--batch',
+        metavar='QUESTIONS_FILE',
+        help='批量研究：文件中每行一个问题，并发执行'
+    )
+    
+    parser.add_argument(
+        '--out',
+        default='batch_results.jsonl',
+        help='批量研究结果文件（JSONL，每完成一个问题追加一行，默认: batch_results.jsonl）'
+    )
+    
+    parser.add_argument(
+        '--concurrency', '-c',
+        type=int,
+        default=3,
+        help='批量研究同时进行的问题数 (默认: 3)'
+    )
+    
+    parser.add_argument(
+        '--record',
+        metavar='TRACE_FILE',
+        help='录制本次研究的LLM和arXiv请求/响应到trace文件（以 .gz 结尾时压缩）'
+    )
+    
+    parser.add_argument(
+        '--replay',
+        metavar='TRACE_FILE',
+        help='从trace文件离线回放LLM和arXiv响应（用于基准测试和回归测试）'
+    )
+    
+    parser.add_argument(
+        '--replay-latency',
+        type=float,
+        metavar='SCALE',
+        help='回放时按录制耗时的比例等待（1.0为原始耗时，默认不等待）'
+    )
+    
     parser.add_argument(
         '--examples', '-e',
         action='store_true',
@@ -268,9 +506,18 @@ def main():
         show_examples()
         return
     
-    if args.question:
+    if args.batch:
+        batch_mode(args.batch, args.out, args.max_rounds, args.concurrency)
+    elif args.resume:
+        resume_mode(args.resume)
+    elif args.question:
         # 单次研究模式
-        single_mode(args.question, args.max_rounds)
+        budget = None
+        if args.time_budget or args.token_budget or args.search_budget:
+            budget = ResearchBudget(max_seconds=args.time_budget, max_tokens=args.token_budget,
+                                    max_search_calls=args.search_budget)
+        single_mode(args.question, args.max_rounds, args.branching, budget, not args.fresh,
+                    args.record, args.replay, args.replay_latency)
     else:
         # 交互模式
         interactive_mode()
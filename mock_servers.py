@@ -0,0 +1,398 @@
+"""
+本地模拟服务 - 无网络环境下对两种研究引擎做可控、可复现的基准测试
+
+- MockLLMServer: OpenAI兼容的 /v1/chat/completions，支持流式(SSE)、首字延迟、tokens/秒、错误注入，
+  默认按研究引擎的各阶段prompt返回脚本化响应（也可传入自定义脚本）
+- MockArxivServer: 模拟 export.arxiv.org/api/query 的Atom feed，数据来自fixture（未提供时按查询确定性生成），
+  支持按最小请求间隔限流（超限返回503和Retry-After）
+两者都只依赖标准库，在后台线程中运行，并统计请求数和token用量。
+
+用法：
+    with MockLLMServer(tokens_per_second=200) as llm_server, MockArxivServer() as arxiv_server:
+        researcher = DeepResearcher("deepseek-v3")
+        attach_mock_servers(researcher, llm_server, arxiv_server)
+        researcher.research("什么是注意力机制")
+        print(llm_server.stats(), arxiv_server.stats())
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from llm import LLM, estimate_tokens
+from search_backends import iter_arxiv_tools
+from search_gateway import ArxivSearchGateway
+
+Script = Union[Callable[[str], str], Sequence[Tuple[str, str]]]
+
+
+def researcher_script(prompt: str, follow_up_rounds: int = 1, tool_rounds: int = 1,
+                      report_tokens: int = 0) -> str:
+    """
+    按prompt特征返回两种引擎各阶段格式正确的响应（无状态，并发请求互不影响）
+
+    follow_up_rounds: 传统引擎前几轮分析给出后续查询
+    tool_rounds: Agent引擎前几轮发出工具调用
+    report_tokens: 最终报告至少达到的token数（用于测量流式输出速度）
+    """
+    citations = sorted({int(n) for n in re.findall(r"citation:(\d+)", prompt)})[:6] or [1, 2, 3]
+    cite = "".join(f"[citation:{n}]" for n in citations[:2])
+
+    if "# The user's message is:" in prompt:
+        round_num = prompt.count("Tool Results:")
+        if round_num < tool_rounds:
+            queries = f"topic {round_num} attention||topic {round_num} transformer"
+            return ("需要检索相关论文。<|tool▁calls▁begin|><|tool▁call▁begin|>arxiv_search<|tool▁sep|>"
+                    + json.dumps({'queries': queries}) + "<|tool▁call▁end|><|tool▁calls▁end|>")
+        return _pad(f"# 研究报告\n\n## 执行摘要\n注意力机制是序列建模的核心组件{cite}。\n", report_tokens)
+
+    if "生成第一轮arXiv搜索查询" in prompt:
+        return "attention mechanism||transformer||self attention"
+    if "后续查询" in prompt:
+        match = re.search(r"第(\d+)轮arXiv搜索结果", prompt)
+        round_num = int(match.group(1)) if match else 1
+        summary = f"分析：第{round_num}轮论文讨论了注意力机制{cite}。\n\n证据摘要：第{round_num}轮摘要{cite}\n\n"
+        if round_num <= follow_up_rounds:
+            return summary + f"后续查询：topic {round_num} a||topic {round_num} b"
+        return summary + "后续查询：无"
+    if "提取与研究问题相关的关键发现" in prompt:
+        return "\n".join(f"- [方法] 论文提出了改进的注意力结构 [citation:{n}]" for n in citations)
+    if "学术研究报告" in prompt:
+        sections = ["1. 执行摘要", "2. 技术背景与现状", "3. 核心技术分析",
+                    "4. 对比分析与评估", "5. 实践应用指导", "6. 前沿趋势与发展"]
+        body = "".join(f"## {title}\n注意力机制相关研究{cite}。\n\n" for title in sections)
+        return _pad("# 学术研究报告\n\n" + body, report_tokens)
+    return "初步分析：需要检索注意力机制相关论文，重点关注模型结构和效率优化。"
+
+
+def _pad(text: str, report_tokens: int) -> str:
+    filler = "补充说明：相关工作在多个基准上验证了方法的有效性。\n"
+    while estimate_tokens(text) < report_tokens:
+        text += filler
+    return text
+
+
+class _MockServer:
+    """后台线程运行的本地HTTP服务"""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self.handler_class)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True,
+                                            name=type(self).__name__)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str, content_type: str = "application/json", headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _LLMHandler(_QuietHandler):
+    def do_POST(self):
+        mock: "MockLLMServer" = self.server.mock
+        if not self.path.rstrip("/").endswith("completions"):
+            return self._send(404, json.dumps({'error': "not found"}))
+        if mock.api_key and self.headers.get("Authorization") != f"Bearer {mock.api_key}":
+            return self._send(401, json.dumps({'error': "invalid api key"}))
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        prompt = body.get("message") or "\n".join(m.get("content", "") for m in body.get("messages") or [])
+        stream = bool(body.get("stream")) and mock.supports_stream
+
+        error_status = mock._next_error()
+        if error_status:
+            return self._send(error_status, json.dumps({'error': "injected error"}))
+
+        content = mock.respond(prompt)
+        usage = {'prompt_tokens': estimate_tokens(prompt), 'completion_tokens': estimate_tokens(content)}
+        mock._record(stream, usage)
+        if mock.latency:
+            time.sleep(mock.latency)
+        if not stream:
+            mock._pace(content)
+            return self._send(200, json.dumps({
+                'id': f"mock-{mock.requests}", 'object': "chat.completion", 'model': body.get("model"),
+                'choices': [{'index': 0, 'message': {'role': "assistant", 'content': content},
+                             'finish_reason': "stop"}],
+                'usage': usage,
+            }, ensure_ascii=False))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        size = mock.chunk_chars
+        for i in range(0, len(content), size):
+            chunk = content[i:i + size]
+            mock._pace(chunk)
+            event = {'choices': [{'index': 0, 'delta': {'content': chunk}, 'finish_reason': None}]}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        final = {'choices': [{'index': 0, 'delta': {}, 'finish_reason': "stop"}], 'usage': usage}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+
+
+class MockLLMServer(_MockServer):
+    handler_class = _LLMHandler
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: Optional[float] = None,
+                 error_rate: float = 0.0, error_status: int = 500, script: Optional[Script] = None,
+                 api_key: str = "mock-key", chunk_chars: int = 16, seed: int = 0,
+                 follow_up_rounds: int = 1, tool_rounds: int = 1, report_tokens: int = 0,
+                 supports_stream: bool = True, **kwargs):
+        """
+        latency: 首个token之前的延迟（秒）
+        tokens_per_second: 输出速度，None表示不限速
+        error_rate: 按该概率返回error_status（随机数由seed决定，结果可复现）
+        script: 自定义响应，callable(prompt)->str，或 [(prompt包含的文本, 响应), ...] 规则表；
+                未匹配规则时使用researcher_script
+        supports_stream: False时模拟忽略stream参数的网关，流式请求也返回普通JSON补全
+        """
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.script = script
+        self.api_key = api_key
+        self.chunk_chars = chunk_chars
+        self.follow_up_rounds = follow_up_rounds
+        self.tool_rounds = tool_rounds
+        self.report_tokens = report_tokens
+        self.supports_stream = supports_stream
+        self._random = random.Random(seed)
+        self._forced_errors: List[int] = []
+        self.requests = 0
+        self.stream_requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def url(self) -> str:
+        """LLM网关基础URL（与LLM_API_URL一样以/结尾）"""
+        return self.address + "/"
+
+    def respond(self, prompt: str) -> str:
+        if callable(self.script):
+            return self.script(prompt)
+        for needle, response in self.script or []:
+            if needle in prompt:
+                return response
+        return researcher_script(prompt, self.follow_up_rounds, self.tool_rounds, self.report_tokens)
+
+    def inject_errors(self, count: int = 1, status: Optional[int] = None):
+        """接下来的count个请求返回错误状态码"""
+        with self._lock:
+            self._forced_errors.extend([status or self.error_status] * count)
+
+    def _next_error(self) -> Optional[int]:
+        with self._lock:
+            status = None
+            if self._forced_errors:
+                status = self._forced_errors.pop(0)
+            elif self.error_rate and self._random.random() < self.error_rate:
+                status = self.error_status
+            if status:
+                self.errors += 1
+            return status
+
+    def _record(self, stream: bool, usage: Dict[str, int]):
+        with self._lock:
+            self.requests += 1
+            self.stream_requests += int(stream)
+            self.prompt_tokens += usage['prompt_tokens']
+            self.completion_tokens += usage['completion_tokens']
+
+    def _pace(self, text: str):
+        if self.tokens_per_second:
+            time.sleep(estimate_tokens(text) / self.tokens_per_second)
+
+    def make_llm(self, model_name: str = "deepseek-v3") -> LLM:
+        return LLM(model_name, base_url=self.url, api_key=self.api_key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'stream_requests': self.stream_requests,
+                'errors': self.errors,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+            }
+
+
+class _ArxivHandler(_QuietHandler):
+    def do_GET(self):
+        mock: "MockArxivServer" = self.server.mock
+        parsed = urlparse(self.path)
+        if parsed.path.rstrip("/") != "/api/query":
+            return self._send(404, "not found", "text/plain")
+        retry_after = mock._admit()
+        if retry_after is not None:
+            return self._send(503, "Rate exceeded.", "text/plain", {'Retry-After': f"{retry_after:.3f}"})
+        if mock.latency:
+            time.sleep(mock.latency)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        max_results = int(params.get('max_results', 10))
+        if params.get('id_list'):
+            papers = [mock.paper_by_id(pid) for pid in params['id_list'].split(",")]
+        else:
+            papers = mock.search(params.get('search_query', ""), max_results)
+        self._send(200, _atom_feed(papers), "application/atom+xml")
+
+
+def _atom_feed(papers: List[Dict[str, Any]]) -> str:
+    entries = []
+    for paper in papers:
+        authors = "".join(f"<author><name>{escape(a)}</name></author>" for a in paper.get('authors', []))
+        categories = "".join(f'<category term="{escape(c)}"/>' for c in paper.get('categories', []))
+        entries.append(
+            f"<entry><id>http://arxiv.org/abs/{escape(paper['id'])}</id>"
+            f"<title>{escape(paper['title'])}</title><summary>{escape(paper.get('summary', ''))}</summary>"
+            f"<published>{escape(paper.get('published', '2024-01-01'))}T00:00:00Z</published>"
+            f"{authors}{categories}</entry>")
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+            f"<opensearch:totalResults>{len(papers)}</opensearch:totalResults>{''.join(entries)}</feed>")
+
+
+def _terms(text: str) -> set:
+    return set(re.findall(r"[0-9a-z]+", text.lower()))
+
+
+class MockArxivServer(_MockServer):
+    handler_class = _ArxivHandler
+
+    def __init__(self, fixtures: Union[str, List[Dict[str, Any]], None] = None, latency: float = 0.0,
+                 min_interval: float = 0.0, **kwargs):
+        """
+        fixtures: 论文列表（或JSON文件路径），每项含 id/title/summary/authors/categories/published；
+                  未提供时按查询确定性生成论文
+        latency: 每个请求的响应延迟（秒）
+        min_interval: 两次请求的最小间隔，过快的请求返回503和Retry-After（模拟arXiv限流）
+        """
+        super().__init__(**kwargs)
+        if isinstance(fixtures, str):
+            with open(fixtures, "r", encoding="utf-8") as f:
+                fixtures = json.load(f)
+        self.fixtures = list(fixtures or [])
+        self.latency = latency
+        self.min_interval = min_interval
+        self._last_request = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.queries: List[str] = []
+
+    @property
+    def url(self) -> str:
+        return self.address + "/api/query"
+
+    def _admit(self) -> Optional[float]:
+        """返回None表示放行；否则返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._last_request + self.min_interval - now
+            if self.min_interval and wait > 0:
+                self.throttled += 1
+                return wait
+            self._last_request = now
+            self.requests += 1
+            return None
+
+    def search(self, search_query: str, max_results: int) -> List[Dict[str, Any]]:
+        query = " ".join(re.findall(r"all:([^()]+?)(?:\)| AND |$)", search_query)) or search_query
+        with self._lock:
+            self.queries.append(query)
+        if not self.fixtures:
+            return [self._synthetic(query, i) for i in range(max_results)]
+        terms = _terms(query)
+        scored = []
+        for paper in self.fixtures:
+            score = len(terms & _terms(f"{paper['title']} {paper.get('summary', '')}"))
+            if score:
+                scored.append((-score, paper['id'], paper))
+        return [paper for _, _, paper in sorted(scored, key=lambda item: item[:2])[:max_results]]
+
+    def paper_by_id(self, paper_id: str) -> Dict[str, Any]:
+        for paper in self.fixtures:
+            if paper['id'] == paper_id:
+                return paper
+        return self._synthetic(paper_id, 0)
+
+    @staticmethod
+    def _synthetic(query: str, index: int) -> Dict[str, Any]:
+        digest = int(hashlib.sha1(f"{query}|{index}".encode("utf-8")).hexdigest()[:8], 16)
+        return {
+            'id': f"24{digest % 12 + 1:02d}.{digest % 100000:05d}",
+            'title': f"{query.strip()} study {index}",
+            'summary': f"We study {query.strip()} and report results on standard benchmarks ({index}).",
+            'authors': ["Alice Zhang", "Bob Li"],
+            'categories': ["cs.LG", "cs.CL"],
+            'published': f"2024-{digest % 12 + 1:02d}-{digest % 28 + 1:02d}",
+        }
+
+    def make_gateway(self) -> ArxivSearchGateway:
+        """请求间隔与服务端限流一致的独立网关（本地服务无需遵守真实arXiv的1秒间隔）"""
+        return ArxivSearchGateway(min_interval=self.min_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'requests': self.requests, 'throttled': self.throttled, 'queries': len(self.queries)}
+
+
+def attach_mock_servers(researcher, llm_server: Optional[MockLLMServer] = None,
+                        arxiv_server: Optional[MockArxivServer] = None):
+    """把研究引擎（DeepResearcher / DeepSeekAgenticResearcher）的LLM和arXiv请求指向本地模拟服务"""
+    if llm_server is not None:
+        researcher.llm = llm_server.make_llm(getattr(researcher.llm, 'model_name', "deepseek-v3"))
+    if arxiv_server is not None:
+        gateway = arxiv_server.make_gateway()
+        for tool in iter_arxiv_tools(researcher.search_tool):
+            tool.base_url = arxiv_server.url
+            tool.gateway = gateway
+    return researcher
@@ -0,0 +1,77 @@
+"""
+研究进度事件日志 - 每个Web会话一个只追加的事件序列
+
+进度消息不再放进会被消费掉的Queue：每条事件追加到日志并分配递增的序号（从1开始），
+SSE连接按序号读取，用阻塞等待代替轮询，新事件到达立即推送；
+浏览器断线重连时带上 Last-Event-ID，从该序号之后继续推送，不丢失也不重复。
+线程模式的SSE用 read(timeout) 阻塞等待；asyncio模式通过 add_listener 注册回调，在追加/关闭时被唤醒。
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class ProgressLog:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._events: List[Dict[str, Any]] = []
+        self._closed = False
+        self._listeners: List[Callable[[], Any]] = []
+
+    def append(self, event: Dict[str, Any]) -> int:
+        """追加事件，返回其序号"""
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+            seq = len(self._events)
+            listeners = list(self._listeners)
+        self._fire(listeners)
+        return seq
+
+    def close(self):
+        """研究结束，不再有新事件；唤醒所有等待中的读取"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        self._fire(listeners)
+
+    def add_listener(self, callback: Callable[[], Any]):
+        """注册追加/关闭时的回调（在写入线程中调用，应尽快返回）"""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], Any]):
+        with self._cond:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    @staticmethod
+    def _fire(listeners):
+        for callback in listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ 进度事件回调出错: {e}")
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def last_seq(self) -> int:
+        with self._cond:
+            return len(self._events)
+
+    def __len__(self) -> int:
+        return self.last_seq
+
+    def read(self, after: int = 0, timeout: Optional[float] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        返回序号大于after的事件 [(seq, event)]；暂无新事件时最多阻塞timeout秒，
+        超时或日志已关闭时返回空列表
+        """
+        with self._cond:
+            if len(self._events) <= after and not self._closed and timeout != 0:
+                self._cond.wait_for(lambda: len(self._events) > after or self._closed, timeout)
+            return [(seq, self._events[seq - 1]) for seq in range(max(after, 0) + 1, len(self._events) + 1)]
@@ -0,0 +1,53 @@
+"""
+结构化研究报告 - 与Markdown报告一同生成的JSON模型
+
+包含按标题拆分的章节、引用表和统计信息，Web前端直接使用引用表，无需再从Markdown中解析论文元数据。
+"""
+
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+
+
+def split_sections(markdown: str) -> List[Dict[str, Any]]:
+    """按Markdown标题拆分章节；第一个标题之前的内容作为无标题章节"""
+    sections = []
+    current = {'level': 0, 'title': "", 'lines': []}
+    in_code = False
+    for line in (markdown or "").splitlines():
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        match = None if in_code else _HEADING.match(line)
+        if match:
+            sections.append(current)
+            current = {'level': len(match.group(1)), 'title': match.group(2), 'lines': []}
+        else:
+            current['lines'].append(line)
+    sections.append(current)
+    return [{'level': s['level'], 'title': s['title'], 'content': "\n".join(s['lines']).strip()}
+            for s in sections if s['title'] or "".join(s['lines']).strip()]
+
+
+@dataclass
+class ResearchReport:
+    question: str
+    markdown: str  # 完整报告（核心报告 + 统计信息 + 引用索引）
+    sections: List[Dict[str, Any]] = field(default_factory=list)  # 核心报告的章节
+    citations: List[Dict[str, Any]] = field(default_factory=list)  # 引用表（CitationRegistry.export格式）
+    stats: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def build(cls, question: str, markdown: str, core_report: str, citations: List[Dict[str, Any]],
+              stats: Dict[str, Any] = None) -> "ResearchReport":
+        return cls(question=question, markdown=markdown, sections=split_sections(core_report),
+                   citations=citations, stats=stats or {})
+
+    def to_dict(self, include_markdown: bool = True) -> Dict[str, Any]:
+        data = asdict(self)
+        if not include_markdown:
+            data.pop('markdown')
+        return data
@@ -0,0 +1,194 @@
+"""
+研究报告存储 - SQLite持久化已完成的研究报告，支持全文检索和重复问题秒回
+
+每份报告记录问题、规范化问题哈希、报告Markdown、引用列表和耗时等信息。
+lookup() 在新鲜期内命中完全相同（规范化后）或近似相同的问题时直接返回历史报告；
+近似匹配要求两个问题的数字/版本号完全一致（"Llama 2" 与 "Llama 3" 不是同一个问题），或关键词集合相同；
+search() 基于FTS5全文索引检索历史报告，中文使用trigram分词（SQLite不支持时退回unicode61）。
+"""
+
+import difflib
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+_FILLER = re.compile(r"(请问|请|什么是|是什么|有哪些|吗|呢|一下)")
+_VERSION = re.compile(r"\d+(?:\.\d+)*[a-z]*")
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题：全半角统一、小写、去掉标点空白和常见虚词"""
+    text = unicodedata.normalize("NFKC", question or "").lower()
+    text = _FILLER.sub("", text)
+    return re.sub(r"[^0-9a-z\u4e00-\u9fff]+", "", text)
+
+
+def question_tokens(question: str) -> frozenset:
+    """规范化问题的关键词集合（英文单词/数字、连续汉字片段）"""
+    text = _FILLER.sub(" ", unicodedata.normalize("NFKC", question or "").lower())
+    return frozenset(re.findall(r"[0-9a-z]+|[\u4e00-\u9fff]+", text))
+
+
+def version_tokens(question: str) -> List[str]:
+    """问题中的数字/版本号（如 3、4o、3.1），近似匹配时必须完全一致"""
+    return sorted(_VERSION.findall(unicodedata.normalize("NFKC", question or "").lower()))
+
+
+def question_hash(question: str) -> str:
+    return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()
+
+
+class ReportStore:
+    def __init__(self, path: str = "research_reports.db", freshness_seconds: float = 7 * 86400,
+                 similarity_threshold: float = 0.9):
+        """
+        freshness_seconds: 超过该时长的报告不再用于秒回（仍可被search检索到）
+        similarity_threshold: 规范化问题的相似度达到该值视为近似相同的问题
+        """
+        self.path = path
+        self.freshness_seconds = freshness_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._tokenizer = self._init_schema()
+
+    def _init_schema(self) -> str:
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT,
+                    question TEXT NOT NULL,
+                    normalized_question TEXT NOT NULL,
+                    question_hash TEXT NOT NULL,
+                    report TEXT NOT NULL,
+                    citations TEXT NOT NULL,
+                    duration REAL,
+                    rounds INTEGER,
+                    papers INTEGER,
+                    created_at REAL NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_hash ON reports(question_hash, created_at)")
+            row = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'reports_fts'").fetchone()
+            if row is not None:
+                return "trigram" if "trigram" in row[0] else "unicode61"
+            for tokenizer in ("trigram", "unicode61"):
+                try:
+                    self._conn.execute(
+                        "CREATE VIRTUAL TABLE reports_fts USING fts5("
+                        f"question, report, content='reports', content_rowid='id', tokenize='{tokenizer}')"
+                    )
+                    return tokenizer
+                except sqlite3.OperationalError:
+                    continue
+        raise RuntimeError("当前SQLite不支持FTS5")
+
+    def save(self, question: str, report: str, citations: List[Dict[str, Any]] = None,
+             session_id: str = "", duration: float = None, rounds: int = None) -> int:
+        """保存一份报告，返回报告ID"""
+        citations = citations or []
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO reports (session_id, question, normalized_question, question_hash, report, "
+                "citations, duration, rounds, papers, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, question, normalize_question(question), question_hash(question), report,
+                 json.dumps(citations, ensure_ascii=False), duration, rounds, len(citations), time.time())
+            )
+            report_id = cursor.lastrowid
+            self._conn.execute("INSERT INTO reports_fts (rowid, question, report) VALUES (?, ?, ?)",
+                               (report_id, question, report))
+        return report_id
+
+    def get(self, report_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def lookup(self, question: str, freshness_seconds: float = None) -> Optional[Dict[str, Any]]:
+        """
+        查找新鲜期内完全相同或近似相同问题的最新报告，未命中返回None
+        """
+        freshness = self.freshness_seconds if freshness_seconds is None else freshness_seconds
+        since = time.time() - freshness
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM reports WHERE question_hash = ? AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+                (question_hash(question), since)
+            ).fetchone()
+        if row is not None:
+            return dict(self._to_dict(row), match="exact", similarity=1.0)
+
+        # 近似匹配：全文索引召回候选，再按规范化问题的编辑相似度判断；
+        # 数字/版本号不同的问题（GPT-4 与 GPT-5）编辑距离很小但不是同一个问题，只接受完全命中
+        normalized = normalize_question(question)
+        versions, tokens = version_tokens(question), question_tokens(question)
+        best, best_score = None, 0.0
+        for row in self._match_rows("question", question, since, limit=20, operator="OR"):
+            if version_tokens(row['question']) != versions:
+                continue
+            score = difflib.SequenceMatcher(None, normalized, row['normalized_question']).ratio()
+            if score < self.similarity_threshold and question_tokens(row['question']) != tokens:
+                continue
+            if score > best_score:
+                best, best_score = row, score
+        if best is not None:
+            return dict(self._to_dict(best), match="similar", similarity=round(best_score, 3))
+        return None
+
+    def search(self, text: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """全文检索历史报告（问题和报告正文，所有关键词都需出现），按相关度排序，返回摘要信息"""
+        results = []
+        for row in self._match_rows(None, text, 0.0, limit, operator="AND"):
+            results.append({
+                'id': row['id'],
+                'question': row['question'],
+                'created_at': row['created_at'],
+                'papers': row['papers'],
+                'snippet': row['snippet'],
+            })
+        return results
+
+    def _match_rows(self, column: Optional[str], text: str, since: float, limit: int,
+                    operator: str) -> List[sqlite3.Row]:
+        terms = self._fts_terms(text)
+        if not terms:
+            return []
+        prefix = f"{column} : " if column else ""
+        match = prefix + "(" + f" {operator} ".join(terms) + ")"
+        with self._lock:
+            return self._conn.execute(
+                "SELECT r.*, snippet(reports_fts, 1, '**', '**', '…', 16) AS snippet "
+                "FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid "
+                "WHERE reports_fts MATCH ? AND r.created_at >= ? ORDER BY bm25(reports_fts) LIMIT ?",
+                (match, since, limit)
+            ).fetchall()
+
+    def _fts_terms(self, text: str) -> List[str]:
+        """把任意文本转换为FTS5查询词（加引号避免语法错误）；trigram分词下短于3字的片段无法匹配"""
+        words = re.findall(r"[0-9a-zA-Z]+|[\u4e00-\u9fff]+", unicodedata.normalize("NFKC", text or ""))
+        if self._tokenizer == "trigram":
+            terms = []
+            for word in words:
+                if re.match(r"[\u4e00-\u9fff]", word) and len(word) > 3:
+                    terms.extend(word[i:i + 3] for i in range(len(word) - 2))
+                elif len(word) >= 3:
+                    terms.append(word)
+            words = terms
+        return [f'"{w}"' for w in dict.fromkeys(words)][:64]
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        data = {key: row[key] for key in row.keys() if key not in ('normalized_question', 'snippet')}
+        data['citations'] = json.loads(data['citations'])
+        return data
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,185 @@
+"""
+研究预算 - 多个并发分支共享的全局资源上限
+
+统计LLM调用次数、LLM token、arXiv调用次数和墙钟时间，任何一项用尽后不再开启新的搜索或分析。
+为最终报告预留LLM调用、token和时间，保证预算耗尽时仍能生成报告。
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class BudgetExhaustedError(RuntimeError):
+    """研究预算拒绝了本次LLM调用"""
+
+
+class ResearchBudget:
+    def __init__(self, max_llm_calls: Optional[int] = None, max_search_calls: Optional[int] = None,
+                 max_seconds: Optional[float] = None, reserve_llm_calls: int = 1,
+                 max_tokens: Optional[int] = None, deadline: Optional[float] = None,
+                 reserve_tokens: int = 8000, reserve_seconds: float = 30.0,
+                 nearly_spent_ratio: float = 0.9):
+        """
+        max_seconds为相对研究开始的时长，deadline为绝对截止时间（time.time()时间戳），
+        两者同时设置时取较早者。reserve_*为最终报告预留的额度。
+        """
+        self.max_llm_calls = max_llm_calls
+        self.max_search_calls = max_search_calls
+        self.max_seconds = max_seconds
+        self.reserve_llm_calls = reserve_llm_calls
+        self.max_tokens = max_tokens
+        self.deadline = deadline
+        self.reserve_tokens = reserve_tokens
+        self.reserve_seconds = reserve_seconds
+        self.nearly_spent_ratio = nearly_spent_ratio
+
+        self._lock = threading.Lock()
+        self.llm_calls = 0
+        self.search_calls = 0
+        self.tokens = 0
+        self.started_at = time.monotonic()
+
+    def start(self):
+        """开始计时并清零计数（每次研究开始时调用）"""
+        with self._lock:
+            self.llm_calls = 0
+            self.search_calls = 0
+            self.tokens = 0
+            self.started_at = time.monotonic()
+
+    def limits(self) -> Dict[str, Any]:
+        """构造参数（写入检查点，恢复研究时按相同上限重建预算）"""
+        return {'max_llm_calls': self.max_llm_calls, 'max_search_calls': self.max_search_calls,
+                'max_seconds': self.max_seconds, 'reserve_llm_calls': self.reserve_llm_calls,
+                'max_tokens': self.max_tokens, 'deadline': self.deadline, 'reserve_tokens': self.reserve_tokens,
+                'reserve_seconds': self.reserve_seconds, 'nearly_spent_ratio': self.nearly_spent_ratio}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """已用额度（写入检查点，恢复研究时继续计数）"""
+        with self._lock:
+            return {'llm_calls': self.llm_calls, 'search_calls': self.search_calls, 'tokens': self.tokens,
+                    'elapsed': self.elapsed()}
+
+    def restore(self, snapshot: Dict[str, Any]):
+        """从检查点恢复已用额度；中断期间的时间不计入"""
+        with self._lock:
+            self.llm_calls = snapshot.get('llm_calls', 0)
+            self.search_calls = snapshot.get('search_calls', 0)
+            self.tokens = snapshot.get('tokens', 0)
+            self.started_at = time.monotonic() - snapshot.get('elapsed', 0.0)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def time_left(self) -> Optional[float]:
+        """剩余墙钟时间，未设置时间上限时返回None"""
+        limits = []
+        if self.max_seconds is not None:
+            limits.append(self.max_seconds - self.elapsed())
+        if self.deadline is not None:
+            limits.append(self.deadline - time.time())
+        if not limits:
+            return None
+        return max(0.0, min(limits))
+
+    def add_tokens(self, count: int):
+        """记录LLM token消耗（prompt + completion）"""
+        with self._lock:
+            self.tokens += count
+
+    def nearly_spent(self) -> Optional[str]:
+        """
+        预算是否即将耗尽（需要停止搜索、把剩余额度留给最终报告）
+
+        返回原因描述，未接近上限时返回None。
+        """
+        time_left = self.time_left()
+        if time_left is not None and time_left <= self.reserve_seconds:
+            return f"剩余时间{time_left:.0f}秒，需为最终报告预留{self.reserve_seconds:.0f}秒"
+        with self._lock:
+            if self.max_tokens is not None and self.tokens >= self.max_tokens - self.reserve_tokens:
+                return f"已用{self.tokens:,} token，需为最终报告预留{self.reserve_tokens:,} token"
+            for used, limit, name in ((self.llm_calls, self.max_llm_calls, "LLM调用"),
+                                      (self.search_calls, self.max_search_calls, "arXiv调用")):
+                if limit is not None and used >= limit * self.nearly_spent_ratio:
+                    return f"{name}已用{used}/{limit}次"
+        return None
+
+    def try_llm_call(self, reserved: bool = False) -> bool:
+        """
+        申请一次LLM调用（批准时计数）
+
+        reserved=True 表示使用为最终报告预留的额度。
+        """
+        with self._lock:
+            if not self._llm_call_allowed(reserved):
+                return False
+            self.llm_calls += 1
+            return True
+
+    def can_call_llm(self, reserved: bool = False) -> bool:
+        """是否还能申请LLM调用（只检查不计数，用于决定是否开始一个阶段）"""
+        with self._lock:
+            return self._llm_call_allowed(reserved)
+
+    def llm_calls_left(self, reserved: bool = False) -> Optional[int]:
+        """剩余可申请的LLM调用次数，未设置次数上限时返回None"""
+        if self.max_llm_calls is None:
+            return None
+        with self._lock:
+            limit = self.max_llm_calls if reserved else self.max_llm_calls - self.reserve_llm_calls
+            return max(0, limit - self.llm_calls)
+
+    def _llm_call_allowed(self, reserved: bool) -> bool:
+        if not reserved and self._time_exhausted():
+            return False
+        if not reserved and self.max_tokens is not None and \
+                self.tokens >= self.max_tokens - self.reserve_tokens:
+            return False
+        if self.max_llm_calls is not None:
+            limit = self.max_llm_calls if reserved else self.max_llm_calls - self.reserve_llm_calls
+            if self.llm_calls >= limit:
+                return False
+        return True
+
+    def try_search_calls(self, count: int = 1) -> int:
+        """申请count次arXiv调用，返回实际批准的次数（可能少于申请数）"""
+        with self._lock:
+            if self._time_exhausted():
+                return 0
+            granted = count
+            if self.max_search_calls is not None:
+                granted = max(0, min(count, self.max_search_calls - self.search_calls))
+            self.search_calls += granted
+            return granted
+
+    def exhausted(self) -> bool:
+        with self._lock:
+            if self._time_exhausted():
+                return True
+            if self.max_tokens is not None and self.tokens >= self.max_tokens - self.reserve_tokens:
+                return True
+            if self.max_llm_calls is not None and \
+                    self.llm_calls >= self.max_llm_calls - self.reserve_llm_calls:
+                return True
+            if self.max_search_calls is not None and self.search_calls >= self.max_search_calls:
+                return True
+            return False
+
+    def _time_exhausted(self) -> bool:
+        time_left = self.time_left()
+        return time_left is not None and time_left <= 0
+
+    def usage(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'llm_calls': self.llm_calls,
+                'max_llm_calls': self.max_llm_calls,
+                'tokens': self.tokens,
+                'max_tokens': self.max_tokens,
+                'search_calls': self.search_calls,
+                'max_search_calls': self.max_search_calls,
+                'elapsed_seconds': round(self.elapsed(), 2),
+                'max_seconds': self.max_seconds,
+            }
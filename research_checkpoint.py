@@ -0,0 +1,121 @@
+"""
+研究检查点 - 把每个阶段完成后的研究状态写入本地存储
+
+每个会话一个JSON文件，写入时先写临时文件再原子替换，进程在任意时刻退出都不会留下半个文件。
+DeepResearcher.resume(session_id) 读取检查点，从最后完成的阶段继续。
+已完成（stage为done）的检查点保留done_ttl秒供resume直接返回结果，之后在写入时顺带清理。
+"""
+
+import json
+import os
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from search_tool import SearchResult
+
+
+def serialize_result(result: SearchResult) -> Dict[str, Any]:
+    """SearchResult转为可JSON化的字典（包含动态附加的citation）"""
+    data = asdict(result)
+    if hasattr(result, 'citation'):
+        data['citation'] = result.citation
+    return data
+
+
+def deserialize_result(data: Dict[str, Any]) -> SearchResult:
+    data = dict(data)
+    citation = data.pop('citation', None)
+    result = SearchResult(**data)
+    if citation is not None:
+        result.citation = citation
+    return result
+
+
+def serialize_results(results: List[SearchResult]) -> List[Dict[str, Any]]:
+    return [serialize_result(r) for r in results]
+
+
+def deserialize_results(items: List[Dict[str, Any]]) -> List[SearchResult]:
+    return [deserialize_result(item) for item in items]
+
+
+class CheckpointStore:
+    def __init__(self, directory: str = ".research_checkpoints", done_ttl: float = 24 * 3600,
+                 purge_interval: float = 600.0):
+        """
+        done_ttl: 已完成的检查点保留多少秒
+        purge_interval: 写入时最多每隔多少秒扫描一次过期检查点
+        """
+        self.directory = directory
+        self.done_ttl = done_ttl
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        safe_id = "".join(c for c in session_id if c.isalnum() or c in "-_")
+        return os.path.join(self.directory, f"{safe_id}.json")
+
+    def save(self, session_id: str, state: Dict[str, Any]):
+        """原子写入检查点"""
+        state['updated_at'] = time.time()
+        path = self._path(session_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        if time.time() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def delete(self, session_id: str):
+        path = self._path(session_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """删除完成超过done_ttl秒的检查点，返回删除数"""
+        now = time.time() if now is None else now
+        self._last_purge = now
+        purged = 0
+        for name, state in self._iter_states():
+            if state.get('stage') == 'done' and now - state.get('updated_at', 0) > self.done_ttl:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    purged += 1
+                except OSError:
+                    pass
+        if purged:
+            print(f"🧹 清理 {purged} 个已完成的研究检查点")
+        return purged
+
+    def _iter_states(self):
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    yield name, json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def list_sessions(self, include_done: bool = False) -> List[Dict[str, Any]]:
+        """列出检查点摘要，默认只返回未完成的会话"""
+        sessions = []
+        for _, state in self._iter_states():
+            if state.get('stage') == 'done' and not include_done:
+                continue
+            sessions.append({
+                'session_id': state.get('session_id'),
+                'question': state.get('question'),
+                'stage': state.get('stage'),
+                'updated_at': state.get('updated_at'),
+            })
+        return sessions
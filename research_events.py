@@ -0,0 +1,121 @@
+"""
+研究进度事件总线
+
+研究引擎通过EventBus发布结构化事件（阶段开始/结束及耗时、查询、每个查询的结果数、
+LLM调用与token用量、流式生成的报告片段等），Web界面、CLI或基准测试按需订阅。
+没有订阅者时emit直接返回，stage()也不计时，对研究流程零开销；
+构造代价较高的事件数据时，调用方应先检查bus.active。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 事件类型
+RESEARCH_START = "research_start"
+RESEARCH_END = "research_end"
+STAGE_START = "stage_start"
+STAGE_END = "stage_end"
+THINKING = "thinking"
+QUERIES = "queries"
+QUERY_RESULT = "query_result"
+ANALYSIS = "analysis"
+LLM_CALL = "llm_call"
+TOOL_CALL = "tool_call"
+REPORT_DELTA = "report_delta"  # 最终报告的增量文本；reset=True表示丢弃之前收到的内容
+ERROR = "error"
+
+
+@dataclass
+class ResearchEvent:
+    type: str
+    session_id: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'type': self.type, 'session_id': self.session_id,
+                'timestamp': self.timestamp, **self.data}
+
+
+Subscriber = Callable[[ResearchEvent], None]
+
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 订阅者列表整体替换（copy-on-write），emit无需加锁即可遍历
+        self._subscribers: Tuple[Tuple[Subscriber, Optional[frozenset]], ...] = ()
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self, callback: Subscriber, event_types: Iterable[str] = None) -> Callable[[], None]:
+        """
+        订阅事件，event_types为空时接收全部事件
+
+        返回取消订阅的函数。
+        """
+        types = frozenset(event_types) if event_types else None
+        with self._lock:
+            self._subscribers = self._subscribers + ((callback, types),)
+        return lambda: self.unsubscribe(callback)
+
+    def unsubscribe(self, callback: Subscriber):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s[0] is not callback)
+
+    def emit(self, event_type: str, session_id: str = "default", **data):
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        event = ResearchEvent(event_type, session_id, data)
+        for callback, types in subscribers:
+            if types is not None and event_type not in types:
+                continue
+            try:
+                callback(event)
+            except Exception as e:
+                # 订阅者出错不能影响研究流程
+                print(f"⚠️ 事件订阅者处理 {event_type} 出错: {e}")
+
+    @contextmanager
+    def stage(self, name: str, session_id: str = "default", **data):
+        """阶段上下文：发布stage_start，退出时发布带耗时的stage_end"""
+        if not self._subscribers:
+            yield
+            return
+        self.emit(STAGE_START, session_id, stage=name, **data)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.emit(STAGE_END, session_id, stage=name, duration=time.perf_counter() - start,
+                      status=status, **data)
+
+
+class StageTimer:
+    """订阅stage_end事件，按阶段汇总耗时（用于统计各阶段延迟）"""
+
+    def __init__(self, bus: EventBus):
+        self.durations: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._unsubscribe = bus.subscribe(self._on_event, [STAGE_END])
+
+    def _on_event(self, event: ResearchEvent):
+        with self._lock:
+            self.durations.setdefault(event.data['stage'], []).append(event.data['duration'])
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: sum(values) for stage, values in self.durations.items()}
+
+    def close(self):
+        self._unsubscribe()
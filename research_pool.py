@@ -0,0 +1,173 @@
+"""
+研究任务池 - 固定数量的研究工作线程 + 有界排队（准入控制）
+
+突发的大量研究请求不再各自启动线程同时争抢LLM网关：最多workers个研究同时进行，
+其余按提交顺序排队；队列已满时submit抛出QueueFullError（Web返回429和Retry-After）。
+排队中的任务在位置变化时收到 on_queue(position, eta_seconds) 回调，用于向前端推送排队进度。
+预计等待时间按最近完成任务的平均耗时（指数滑动平均）估算。
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """研究队列已满"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Job:
+    def __init__(self, job_id: str, fn: Callable, args: tuple, on_queue: Optional[Callable]):
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.on_queue = on_queue
+        self.position = 0  # 最近一次通知的排队位置
+
+
+class ResearchWorkerPool:
+    def __init__(self, workers: int = 4, max_queue: int = 20, initial_duration: float = 120.0,
+                 smoothing: float = 0.2):
+        """
+        workers: 同时进行的研究数
+        max_queue: 排队中（未开始）的研究数上限
+        initial_duration: 还没有完成任何研究时假设的单次研究耗时（秒）
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.smoothing = smoothing
+        self.avg_duration = initial_duration
+        self._cond = threading.Condition()
+        self._queue: "deque[_Job]" = deque()
+        self._threads = []
+        self._running: Dict[str, float] = {}  # job_id → 开始时间
+        self._shutdown = False
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, job_id: str, fn: Callable, *args, on_queue: Callable[[int, int], Any] = None) -> int:
+        """
+        提交任务，返回排队位置（0表示有空闲工作线程，立即开始）；队列已满时抛出QueueFullError
+        """
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("研究任务池已关闭")
+            self._ensure_workers()
+            waiting = self._waiting()
+            would_wait = len(self._queue) >= self.workers - len(self._running)
+            if would_wait and len(waiting) >= self.max_queue:
+                self.rejected += 1
+                retry_after = self.retry_after()
+                raise QueueFullError(f"研究队列已满（{len(waiting)} 个排队），请 {retry_after} 秒后重试",
+                                     retry_after)
+            job = _Job(job_id, fn, args, on_queue)
+            self._queue.append(job)
+            position = len(waiting) + 1 if self._waiting() else 0
+            self._cond.notify()
+        if position:
+            self._notify(job, position)
+        return position
+
+    def _waiting(self):
+        """真正需要等待的任务（队列里排在空闲工作线程之后的部分），调用方需持有锁"""
+        free = max(0, self.workers - len(self._running))
+        return list(self._queue)[free:]
+
+    def eta(self, position: int) -> int:
+        """排在第position位的任务预计等待的秒数"""
+        if position <= 0:
+            return 0
+        return int(math.ceil(position / self.workers) * self.avg_duration)
+
+    def retry_after(self) -> int:
+        """队列已满时建议客户端等待的秒数：大约一个工作线程空出来的时间"""
+        return max(1, int(math.ceil(self.avg_duration / self.workers)))
+
+    def _notify(self, job: _Job, position: int):
+        # 只在位置变化时通知（工作线程取走已分配的任务不改变真正排队的顺序）
+        if job.on_queue is None or position == job.position:
+            return
+        job.position = position
+        try:
+            job.on_queue(position, self.eta(position))
+        except Exception as e:
+            print(f"⚠️ 排队进度回调出错: {e}")
+
+    def _ensure_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f"research-worker-{len(self._threads) + 1}")
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._shutdown:
+                    self._cond.wait()
+                if self._shutdown and not self._queue:
+                    return
+                job = self._queue.popleft()
+                self._running[job.job_id] = time.monotonic()
+                waiting = self._waiting()
+            # 队首出队后，后面的任务都前进一位
+            for position, queued in enumerate(waiting, start=1):
+                self._notify(queued, position)
+
+            start = time.monotonic()
+            ok = True
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                ok = False
+                print(f"❌ 研究任务 {job.job_id} 失败: {e}")
+            duration = time.monotonic() - start
+            with self._cond:
+                self._running.pop(job.job_id, None)
+                self.avg_duration += self.smoothing * (duration - self.avg_duration)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def position(self, job_id: str) -> Optional[int]:
+        """任务当前的排队位置；已开始时返回0，未知任务返回None"""
+        with self._cond:
+            if job_id in self._running:
+                return 0
+            for job in self._queue:
+                if job.job_id == job_id:
+                    waiting = self._waiting()
+                    return waiting.index(job) + 1 if job in waiting else 0
+            return None
+
+    def shutdown(self, wait: bool = True):
+        """不再接受新任务；已排队的任务执行完后工作线程退出"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queued = len(self._waiting())
+            return {
+                'workers': self.workers,
+                # 已分配到空闲工作线程、尚未被取走的任务也算进行中
+                'running': len(self._running) + len(self._queue) - queued,
+                'queued': queued,
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_duration': round(self.avg_duration, 1),
+            }
@@ -0,0 +1,291 @@
+"""
+研究过程录制与回放 - 离线复现LLM和arXiv的全部I/O
+
+录制（TraceRecorder）：包装研究引擎的LLM和arXiv网关，把每次LLM请求/响应（流式调用保留各片段的时间偏移）
+和每次arXiv HTTP请求/响应写入紧凑的trace文件（JSONL，路径以 .gz 结尾时gzip压缩；提示词只保存哈希）。
+回放（TraceReplayer）：按请求内容的哈希确定性地返回录制的响应，同一请求多次出现时按录制顺序依次返回；
+可选按录制耗时（或按比例缩放）等待，用于离线基准测试、对比引擎改动和CI回归测试。
+两种引擎的提示词都包含当前日期：录制时把研究器的日期固定下来并写入trace头，回放时沿用该日期，
+第二天回放同一trace时提示词哈希不变。
+
+用法：
+    recorder = TraceRecorder("run.jsonl.gz")
+    recorder.attach(researcher)      # DeepResearcher 或 DeepSeekAgenticResearcher
+    researcher.research(question)
+    recorder.save()
+
+    replayer = TraceReplayer("run.jsonl.gz", latency_scale=None)  # None: 不等待；1.0: 按录制耗时
+    replayer.attach(researcher)
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+from llm import LLM
+from search_backends import iter_arxiv_tools
+from search_gateway import ArxivSearchGateway, _default_fetcher, get_search_gateway
+
+TRACE_VERSION = 1
+
+
+class TraceMissError(LookupError):
+    """回放时遇到trace中没有录制的请求"""
+
+
+def llm_key(model: str, prompt: str) -> str:
+    return hashlib.sha1(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:20]
+
+
+def arxiv_key(url: str, params: Dict[str, Any]) -> str:
+    canonical = json.dumps([url, sorted((str(k), str(v)) for k, v in (params or {}).items())],
+                           ensure_ascii=False)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class RecordingLLM:
+    """LLM代理：调用被包装的LLM并录制请求和响应，其余属性透传"""
+
+    def __init__(self, llm, recorder: "TraceRecorder"):
+        self._llm = llm
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._llm, name)
+
+    @property
+    def _model(self) -> str:
+        return getattr(self._llm, 'model_name', "")
+
+    def response(self, query):
+        start = time.perf_counter()
+        content = self._llm.response(query)
+        self._recorder.record_llm(self._model, query, content, time.perf_counter() - start,
+                                  getattr(self._llm, 'last_usage', None))
+        return content
+
+    def stream_response(self, query):
+        if not hasattr(self._llm, 'stream_response'):
+            yield self.response(query)
+            return
+        start = time.perf_counter()
+        deltas = []
+        try:
+            for delta in self._llm.stream_response(query):
+                deltas.append([round(time.perf_counter() - start, 4), delta])
+                yield delta
+        finally:
+            self._recorder.record_llm(self._model, query, "".join(d for _, d in deltas),
+                                      time.perf_counter() - start,
+                                      getattr(self._llm, 'last_usage', None), deltas=deltas)
+
+
+class TraceRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+        self.current_date = time.strftime("%Y-%m-%d, %A")  # 录制时提示词使用的日期
+
+    def record_llm(self, model: str, prompt: str, response: str, latency: float,
+                   usage: Optional[Dict[str, Any]] = None, deltas: Optional[List] = None):
+        record = {
+            'kind': 'llm',
+            'key': llm_key(model, prompt),
+            'model': model,
+            'prompt_chars': len(prompt or ""),
+            'latency': round(latency, 4),
+        }
+        if deltas is not None:
+            record['deltas'] = deltas
+        else:
+            record['response'] = response
+        if usage and not usage.get('estimated'):
+            record['usage'] = {k: usage[k] for k in ('prompt_tokens', 'completion_tokens') if k in usage}
+        with self._lock:
+            self.records.append(record)
+
+    def record_arxiv(self, url: str, params: Dict[str, Any], response, latency: float):
+        record = {
+            'kind': 'arxiv',
+            'key': arxiv_key(url, params),
+            'query': (params or {}).get('search_query') or (params or {}).get('id_list', ""),
+            'status': response.status_code,
+            'latency': round(latency, 4),
+            'text': response.text,
+        }
+        retry_after = (getattr(response, 'headers', None) or {}).get('Retry-After')
+        if retry_after:
+            record['retry_after'] = retry_after
+        with self._lock:
+            self.records.append(record)
+
+    def wrap_llm(self, llm) -> RecordingLLM:
+        return RecordingLLM(llm, self)
+
+    def wrap_fetcher(self, fetcher=None):
+        """包装网关的fetcher，录制每次HTTP请求（含重试）"""
+        fetcher = fetcher or _default_fetcher
+
+        def recording_fetcher(url, params, timeout):
+            start = time.perf_counter()
+            response = fetcher(url, params, timeout)
+            self.record_arxiv(url, params, response, time.perf_counter() - start)
+            return response
+
+        return recording_fetcher
+
+    def gateway(self, base: Optional[ArxivSearchGateway] = None) -> ArxivSearchGateway:
+        """与base（默认进程级网关）限速设置相同、但录制全部请求的独立网关"""
+        base = base or get_search_gateway()
+        return ArxivSearchGateway(min_interval=base._limiter.min_interval, max_retries=base.max_retries,
+                                  workers=base.workers, request_timeout=base.request_timeout,
+                                  fetcher=self.wrap_fetcher(base.fetcher))
+
+    def attach(self, researcher):
+        """录制研究引擎（DeepResearcher / DeepSeekAgenticResearcher）的LLM和arXiv请求"""
+        if getattr(researcher, 'current_date', None):
+            self.current_date = researcher.current_date
+        researcher.current_date = self.current_date
+        researcher.llm = self.wrap_llm(researcher.llm)
+        gateway = None
+        for tool in iter_arxiv_tools(researcher.search_tool):
+            gateway = gateway or self.gateway(tool.gateway)
+            tool.gateway = gateway
+        return researcher
+
+    def save(self) -> str:
+        with self._lock:
+            records = list(self.records)
+        with _open(self.path, "w") as f:
+            f.write(json.dumps({'kind': 'header', 'version': TRACE_VERSION, 'created_at': time.time(),
+                                'current_date': self.current_date, 'records': len(records)},
+                               ensure_ascii=False) + "\n")
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        print(f"📼 已录制 {len(records)} 条请求到 {self.path}")
+        return self.path
+
+
+class _ReplayResponse:
+    """回放的HTTP响应，提供网关需要的 status_code / headers / text"""
+
+    def __init__(self, record: Dict[str, Any], latency_scale: Optional[float]):
+        self.status_code = record.get('status', 200)
+        self.text = record.get('text', "")
+        self.headers = {}
+        if record.get('retry_after'):
+            # 限流等待与其他耗时一样按比例回放；不等待时立即重试
+            try:
+                self.headers['Retry-After'] = str(float(record['retry_after']) * (latency_scale or 0))
+            except ValueError:
+                self.headers['Retry-After'] = "0"
+
+
+class ReplayLLM(LLM):
+    """从trace回放响应的LLM，token用量统计与真实LLM一致"""
+
+    def __init__(self, replayer: "TraceReplayer", model_name: str = ""):
+        super().__init__(model_name)
+        self._replayer = replayer
+
+    def response(self, query):
+        self._local.usage = None
+        record = self._replayer.next_record('llm', llm_key(self.model_name, query))
+        self._replayer.wait(record.get('latency', 0))
+        content = record['response'] if 'response' in record else "".join(d for _, d in record['deltas'])
+        self._record_usage(query, content, record.get('usage'))
+        return content
+
+    def stream_response(self, query):
+        self._local.usage = None
+        record = self._replayer.next_record('llm', llm_key(self.model_name, query))
+        deltas = record.get('deltas')
+        if deltas is None:
+            self._replayer.wait(record.get('latency', 0))
+            deltas = [[0, record['response']]]
+        elapsed = 0.0
+        for offset, delta in deltas:
+            self._replayer.wait(offset - elapsed)
+            elapsed = max(elapsed, offset)
+            yield delta
+        self._record_usage(query, "".join(d for _, d in deltas), record.get('usage'))
+
+
+class TraceReplayer:
+    def __init__(self, path: str, latency_scale: Optional[float] = None):
+        """
+        latency_scale: None表示不等待（最快回放）；1.0按录制耗时等待；0.1为录制耗时的十分之一
+        """
+        self.path = path
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._queues: Dict[tuple, deque] = defaultdict(deque)
+        self._last: Dict[tuple, Dict[str, Any]] = {}
+        self.stats = {'llm': 0, 'arxiv': 0, 'repeats': 0, 'misses': 0}
+        self.current_date: Optional[str] = None  # 录制时提示词使用的日期（旧trace没有）
+        with _open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get('kind') == 'header':
+                    if record.get('version') != TRACE_VERSION:
+                        raise ValueError(f"不支持的trace版本: {record.get('version')}")
+                    self.current_date = record.get('current_date')
+                    continue
+                self._queues[(record['kind'], record['key'])].append(record)
+
+    def next_record(self, kind: str, key: str) -> Dict[str, Any]:
+        """按录制顺序取出下一条响应；同一请求的录制用完后重复最后一条"""
+        with self._lock:
+            queue = self._queues.get((kind, key))
+            if queue:
+                record = queue.popleft()
+                self._last[(kind, key)] = record
+            elif (kind, key) in self._last:
+                record = self._last[(kind, key)]
+                self.stats['repeats'] += 1
+            else:
+                self.stats['misses'] += 1
+                raise TraceMissError(f"trace中没有录制该{kind}请求: {key}")
+            self.stats[kind] += 1
+            return record
+
+    def wait(self, seconds: float):
+        if self.latency_scale and seconds > 0:
+            time.sleep(seconds * self.latency_scale)
+
+    def llm(self, model_name: str = "") -> ReplayLLM:
+        return ReplayLLM(self, model_name)
+
+    def fetch(self, url: str, params: Dict[str, Any], timeout: float = None) -> _ReplayResponse:
+        """可作为ArxivSearchGateway的fetcher"""
+        record = self.next_record('arxiv', arxiv_key(url, params))
+        self.wait(record.get('latency', 0))
+        return _ReplayResponse(record, self.latency_scale)
+
+    def gateway(self) -> ArxivSearchGateway:
+        """回放用网关：不限速（录制的耗时已包含在回放等待中）"""
+        return ArxivSearchGateway(min_interval=0, backoff_base=0, fetcher=self.fetch)
+
+    def attach(self, researcher):
+        """用回放的LLM和arXiv替换研究引擎的外部I/O，提示词日期固定为录制日期"""
+        if self.current_date:
+            researcher.current_date = self.current_date
+        researcher.llm = self.llm(getattr(researcher.llm, 'model_name', ""))
+        gateway = self.gateway()
+        for tool in iter_arxiv_tools(researcher.search_tool):
+            tool.gateway = gateway
+        return researcher
@@ -0,0 +1,383 @@
+"""
+可插拔检索后端与多后端并发聚合
+
+- SearchProvider: 检索后端协议，只需实现 name 和 search(query, max_results)；
+  支持过滤的后端再接受 date_from/categories 关键字参数（本模块的三个后端都支持）
+- ArxivBackend: 在线arXiv（经共享网关）
+- LocalIndexBackend: 本地缓存索引，聚合器会把见过的论文写入其中
+- HTTPSearchBackend: 本地HTTP检索服务（其他学术数据源的替身）
+- FederatedSearchTool: 并发查询多个后端，按各自截止时间收集结果，
+  用倒数排名融合(RRF)按规范化ID/标题合并，并记录每个后端的延迟
+
+build_default_search_tool 按配置复用进程级的后端（本地索引只加载/保存一份），
+default_backend_stats() 汇总各后端延迟，供Web的 /metrics/search 和命令行输出使用。
+"""
+
+import atexit
+import copy
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+try:
+    from typing import Protocol
+except ImportError:  # Python < 3.8
+    Protocol = object
+
+import requests
+
+from search_tool import ArxivSearchTool, SearchResult
+
+
+class SearchProvider(Protocol):
+    """检索后端协议"""
+
+    name: str
+
+    def search(self, query: str, max_results: int, **filters) -> List[SearchResult]:
+        ...
+
+
+def normalize_paper_key(result: SearchResult) -> str:
+    """论文合并键：优先用去掉版本号的arXiv ID，否则用规范化标题"""
+    paper_id = (result.paper_id or "").strip()
+    if not paper_id and result.url and "arxiv.org/abs/" in result.url:
+        paper_id = result.url.rsplit("/abs/", 1)[-1]
+    if paper_id:
+        return "id:" + re.sub(r"v\d+$", "", paper_id.lower())
+    return "title:" + re.sub(r"[^0-9a-z\u4e00-\u9fff]+", "", (result.title or "").lower())
+
+
+def _detached(result: SearchResult) -> SearchResult:
+    """论文副本（不带citation）：索引中的对象跨查询、跨研究共享，citation登记表会改写传入的结果"""
+    paper = copy.copy(result)
+    paper.__dict__.pop('citation', None)
+    return paper
+
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"[0-9a-z\u4e00-\u9fff]+", (text or "").lower())
+
+
+class ArxivBackend:
+    """在线arXiv后端"""
+
+    name = "arxiv"
+    supports_deadline = True  # 截止时间传给网关，超时后不再排队、不再重试
+
+    def __init__(self, tool: ArxivSearchTool = None):
+        self.tool = tool or ArxivSearchTool()
+
+    def search(self, query: str, max_results: int, date_from: str = None,
+               categories: List[str] = None, deadline: float = None) -> List[SearchResult]:
+        return self.tool._search_arxiv_api(query, max_results, date_from, categories, deadline=deadline)
+
+
+class LocalIndexBackend:
+    """
+    本地缓存索引：按词项重叠给标题和摘要打分
+
+    写入和返回的都是副本，调用方修改结果（如分配citation）不会影响索引中的论文。
+    指定path时以JSON持久化，进程重启后仍可离线命中：有新论文时最多每save_interval秒保存一次，
+    进程退出时再保存一次。
+    """
+
+    name = "local_index"
+
+    def __init__(self, path: str = None, save_interval: float = 30.0):
+        self.path = path
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._papers: Dict[str, SearchResult] = {}
+        self._dirty = False
+        self._last_save = time.monotonic()
+        if path and os.path.exists(path):
+            self._load()
+        if path:
+            atexit.register(self.flush)
+
+    def add(self, results: List[SearchResult]):
+        """把论文写入索引（按规范化键去重）"""
+        with self._lock:
+            for result in results:
+                key = normalize_paper_key(result)
+                if key not in self._papers:
+                    self._papers[key] = _detached(result)
+                    self._dirty = True
+
+    def search(self, query: str, max_results: int, date_from: str = None,
+               categories: List[str] = None) -> List[SearchResult]:
+        terms = set(_tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            papers = list(self._papers.values())
+
+        wanted = set(categories or [])
+        scored = []
+        for paper in papers:
+            if date_from and (paper.date_published or "") < date_from:
+                continue
+            if wanted and not wanted & set(paper.categories or []):
+                continue
+            title_terms = set(_tokenize(paper.title))
+            body_terms = set(_tokenize(paper.content or paper.snippet))
+            score = 2 * len(terms & title_terms) + len(terms & body_terms)
+            if score:
+                scored.append((score, paper))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [_detached(paper) for _, paper in scored[:max_results]]
+
+    def save(self):
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                data = [asdict(paper) for paper in self._papers.values()]
+                self._dirty = False
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._last_save = time.monotonic()
+
+    def maybe_save(self):
+        """有新论文且距上次保存超过save_interval时保存"""
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.flush()
+
+    def flush(self):
+        """有未保存的新论文时立即保存"""
+        if not self._dirty:
+            return
+        try:
+            self.save()
+        except OSError as e:
+            print(f"⚠️ 本地检索索引保存失败: {e}")
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for item in json.load(f):
+                paper = SearchResult(**item)
+                self._papers[normalize_paper_key(paper)] = paper
+
+    def __len__(self):
+        return len(self._papers)
+
+
+class HTTPSearchBackend:
+    """
+    本地HTTP检索服务
+
+    请求: GET {base_url}?q=<query>&max_results=<n>[&date_from=YYYY-MM-DD][&categories=cs.CL,cs.LG]
+    响应: {"results": [{"title", "url", "snippet", ...}]} 或直接为列表
+    """
+
+    supports_deadline = True  # 请求超时不超过截止时间
+
+    def __init__(self, base_url: str, name: str = "http", timeout: float = 10):
+        self.base_url = base_url
+        self.name = name
+        self.timeout = timeout
+
+    def search(self, query: str, max_results: int, date_from: str = None,
+               categories: List[str] = None, deadline: float = None) -> List[SearchResult]:
+        params = {'q': query, 'max_results': max_results}
+        if date_from:
+            params['date_from'] = date_from
+        if categories:
+            params['categories'] = ",".join(categories)
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, max(0.01, deadline - time.monotonic()))
+        response = requests.get(self.base_url, params=params, timeout=timeout)
+        response.raise_for_status()
+        payload = response.json()
+        items = payload.get("results", []) if isinstance(payload, dict) else payload
+
+        results = []
+        for item in items[:max_results]:
+            results.append(SearchResult(
+                title=item.get("title", ""),
+                url=item.get("url", ""),
+                snippet=item.get("snippet", ""),
+                content=item.get("content", item.get("snippet", "")),
+                date_published=item.get("date_published", ""),
+                authors=item.get("authors") or [],
+                categories=item.get("categories") or [],
+                paper_id=item.get("paper_id", ""),
+            ))
+        return results
+
+
+class FederatedSearchTool(ArxivSearchTool):
+    """
+    多后端并发检索工具，可直接替换ArxivSearchTool
+
+    每个后端有独立的截止时间，超时的后端本轮结果被丢弃，不会阻塞整轮搜索。
+    声明了 supports_deadline 的后端会收到截止时间（time.monotonic()时间点），
+    超时后自行停止（arXiv后端不再占用网关额度）；还没开始执行的检索直接取消。
+    date_from/categories 过滤条件原样传给各后端（只有设置了过滤条件时才传，
+    不支持过滤参数的自定义后端在未设置过滤时仍可使用）。
+    """
+
+    def __init__(self, backends: List[SearchProvider], deadlines: Dict[str, float] = None,
+                 default_deadline: float = 8.0, rrf_k: int = 60,
+                 index: LocalIndexBackend = None, session_id: str = "default"):
+        super().__init__(session_id=session_id)
+        self.backends = list(backends)
+        self.deadlines = deadlines or {}
+        self.default_deadline = default_deadline
+        self.rrf_k = rrf_k
+        # 命中的论文写回本地索引，后续查询可离线召回
+        self.index = index or next((b for b in self.backends if isinstance(b, LocalIndexBackend)), None)
+        self._executor = ThreadPoolExecutor(max_workers=max(4, len(self.backends) * 2),
+                                            thread_name_prefix="search-backend")
+        self._stats_lock = threading.Lock()
+        self._backend_stats = {
+            backend.name: {'calls': 0, 'errors': 0, 'timeouts': 0,
+                           'total_latency': 0.0, 'last_latency': 0.0}
+            for backend in self.backends
+        }
+
+    def _search_single(self, query: str, max_results: int,
+                       date_from: str = None, categories: List[str] = None) -> List[SearchResult]:
+        start = time.monotonic()
+        filters = {key: value for key, value in (('date_from', date_from), ('categories', categories)) if value}
+        deadlines = {backend.name: self.deadlines.get(backend.name, self.default_deadline)
+                     for backend in self.backends}
+        futures = {
+            backend.name: self._executor.submit(self._timed_search, backend, query, max_results, filters,
+                                                start + deadlines[backend.name])
+            for backend in self.backends
+        }
+
+        ranked_lists = []
+        for backend in self.backends:
+            deadline = deadlines[backend.name]
+            remaining = max(0.0, start + deadline - time.monotonic())
+            try:
+                ranked_lists.append(futures[backend.name].result(timeout=remaining))
+            except FutureTimeoutError:
+                futures[backend.name].cancel()
+                self._record(backend.name, timeout=True)
+                print(f"   ⏱️ 后端 {backend.name} 超过 {deadline:.1f}s 截止时间，本轮跳过")
+            except Exception as e:
+                print(f"   ⚠️ 后端 {backend.name} 检索失败: {e}")
+
+        merged = self._reciprocal_rank_fusion(ranked_lists)[:max_results]
+        if self.index is not None:
+            self.index.add(merged)
+            self.index.maybe_save()
+        return merged
+
+    def fork(self, session_id: str) -> "FederatedSearchTool":
+        """共享后端、索引和延迟统计；arXiv后端换成按新会话排队的检索工具"""
+        tool = super().fork(session_id)
+        tool.backends = [ArxivBackend(b.tool.fork(session_id)) if isinstance(b, ArxivBackend) else b
+                         for b in self.backends]
+        return tool
+
+    def _timed_search(self, backend: SearchProvider, query: str, max_results: int,
+                      filters: Dict = None, deadline: float = None) -> List[SearchResult]:
+        start = time.monotonic()
+        filters = dict(filters or {})
+        if deadline is not None and getattr(backend, 'supports_deadline', False):
+            filters['deadline'] = deadline
+        try:
+            results = backend.search(query, max_results, **filters)
+        except Exception:
+            self._record(backend.name, latency=time.monotonic() - start, error=True)
+            raise
+        self._record(backend.name, latency=time.monotonic() - start)
+        return results
+
+    def _record(self, name: str, latency: float = None, error: bool = False, timeout: bool = False):
+        with self._stats_lock:
+            stats = self._backend_stats.setdefault(
+                name, {'calls': 0, 'errors': 0, 'timeouts': 0, 'total_latency': 0.0, 'last_latency': 0.0})
+            if timeout:
+                stats['timeouts'] += 1
+                return
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['total_latency'] += latency
+            stats['last_latency'] = latency
+
+    def _reciprocal_rank_fusion(self, ranked_lists: List[List[SearchResult]]) -> List[SearchResult]:
+        """RRF: score = Σ 1/(k + rank)，同一论文保留信息最完整的那条记录"""
+        scores: Dict[str, float] = {}
+        best: Dict[str, SearchResult] = {}
+        for results in ranked_lists:
+            for rank, result in enumerate(results, 1):
+                key = normalize_paper_key(result)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank)
+                current = best.get(key)
+                if current is None or len(result.content or "") > len(current.content or ""):
+                    best[key] = result
+        ordered = sorted(scores, key=lambda key: scores[key], reverse=True)
+        return [best[key] for key in ordered]
+
+    def backend_stats(self) -> Dict[str, Dict[str, float]]:
+        """各后端延迟统计（平均延迟按成功返回的调用计算）"""
+        with self._stats_lock:
+            report = {}
+            for name, stats in self._backend_stats.items():
+                item = dict(stats)
+                item['avg_latency'] = stats['total_latency'] / stats['calls'] if stats['calls'] else 0.0
+                report[name] = item
+            return report
+
+
+def iter_arxiv_tools(search_tool: ArxivSearchTool):
+    """检索工具本身及FederatedSearchTool中ArxivBackend使用的arXiv工具（用于替换网关或API地址）"""
+    yield search_tool
+    for backend in getattr(search_tool, 'backends', None) or []:
+        tool = getattr(backend, 'tool', None)
+        if isinstance(tool, ArxivSearchTool):
+            yield tool
+
+
+_default_tools: Dict[tuple, "FederatedSearchTool"] = {}
+_default_lock = threading.Lock()
+
+
+def build_default_search_tool(index_path: Optional[str] = None, http_url: Optional[str] = None,
+                              session_id: str = "default") -> ArxivSearchTool:
+    """
+    按配置构建检索工具：只有arXiv时返回普通ArxivSearchTool，
+    配置了本地索引或HTTP后端时返回FederatedSearchTool；
+    相同配置的聚合工具在进程内共享后端、本地索引和延迟统计，每次返回按会话fork的副本
+    """
+    index_path = index_path or os.getenv('SEARCH_INDEX_PATH')
+    http_url = http_url or os.getenv('SEARCH_HTTP_BACKEND_URL')
+    if not index_path and not http_url:
+        return ArxivSearchTool(session_id=session_id)
+
+    with _default_lock:
+        base = _default_tools.get((index_path, http_url))
+        if base is None:
+            backends: List[SearchProvider] = [ArxivBackend(ArxivSearchTool())]
+            if index_path:
+                backends.append(LocalIndexBackend(index_path))
+            if http_url:
+                backends.append(HTTPSearchBackend(http_url))
+            base = _default_tools[(index_path, http_url)] = FederatedSearchTool(backends)
+    return base.fork(session_id)
+
+
+def default_backend_stats() -> Dict[str, Dict[str, float]]:
+    """进程内共享聚合工具的各后端延迟统计（未启用多后端时为空）"""
+    with _default_lock:
+        tools = list(_default_tools.values())
+    report = {}
+    for tool in tools:
+        report.update(tool.backend_stats())
+    return report
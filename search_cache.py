@@ -0,0 +1,77 @@
+"""
+检索结果缓存 - 多个研究（多个问题、多个会话）共享的查询缓存和论文缓存
+
+查询缓存记录 (查询, 参数) → 论文键列表，论文缓存按论文键（arXiv ID/规范化标题）保存一份论文数据，
+不同查询命中同一篇论文时只存一份。两者都按LRU淘汰并有TTL，长期运行的进程内存有上限。
+取出的结果是副本，各研究分配citation时互不影响。
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from search_tool import SearchResult
+from search_backends import normalize_paper_key
+
+
+class SearchResultCache:
+    def __init__(self, max_queries: int = 1024, max_papers: int = 10000, ttl: float = 3600.0):
+        self.max_queries = max_queries
+        self.max_papers = max_papers
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._queries: "OrderedDict[Tuple, Tuple[float, List[str]]]" = OrderedDict()
+        self._papers: "OrderedDict[str, SearchResult]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query: str, max_results: int, date_from: str = None, categories: List[str] = None) -> Tuple:
+        return (" ".join(query.lower().split()), max_results, date_from or "", tuple(sorted(categories or [])))
+
+    def get(self, key: Tuple) -> Optional[List[SearchResult]]:
+        """命中时返回论文副本列表；过期或论文已被淘汰时视为未命中"""
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is not None:
+                stored_at, paper_keys = entry
+                papers = [self._papers.get(k) for k in paper_keys]
+                if time.monotonic() - stored_at <= self.ttl and all(p is not None for p in papers):
+                    self._queries.move_to_end(key)
+                    for k in paper_keys:
+                        self._papers.move_to_end(k)
+                    self.hits += 1
+                    return [copy.copy(p) for p in papers]
+                del self._queries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple, results: List[SearchResult]):
+        paper_keys = []
+        with self._lock:
+            for result in results:
+                paper_key = normalize_paper_key(result)
+                paper = copy.copy(result)
+                paper.__dict__.pop('citation', None)  # citation属于具体某次研究，不进入缓存
+                self._papers[paper_key] = paper
+                self._papers.move_to_end(paper_key)
+                paper_keys.append(paper_key)
+            self._queries[key] = (time.monotonic(), paper_keys)
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+            while len(self._papers) > self.max_papers:
+                self._papers.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'queries': len(self._queries),
+                'papers': len(self._papers),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            }
@@ -0,0 +1,286 @@
+"""
+arXiv搜索网关 - 进程级共享的请求调度器
+
+同一进程内所有ArxivSearchTool共用一个网关：
+- 全局限速：所有会话共享一个请求间隔，遇到429/503时遵守Retry-After退避
+- 请求合并：不同会话中相同的在途查询只发出一次HTTP请求
+- 公平排队：按会话轮转出队，单个会话的大量查询不会饿死其他会话
+- 截止时间：调用方可传入deadline，超时后放弃等待；所有调用方都放弃的请求
+  若仍在排队则出队，若正在重试则不再重试，不再占用网关的请求额度
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+
+class SearchGatewayError(Exception):
+    """网关请求最终失败（重试耗尽或不可重试的状态码）"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _PendingRequest:
+    """一个排队或在途的请求，可被多个会话共享等待"""
+
+    def __init__(self, key, url: str, params: Dict[str, Any], session_id: str):
+        self.key = key
+        self.url = url
+        self.params = params
+        self.session_id = session_id
+        self.waiters = 1
+        self.started = False  # 已被工作线程取出
+        self.done = threading.Event()
+        self.text: Optional[str] = None
+        self.error: Optional[Exception] = None
+
+
+class _RateLimiter:
+    """全局最小请求间隔 + 服务端要求的阻塞窗口"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_allowed = 0.0
+        self._blocked_until = 0.0
+
+    def acquire(self):
+        """等待直到可以发出下一次请求"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                ready_at = max(self._next_allowed, self._blocked_until)
+                if now >= ready_at:
+                    self._next_allowed = now + self.min_interval
+                    return
+                wait = ready_at - now
+            time.sleep(wait)
+
+    def block_for(self, seconds: float):
+        """服务端限流时，阻塞所有会话一段时间"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After头，支持秒数和HTTP日期两种格式"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _default_fetcher(url: str, params: Dict[str, Any], timeout: float):
+    return requests.get(url, params=params, timeout=timeout)
+
+
+class ArxivSearchGateway:
+    """
+    进程级arXiv请求网关
+
+    fetcher(url, params, timeout) 需返回带 status_code / headers / text 的响应对象，
+    默认使用requests.get，测试时可以替换为本地桩。
+    """
+
+    RETRYABLE_STATUS = (429, 503)
+
+    def __init__(self, min_interval: float = 1.0, max_retries: int = 3,
+                 backoff_base: float = 2.0, max_backoff: float = 60.0,
+                 workers: int = 1, request_timeout: float = 10,
+                 wait_timeout: float = 300,
+                 fetcher: Optional[Callable] = None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.workers = workers
+        self.request_timeout = request_timeout
+        self.wait_timeout = wait_timeout
+        self.fetcher = fetcher or _default_fetcher
+
+        self._limiter = _RateLimiter(min_interval)
+        self._cond = threading.Condition()
+        self._inflight: Dict[Any, _PendingRequest] = {}
+        self._session_queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._threads = []
+        self._stats = {
+            'requests': 0,
+            'http_calls': 0,
+            'coalesced': 0,
+            'retries': 0,
+            'throttled': 0,
+            'errors': 0,
+            'abandoned': 0,
+        }
+
+    def fetch(self, url: str, params: Dict[str, Any], session_id: str = "default",
+              deadline: Optional[float] = None) -> str:
+        """
+        提交请求并阻塞等待响应文本
+
+        相同(url, params)的在途请求会被合并，调用方共享同一个结果。
+        deadline为time.monotonic()时间点，到期仍未拿到结果时放弃等待并抛出SearchGatewayError。
+        """
+        key = (url, tuple(sorted((k, str(v)) for k, v in params.items())))
+
+        with self._cond:
+            self._stats['requests'] += 1
+            pending = self._inflight.get(key)
+            if pending is not None:
+                pending.waiters += 1
+                self._stats['coalesced'] += 1
+            else:
+                pending = _PendingRequest(key, url, dict(params), session_id)
+                self._inflight[key] = pending
+                self._session_queues.setdefault(session_id, deque()).append(pending)
+                self._ensure_workers()
+                self._cond.notify()
+
+        wait = self.wait_timeout
+        if deadline is not None:
+            wait = min(wait, max(0.0, deadline - time.monotonic()))
+        if not pending.done.wait(wait) and self._abandon(pending):
+            if wait < self.wait_timeout:
+                raise SearchGatewayError("超过调用方截止时间，已放弃arXiv请求")
+            raise SearchGatewayError(f"等待arXiv网关超时（{self.wait_timeout}秒）")
+        if pending.error is not None:
+            raise pending.error
+        return pending.text
+
+    def stats(self) -> Dict[str, Any]:
+        """网关统计信息：请求数、合并数、重试与限流次数、各会话排队深度"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['inflight'] = len(self._inflight)
+            stats['queued'] = {sid: len(q) for sid, q in self._session_queues.items()}
+        return stats
+
+    def _abandon(self, pending: _PendingRequest) -> bool:
+        """
+        调用方放弃等待；所有调用方都放弃且请求仍在排队时直接出队
+        放弃前请求恰好完成时返回False，调用方照常取结果
+        """
+        with self._cond:
+            if pending.done.is_set():
+                return False
+            pending.waiters -= 1
+            if pending.waiters > 0:
+                return True
+            self._stats['abandoned'] += 1
+            if pending.started:
+                return True  # 正在处理：_perform在下一次重试前检查并停止
+            self._inflight.pop(pending.key, None)
+            queue = self._session_queues.get(pending.session_id)
+            if queue is not None and pending in queue:
+                queue.remove(pending)
+                if not queue:
+                    del self._session_queues[pending.session_id]
+        return True
+
+    def _ensure_workers(self):
+        """懒启动工作线程（调用方需持有锁）"""
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f"arxiv-gateway-{len(self._threads)}")
+            worker.start()
+            self._threads.append(worker)
+
+    def _next_request(self) -> _PendingRequest:
+        """按会话轮转取出下一个请求"""
+        with self._cond:
+            while not self._session_queues:
+                self._cond.wait()
+            session_id, queue = self._session_queues.popitem(last=False)
+            pending = queue.popleft()
+            pending.started = True
+            if queue:
+                # 该会话还有请求，排到队尾等待下一轮
+                self._session_queues[session_id] = queue
+            return pending
+
+    def _worker_loop(self):
+        while True:
+            pending = self._next_request()
+            try:
+                pending.text = self._perform(pending)
+            except Exception as e:
+                pending.error = e if isinstance(e, SearchGatewayError) else SearchGatewayError(str(e))
+                with self._cond:
+                    if pending.waiters > 0:
+                        self._stats['errors'] += 1
+            finally:
+                with self._cond:
+                    self._inflight.pop(pending.key, None)
+                pending.done.set()
+
+    def _perform(self, pending: _PendingRequest) -> str:
+        """执行请求，对429/503和网络错误按退避策略重试"""
+        attempt = 0
+        while True:
+            self._limiter.acquire()
+            with self._cond:
+                if pending.waiters <= 0:
+                    # 等待限速/退避期间所有调用方已放弃（超过截止时间）：不再发出请求
+                    raise SearchGatewayError("所有调用方已放弃该请求，停止重试")
+                self._stats['http_calls'] += 1
+
+            try:
+                response = self.fetcher(pending.url, pending.params, self.request_timeout)
+            except requests.RequestException as e:
+                if attempt >= self.max_retries:
+                    raise SearchGatewayError(f"arXiv请求失败: {e}")
+                delay = min(self.max_backoff, self.backoff_base ** attempt)
+                self._limiter.block_for(delay)
+                attempt += 1
+                with self._cond:
+                    self._stats['retries'] += 1
+                continue
+
+            status = response.status_code
+            if status == 200:
+                return response.text
+
+            if status in self.RETRYABLE_STATUS:
+                with self._cond:
+                    self._stats['throttled'] += 1
+                if attempt >= self.max_retries:
+                    raise SearchGatewayError(f"arXiv限流，重试{attempt}次后仍失败", status)
+                retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is None:
+                    retry_after = self.backoff_base ** attempt
+                delay = min(self.max_backoff, retry_after)
+                print(f"   ⏳ arXiv返回{status}，{delay:.1f}秒后重试")
+                self._limiter.block_for(delay)
+                attempt += 1
+                with self._cond:
+                    self._stats['retries'] += 1
+                continue
+
+            raise SearchGatewayError(f"arXiv返回状态码 {status}", status)
+
+
+_shared_gateway: Optional[ArxivSearchGateway] = None
+_shared_lock = threading.Lock()
+
+
+def get_search_gateway() -> ArxivSearchGateway:
+    """获取进程级共享的arXiv网关"""
+    global _shared_gateway
+    with _shared_lock:
+        if _shared_gateway is None:
+            _shared_gateway = ArxivSearchGateway()
+        return _shared_gateway
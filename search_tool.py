@@ -1,3 +1,5 @@
+import copy
+import os
 import requests
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Any
@@ -5,6 +7,7 @@ from dataclasses import dataclass
 import time
 import re
 from urllib.parse import quote
+from search_gateway import ArxivSearchGateway, get_search_gateway
 
 @dataclass
 class SearchResult:
@@ -18,10 +21,26 @@ class SearchResult:
     paper_id: str = ""
 
 class ArxivSearchTool:
-    def __init__(self):
+    def __init__(self, gateway: ArxivSearchGateway = None, session_id: str = "default", cache=None):
         self.search_history = []
         self.searched_queries = set()
-        self.base_url = "http://export.arxiv.org/api/query"
+        # 可通过环境变量指向本地模拟服务（mock_servers.MockArxivServer）
+        self.base_url = os.getenv('ARXIV_API_URL', "http://export.arxiv.org/api/query")
+        # 默认使用进程级共享网关，统一限速和合并请求
+        self.gateway = gateway or get_search_gateway()
+        self.session_id = session_id
+        # 可选的跨研究共享检索缓存（search_cache.SearchResultCache）
+        self.cache = cache
+    
+    def fork(self, session_id: str) -> "ArxivSearchTool":
+        """
+        为另一个研究创建检索工具：共享网关、缓存和后端，查询去重记录各自独立
+        """
+        tool = copy.copy(self)
+        tool.search_history = []
+        tool.searched_queries = set()
+        tool.session_id = session_id
+        return tool
     
     def generate_search_queries(self, question: str, max_queries: int = 5) -> List[str]:
         """
@@ -100,13 +119,10 @@ class ArxivSearchTool:
             print(f"🔍 搜索arXiv论文: {query}")
             
             try:
-                results = self._search_arxiv_api(query, max_results, date_from, categories)
+                results = self._cached_search(query, max_results, date_from, categories)
                 all_results.extend(results)
                 print(f"   找到 {len(results)} 篇相关论文")
                 
-                # 避免API频率限制
-                time.sleep(1)
-                
             except Exception as e:
                 print(f"   搜索出错: {e}")
                 continue
@@ -114,10 +130,31 @@ class ArxivSearchTool:
         self.search_history.extend(queries)
         return all_results
     
+    def _cached_search(self, query: str, max_results: int,
+                       date_from: str = None, categories: List[str] = None) -> List[SearchResult]:
+        """先查共享缓存，未命中时执行检索并写回"""
+        if self.cache is None:
+            return self._search_single(query, max_results, date_from, categories)
+        key = self.cache.make_key(query, max_results, date_from, categories)
+        results = self.cache.get(key)
+        if results is None:
+            results = self._search_single(query, max_results, date_from, categories)
+            if results:
+                self.cache.put(key, results)
+        return results
+    
+    def _search_single(self, query: str, max_results: int,
+                       date_from: str = None, categories: List[str] = None) -> List[SearchResult]:
+        """
+        执行单个查询，子类可覆盖以接入其他检索后端
+        """
+        return self._search_arxiv_api(query, max_results, date_from, categories)
+    
     def _search_arxiv_api(self, query: str, max_results: int, 
-                         date_from: str = None, categories: List[str] = None) -> List[SearchResult]:
+                         date_from: str = None, categories: List[str] = None,
+                         deadline: float = None) -> List[SearchResult]:
         """
-        调用arXiv API搜索论文
+        调用arXiv API搜索论文；deadline（time.monotonic()时间点）到期后放弃排队和重试
         """
         # 构建搜索查询
         search_query = f'all:{query}'
@@ -136,12 +173,14 @@ class ArxivSearchTool:
             'sortOrder': 'descending'
         }
         
-        # 发送请求
-        response = requests.get(self.base_url, params=params, timeout=10)
-        response.raise_for_status()
+        # 通过共享网关发送请求（限速、重试与合并由网关负责）
+        xml_content = self.gateway.fetch(self.base_url, params, session_id=self.session_id, deadline=deadline)
         
-        # 解析XML响应
-        return self._parse_arxiv_response(response.text)
+        # 解析XML响应；arXiv API不支持按日期过滤，在本地按发布日期过滤
+        results = self._parse_arxiv_response(xml_content)
+        if date_from:
+            results = [r for r in results if (r.date_published or "") >= date_from]
+        return results
     
     def _parse_arxiv_response(self, xml_content: str) -> List[SearchResult]:
         """
@@ -227,10 +266,9 @@ class ArxivSearchTool:
                 'max_results': 1
             }
             
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
+            xml_content = self.gateway.fetch(self.base_url, params, session_id=self.session_id)
             
-            results = self._parse_arxiv_response(response.text)
+            results = self._parse_arxiv_response(xml_content)
             
             if results:
                 paper = results[0]
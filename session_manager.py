@@ -0,0 +1,230 @@
+"""
+Web研究会话管理 - 有上限、按空闲时间淘汰的会话存储
+
+每个会话持有研究器、进度事件日志和完整报告，长期运行的服务不能无限保留：
+- 数量上限：超过max_sessions时按最近访问时间淘汰已结束的会话（进行中的会话从不淘汰）
+- 空闲TTL：后台清理线程定期淘汰空闲超过idle_ttl的已结束会话
+- 落盘：已完成会话的结果和结构化报告在淘汰时写入spill_dir，/result 和 /citations 在淘汰后仍可访问；
+  落盘文件超过spill_ttl后删除
+stats() 提供会话数、进行中数量、估算内存、进程RSS和淘汰计数等指标。
+对外保持与原来 research_sessions 字典相同的接口（[]、in、get、del）。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+_SAFE_ID = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+
+def process_rss_mb() -> float:
+    """当前进程的常驻内存（MB）；非Linux时退回峰值RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        try:
+            import resource
+            import sys
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+        except (ImportError, OSError):
+            return 0.0
+
+
+def estimate_session_bytes(session) -> int:
+    """会话占用内存的粗略估算：报告文本 + 结构化报告 + 进度事件日志"""
+    size = len(getattr(session, 'result', None) or "") * 3
+    report = getattr(session, 'report', None)
+    if report is not None:
+        size += len(report.markdown or "") * 3 + 512 * len(report.citations)
+    log = getattr(session, 'progress_log', None)
+    if log is not None:
+        size += 256 * len(log)
+    return size
+
+
+class SessionManager:
+    def __init__(self, max_sessions: int = 200, idle_ttl: float = 3600.0, spill_dir: Optional[str] = None,
+                 spill_ttl: float = 7 * 86400, clock: Callable[[], float] = time.monotonic):
+        """
+        max_sessions: 内存中最多保留的会话数
+        idle_ttl: 已结束会话最后一次访问后保留的秒数
+        spill_dir: 淘汰时写入已完成结果的目录，None表示不落盘
+        """
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.spill_dir = spill_dir
+        self.spill_ttl = spill_ttl
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._sessions: "OrderedDict[str, Any]" = OrderedDict()  # 按最近访问排序
+        self._last_access: Dict[str, float] = {}
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.evicted = 0
+        self.reaped = 0
+        self.spilled = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    # 兼容原来的 research_sessions 字典接口
+    def __setitem__(self, session_id: str, session):
+        self.add(session_id, session)
+
+    def __getitem__(self, session_id: str):
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __delitem__(self, session_id: str):
+        with self._lock:
+            del self._sessions[session_id]
+            self._last_access.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def add(self, session_id: str, session):
+        with self._lock:
+            self._sessions[session_id] = session
+            self._touch(session_id)
+            self._evict_over_capacity()
+
+    def get(self, session_id: str, default=None):
+        """获取内存中的会话并刷新访问时间"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return default
+            self._touch(session_id)
+            return session
+
+    def _touch(self, session_id: str):
+        self._sessions.move_to_end(session_id)
+        self._last_access[session_id] = self._clock()
+
+    def _evict_over_capacity(self):
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        # 从最久未访问的开始淘汰，跳过进行中的会话
+        for session_id in [sid for sid, s in self._sessions.items() if not s.is_running][:excess]:
+            self._evict(session_id)
+            self.evicted += 1
+
+    def _evict(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._last_access.pop(session_id, None)
+        if self.spill_dir and session.result is not None:
+            self._spill(session_id, session)
+
+    def reap(self) -> int:
+        """淘汰空闲超时的已结束会话，并删除过期的落盘结果；返回淘汰的会话数"""
+        now = self._clock()
+        with self._lock:
+            idle = [sid for sid, s in self._sessions.items()
+                    if not s.is_running and now - self._last_access.get(sid, now) > self.idle_ttl]
+            for session_id in idle:
+                self._evict(session_id)
+            self.reaped += len(idle)
+        self._purge_spilled()
+        return len(idle)
+
+    def start_reaper(self, interval: float = 60.0):
+        """启动后台清理线程（守护线程，重复调用无副作用）"""
+        if self._reaper is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    reaped = self.reap()
+                    if reaped:
+                        print(f"🧹 清理 {reaped} 个空闲研究会话，当前 {len(self)} 个")
+                except Exception as e:
+                    print(f"⚠️ 会话清理出错: {e}")
+
+        self._reaper = threading.Thread(target=loop, daemon=True, name="session-reaper")
+        self._reaper.start()
+
+    def stop_reaper(self):
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
+        self._stop.clear()
+
+    # 落盘
+    def _spill_path(self, session_id: str) -> Optional[str]:
+        if not self.spill_dir or not _SAFE_ID.match(session_id or ""):
+            return None
+        return os.path.join(self.spill_dir, f"{session_id}.json")
+
+    def _spill(self, session_id: str, session):
+        path = self._spill_path(session_id)
+        if path is None:
+            return
+        report = session.report.to_dict() if session.report is not None else None
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({'session_id': session_id, 'result': session.result, 'report': report,
+                           'spilled_at': time.time()}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self.spilled += 1
+        except OSError as e:
+            print(f"⚠️ 会话结果落盘失败 {session_id}: {e}")
+
+    def load_spilled(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """读取已淘汰会话的落盘结果：{'result', 'report'(dict或None)}"""
+        path = self._spill_path(session_id)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _purge_spilled(self):
+        if not self.spill_dir:
+            return
+        cutoff = time.time() - self.spill_ttl
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if name.endswith(".json") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        spilled_files = 0
+        if self.spill_dir and os.path.isdir(self.spill_dir):
+            spilled_files = sum(1 for name in os.listdir(self.spill_dir) if name.endswith(".json"))
+        return {
+            'sessions': len(sessions),
+            'running': sum(1 for s in sessions if s.is_running),
+            'max_sessions': self.max_sessions,
+            'idle_ttl': self.idle_ttl,
+            'session_memory_mb': round(sum(estimate_session_bytes(s) for s in sessions) / 1024 / 1024, 3),
+            'process_rss_mb': process_rss_mb(),
+            'spilled_files': spilled_files,
+            'evicted': self.evicted,
+            'reaped': self.reaped,
+            'spilled': self.spilled,
+        }
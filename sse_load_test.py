@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+SSE负载测试 - 在一个进程内用asyncio服务模式承载数千个空闲的进度观看者
+
+启动 async_server（后台线程中的事件循环），为一个进行中的研究会话打开N个 /progress 连接，
+保持空闲一段时间后向进度日志追加一条事件，测量：
+建立连接耗时、空闲期间的线程数（不随观看者数增长）、进程RSS及每个观看者的内存、
+事件扇出到全部观看者的延迟分位数，以及研究结束后全部观看者收到结束标记。
+客户端与服务端在同一进程中，RSS和文件描述符包含双方。
+
+用法：
+    python sse_load_test.py --viewers 5000 --idle 5
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import threading
+import time
+from typing import Any, Dict, List
+
+import web_interface
+from async_server import AsyncResearchServer
+from benchmark import percentile
+from session_manager import process_rss_mb
+
+LOAD_TEST_STEP = 'load_test'
+
+
+async def _open_viewer(host: str, port: int, session_id: str):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /progress/{session_id} HTTP/1.1\r\nHost: {host}\r\n"
+                 f"Accept: text/event-stream\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 200"):
+        raise ConnectionError(head.split(b"\r\n", 1)[0].decode("latin-1"))
+    return reader, writer
+
+
+async def _watch(reader: asyncio.StreamReader, received: Dict[str, float]):
+    """读取SSE消息，记录每种步骤首次收到的时间，直到结束标记"""
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        if line.startswith(b"data: "):
+            step = json.loads(line[6:]).get('step')
+            received.setdefault(step, time.perf_counter())
+            if step == 'done':
+                return
+
+
+async def _run(server: AsyncResearchServer, session, viewers: int, idle: float,
+               connect_concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(connect_concurrency)
+
+    async def connect():
+        async with semaphore:
+            return await _open_viewer(server.host, server.port, session.session_id)
+
+    threads_before = threading.active_count()
+    rss_before = process_rss_mb()
+    start = time.perf_counter()
+    connections = await asyncio.gather(*(connect() for _ in range(viewers)))
+    connect_seconds = time.perf_counter() - start
+
+    received: List[Dict[str, float]] = [{} for _ in connections]
+    watchers = [asyncio.ensure_future(_watch(reader, seen)) for (reader, _), seen in zip(connections, received)]
+    await asyncio.sleep(idle)
+    idle_stats = server.stats()
+    rss_idle = process_rss_mb()
+
+    # 研究线程追加事件，测量扇出到全部观看者的延迟
+    sent_at = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(
+        None, session.progress_log.append, {'step': LOAD_TEST_STEP, 'content': '负载测试事件'})
+    while sum(1 for seen in received if LOAD_TEST_STEP in seen) < viewers:
+        await asyncio.sleep(0.01)
+    latencies = [seen[LOAD_TEST_STEP] - sent_at for seen in received]
+
+    session.is_running = False
+    session.progress_log.close()
+    await asyncio.wait_for(asyncio.gather(*watchers), timeout=60)
+    for _, writer in connections:
+        writer.close()
+
+    return {
+        'viewers': viewers,
+        'connect_seconds': round(connect_seconds, 3),
+        'idle_seconds': idle,
+        'sse_viewers': idle_stats['sse_viewers'],
+        'threads_before': threads_before,
+        'threads_idle': idle_stats['threads'],
+        'rss_before_mb': rss_before,
+        'rss_idle_mb': rss_idle,
+        'rss_per_viewer_kb': round(max(0.0, rss_idle - rss_before) * 1024 / viewers, 1),
+        'fanout_p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'fanout_p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'fanout_max_ms': round(max(latencies) * 1000, 1),
+        'done': sum(1 for seen in received if 'done' in seen),
+    }
+
+
+def run_load_test(viewers: int = 2000, idle: float = 2.0, connect_concurrency: int = 500) -> Dict[str, Any]:
+    """打开viewers个空闲的SSE观看者，返回连接、内存、线程和扇出延迟指标"""
+    # 客户端和服务端各占一个文件描述符
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = viewers * 2 + 256
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+    web_interface.init_services()
+    session = web_interface.ResearchSession(f"load-test-{int(time.time())}")
+    session.is_running = True
+    web_interface.research_sessions[session.session_id] = session
+    try:
+        with AsyncResearchServer(port=0) as server:
+            return asyncio.run(_run(server, session, viewers, idle, connect_concurrency))
+    finally:
+        del web_interface.research_sessions[session.session_id]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="asyncio服务模式的SSE负载测试")
+    parser.add_argument('--viewers', '-n', type=int, default=2000, help='并发观看者数 (默认: 2000)')
+    parser.add_argument('--idle', type=float, default=2.0, help='观看者保持空闲的秒数 (默认: 2)')
+    parser.add_argument('--connect-concurrency', type=int, default=500, help='同时发起的连接数 (默认: 500)')
+    args = parser.parse_args(argv)
+
+    print(f"🚀 打开 {args.viewers} 个SSE观看者...")
+    result = run_load_test(args.viewers, args.idle, args.connect_concurrency)
+    print(f"✅ {result['sse_viewers']} 个观看者在 {result['connect_seconds']} 秒内建立连接")
+    print(f"🧵 线程数: {result['threads_before']} → {result['threads_idle']}（空闲观看者不占用线程）")
+    print(f"💾 RSS: {result['rss_before_mb']} MB → {result['rss_idle_mb']} MB，"
+          f"约 {result['rss_per_viewer_kb']} KB/观看者（含客户端）")
+    print(f"📡 事件扇出延迟: p50 {result['fanout_p50_ms']} ms，p99 {result['fanout_p99_ms']} ms，"
+          f"最大 {result['fanout_max_ms']} ms")
+    print(f"🏁 {result['done']}/{result['viewers']} 个观看者收到结束标记")
+    return 0 if result['done'] == result['viewers'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+测试Agent模式的工具调用：同一轮的多个工具调用和查询并发执行，citation编号保持确定
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import time
+
+from deep_research_agentic_by_deepseek import DeepSeekAgenticResearcher
+from test_async_research import StubSearchTool
+
+
+def tool_call(queries):
+    return ('<|tool▁call▁begin|>arxiv_search<|tool▁sep|>{"queries": "%s"}<|tool▁call▁end|>' % queries)
+
+
+TOOL_TURN = ("需要检索。<|tool▁calls▁begin|>" + tool_call("attention||transformer")
+             + tool_call("sparse attention||attention") + "<|tool▁call▁begin|>arxiv_search<|tool▁sep|>{bad"
+             "<|tool▁call▁end|><|tool▁calls▁end|>")
+
+
+class StubAgentLLM:
+    def __init__(self):
+        self.turns = 0
+
+    def response(self, prompt):
+        self.turns += 1
+        if self.turns == 1:
+            return TOOL_TURN
+        return "# 研究报告\n注意力机制[citation:1]，稀疏注意力[citation:5]。"
+
+
+def make_agent(delay=0.0):
+    agent = DeepSeekAgenticResearcher("stub", search_tool=StubSearchTool(delay))
+    agent.llm = StubAgentLLM()
+    return agent
+
+
+def test_tool_calls_in_one_turn_run_concurrently():
+    agent = make_agent(delay=0.3)
+    start = time.monotonic()
+    report = agent.research("什么是注意力机制")
+    elapsed = time.monotonic() - start
+
+    # 3个不同查询，串行至少需要 0.9 秒
+    assert elapsed < 0.8
+    assert agent.tool_latencies[0]['calls'] == 3 and agent.tool_latencies[0]['queries'] == 3
+    assert "**工具调用**: 1 轮，共 3 个查询" in report
+
+
+def test_results_are_assembled_in_call_order():
+    agent = make_agent()
+    outputs = agent._execute_tool_calls(TOOL_TURN)
+
+    # citation按工具调用和查询的原始顺序分配；重复查询不再检索
+    titles = [agent.citations[f"citation:{i}"].title for i in range(1, 7)]
+    assert titles == ["attention paper 0", "attention paper 1", "transformer paper 0",
+                      "transformer paper 1", "sparse attention paper 0", "sparse attention paper 1"]
+    assert outputs.index("transformer paper 1") < outputs.index("sparse attention paper 0")
+    assert "工具调用参数解析失败" in outputs
+
+
+def test_stream_parser_handles_markers_split_across_deltas():
+    from tool_call_parser import ToolCallStreamParser
+
+    parser = ToolCallStreamParser()
+    fired = []
+    for i in range(0, len(TOOL_TURN), 3):
+        fired.append([c.arguments for c in parser.feed(TOOL_TURN[i:i + 3])])
+
+    calls = [args for batch in fired for args in batch]
+    assert calls == ['{"queries": "attention||transformer"}', '{"queries": "sparse attention||attention"}', "{bad"]
+    # 第一个调用在整段响应结束之前就已完成
+    assert next(i for i, batch in enumerate(fired) if batch) < len(fired) // 2
+    assert parser.has_tool_calls and parser.text == TOOL_TURN
+
+
+def test_search_starts_while_model_is_still_generating():
+    agent = make_agent()
+    first_call_end = TOOL_TURN.index("<|tool▁call▁end|>") + len("<|tool▁call▁end|>")
+    search_started = []
+    original_search = agent.search_tool._search_single
+
+    def recording_search(query, *args, **kwargs):
+        search_started.append(query)
+        return original_search(query, *args, **kwargs)
+
+    agent.search_tool._search_single = recording_search
+    searched_before_rest = []
+
+    def stream_response(prompt):
+        response = agent.llm.response(prompt)
+        if response != TOOL_TURN:
+            yield response
+            return
+        yield response[:first_call_end]
+        time.sleep(0.2)  # 模型继续生成期间，第一个调用的检索已在进行
+        searched_before_rest.extend(search_started)
+        yield response[first_call_end:]
+
+    agent.llm.stream_response = stream_response
+    report = agent.research("什么是注意力机制")
+
+    assert sorted(searched_before_rest) == ["attention", "transformer"]
+    assert "[citation:5]" in report and agent.citation_counter == 6
+
+
+class RepeatingAgentLLM(StubAgentLLM):
+    """第二轮重复（大小写、单复数不同）第一轮的查询"""
+
+    def response(self, prompt):
+        self.turns += 1
+        if self.turns == 1:
+            return "<|tool▁calls▁begin|>" + tool_call("attention||transformer") + "<|tool▁calls▁end|>"
+        if self.turns == 2:
+            return ("<|tool▁calls▁begin|>" + tool_call("Attention||transformers||sparse attention")
+                    + "<|tool▁calls▁end|>")
+        return "# 研究报告\n注意力机制[citation:1]。"
+
+
+def test_repeated_queries_reuse_earlier_results():
+    agent = make_agent()
+    agent.llm = RepeatingAgentLLM()
+    prompts = []
+    original = agent._agent_turn
+    agent._agent_turn = lambda prompt: prompts.append(prompt) or original(prompt)
+    report = agent.research("什么是注意力机制")
+
+    # 重复查询不再检索，也不重复分配citation
+    assert agent.tool_latencies[1]['queries'] == 1 and agent.tool_latencies[1]['cached'] == 2
+    assert agent.citation_counter == 6
+    assert agent.tool_cache_stats['hits'] == 2 and agent.tool_cache_stats['avoided'] == 2
+    # 模型看到的是对前文结果的引用，而不是"未找到相关论文"
+    assert '"transformers" 与此前的查询 "transformer" 相同' in prompts[2]
+    assert "- [citation:3] transformer paper 0" in prompts[2]
+    assert "未找到相关论文" not in prompts[2]
+    assert "复用重复查询 2 次" in report
+
+
+def test_tool_cache_matches_near_duplicate_queries():
+    from tool_result_cache import ToolResultCache
+
+    cache = ToolResultCache()
+    cache.store("efficient sparse attention for long sequences", [])
+    assert cache.lookup("Efficient sparse attention for long sequence")['exact']
+    hit = cache.lookup("efficient sparse attention for long sequences survey")
+    assert hit['query'] == "efficient sparse attention for long sequences" and not hit['exact']
+    assert cache.lookup("sparse attention") is None
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'near_hits': 1, 'misses': 1, 'avoided': 2}
+
+
+def test_empty_stream_falls_back_to_plain_response():
+    agent = make_agent()
+    agent.llm.stream_response = lambda prompt: iter([""])
+    report = agent.research("什么是注意力机制")
+
+    # 每轮流式输出为空时改用非流式调用，工具调用照常执行
+    assert agent.llm.turns == 2
+    assert "[citation:5]" in report and agent.citation_counter == 6
+
+
+def test_fork_shares_tool_executor_without_creating_one(monkeypatch):
+    import deep_research_agentic_by_deepseek as agent_module
+
+    agent = make_agent()
+    created = []
+    original = agent_module.ThreadPoolExecutor
+    monkeypatch.setattr(agent_module, "ThreadPoolExecutor",
+                        lambda *args, **kwargs: created.append(kwargs) or original(*args, **kwargs))
+    child = agent.fork("child")
+
+    # 子Agent直接使用父Agent的线程池，不会先建一个再关掉
+    assert created == []
+    assert child._tool_executor is agent._tool_executor
+    assert child.search_tool is not agent.search_tool
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+测试异步研究引擎 research_async
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import asyncio
+import re
+import threading
+import time
+
+from deep_researcher import DeepResearcher
+from research_budget import ResearchBudget
+from search_tool import ArxivSearchTool, SearchResult
+
+
+class StubLLM:
+    """按prompt特征返回固定回复的桩LLM"""
+
+    def __init__(self, follow_up_rounds=1):
+        self.follow_up_rounds = follow_up_rounds
+        self.analysis_calls = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def response(self, prompt):
+        with self._lock:
+            self.calls += 1
+        if "生成第一轮arXiv搜索查询" in prompt:
+            return "attention mechanism||transformer||self attention"
+        if "后续查询" in prompt:
+            with self._lock:
+                self.analysis_calls += 1
+                round_num = self.analysis_calls
+            if round_num > self.follow_up_rounds:
+                return f"分析：信息已充分。\n\n证据摘要：第{round_num}轮摘要\n\n后续查询：无"
+            if round_num == 1:
+                return "分析：信息还不够。\n\n证据摘要：第1轮摘要\n\n后续查询：multi head attention||sparse attention"
+            return (f"分析：信息还不够。\n\n证据摘要：第{round_num}轮摘要\n\n"
+                    f"后续查询：topic {round_num} a||topic {round_num} b")
+        if "学术研究报告" in prompt:
+            return "# 学术研究报告\n\n## 1. 执行摘要\n注意力机制[citation:1]。"
+        return "初步分析：需要检索注意力机制相关论文。"
+
+
+class StubSearchTool(ArxivSearchTool):
+    """每个查询固定返回两篇论文并模拟网络延迟"""
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+
+    def _search_single(self, query, max_results, date_from=None, categories=None):
+        time.sleep(self.delay)
+        slug = query.replace(" ", "-")
+        return [
+            SearchResult(title=f"{query} paper {i}", url=f"http://arxiv.org/abs/{slug}-{i}",
+                         snippet=f"abstract of {query} {i}", content=f"abstract of {query} {i}",
+                         date_published="2024-01-0{}".format(i + 1), authors=["Alice", "Bob"],
+                         categories=["cs.LG"], paper_id=f"{slug}-{i}")
+            for i in range(2)
+        ]
+
+
+def make_researcher(delay=0.0, follow_up_rounds=1):
+    researcher = DeepResearcher("stub", search_tool=StubSearchTool(delay))
+    researcher.llm = StubLLM(follow_up_rounds)
+    return researcher
+
+
+class ReversedDelaySearchTool(StubSearchTool):
+    """先发出的查询返回得更慢，并发时各查询按相反顺序完成"""
+
+    DELAYS = {"attention mechanism": 0.15, "transformer": 0.1, "self attention": 0.05,
+              "multi head attention": 0.1}
+
+    def _search_single(self, query, max_results, date_from=None, categories=None):
+        time.sleep(self.DELAYS.get(query, 0.0))
+        return super()._search_single(query, max_results, date_from, categories)
+
+
+EXPECTED_CITATIONS = [
+    "attention mechanism paper 0", "attention mechanism paper 1", "transformer paper 0", "transformer paper 1",
+    "self attention paper 0", "self attention paper 1", "multi head attention paper 0",
+    "multi head attention paper 1", "sparse attention paper 0", "sparse attention paper 1",
+]
+
+
+def test_async_citations_follow_query_order():
+    researcher = DeepResearcher("stub", search_tool=ReversedDelaySearchTool())
+    researcher.llm = StubLLM(follow_up_rounds=1)
+    report = asyncio.run(researcher.research_async("什么是注意力机制"))
+
+    # 查询并发完成的顺序与发出顺序相反，citation编号仍按查询顺序分配（与串行执行一致）
+    index = re.findall(r"^\*\*\[citation:(\d+)\]\*\* (.+?)  $", report, re.M)
+    assert index == [(str(i), title) for i, title in enumerate(EXPECTED_CITATIONS, 1)]
+    assert report.startswith("# 学术研究报告\n\n## 1. 执行摘要\n注意力机制[citation:1]。")
+    assert "**搜索轮数**: 2 轮迭代搜索" in report
+    assert "**检索论文**: 10 篇学术论文" in report
+
+
+def test_round_queries_run_concurrently():
+    researcher = make_researcher(delay=0.3)
+    start = time.monotonic()
+    results = asyncio.run(researcher._conduct_search_round_async(["q1", "q2", "q3"]))
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.8
+    # citation按查询顺序分配，与串行执行一致
+    assert [r.citation for r in results] == [f"citation:{i}" for i in range(1, 7)]
+    assert results[0].title.startswith("q1") and results[-1].title.startswith("q3")
+
+
+def test_research_works_inside_running_loop():
+    async def caller():
+        return make_researcher(follow_up_rounds=0).research("什么是注意力机制")
+
+    report = asyncio.run(caller())
+    assert "**搜索轮数**: 1 轮迭代搜索" in report
+
+
+def test_branching_runs_follow_ups_concurrently():
+    researcher = make_researcher(delay=0.3, follow_up_rounds=1)
+    researcher.branching = True
+    start = time.monotonic()
+    report = researcher.research("什么是注意力机制")
+    elapsed = time.monotonic() - start
+
+    # 第一轮 + 2个并发分支，分支串行执行至少需要 3 × 0.3 秒
+    assert elapsed < 0.85
+    assert "### 🌿 分支探索发现" in report
+    assert "**multi head attention**（深度1，2篇论文）" in report
+    assert "**sparse attention**（深度1，2篇论文）" in report
+    assert "**搜索轮数**: 3 轮迭代搜索" in report
+
+
+def test_branching_respects_search_budget():
+    researcher = make_researcher(follow_up_rounds=5)
+    researcher.branching = True
+    researcher.budget = ResearchBudget(max_search_calls=4)
+    report = researcher.research("什么是注意力机制")
+
+    # 第一轮用掉3次，只剩1个分支可以搜索
+    assert researcher.budget.search_calls == 4
+    assert report.count("（深度") == 1
+
+
+def test_incremental_analysis_keeps_prompt_flat():
+    researcher = make_researcher(follow_up_rounds=3)
+    prompts = []
+    original = researcher.llm.response
+
+    def recording_response(prompt):
+        prompts.append(prompt)
+        return original(prompt)
+
+    researcher.llm.response = recording_response
+    report = researcher.research("什么是注意力机制")
+
+    analysis_prompts = [p for p in prompts if "后续查询" in p]
+    assert len(analysis_prompts) == 4
+    # 后续轮次只包含本轮新论文和上一轮的证据摘要
+    assert "attention mechanism paper 0" not in analysis_prompts[2]
+    assert "第2轮摘要" in analysis_prompts[2]
+    assert [stat['new_papers'] for stat in researcher.round_stats] == [6, 4, 4, 4]
+    sizes = [stat['prompt_chars'] for stat in researcher.round_stats[1:]]
+    assert max(sizes) - min(sizes) < 200
+    assert "### ⏱️ 每轮分析开销" in report
+
+
+class RepeatingSearchTool(StubSearchTool):
+    """不论查询是什么都返回同样的两篇论文"""
+
+    def _search_single(self, query, max_results, date_from=None, categories=None):
+        return super()._search_single("attention mechanism", max_results, date_from, categories)
+
+
+def test_stops_early_when_marginal_yield_drops():
+    researcher = DeepResearcher("stub", search_tool=RepeatingSearchTool())
+    researcher.llm = StubLLM(follow_up_rounds=5)
+    report = researcher.research("什么是注意力机制")
+
+    # 第2轮全是已见过的论文，边际收益为0，不再进入第3轮
+    assert [stat['yield'] for stat in researcher.novelty_stats] == [1.0, 0.0]
+    assert "**搜索轮数**: 2 轮迭代搜索" in report
+    assert "第2轮边际收益0.00低于阈值0.20" in report
+
+
+def test_stops_before_budget_runs_out_and_reports_usage():
+    researcher = make_researcher(follow_up_rounds=5)
+    researcher.budget = ResearchBudget(max_search_calls=3)
+    report = researcher.research("什么是注意力机制")
+
+    assert researcher.stop_reason == "arXiv调用已用3/3次"
+    assert "**搜索轮数**: 1 轮迭代搜索" in report
+    # 预算停止后仍生成了完整报告，并统计了估算的token消耗
+    assert "# 学术研究报告" in report and researcher.budget.tokens > 0
+    assert "### 💰 预算消耗" in report and "- **arXiv调用**: 3 / 3" in report
+
+
+
+def test_branches_leave_time_reserved_for_report():
+    researcher = make_researcher(delay=1.0, follow_up_rounds=5)
+    researcher.branching = True
+    researcher.budget = ResearchBudget(max_seconds=4.8, reserve_seconds=3.0)
+    start = time.monotonic()
+    report = researcher.research("什么是注意力机制")
+
+    # 第一轮约1秒后只剩0.8秒可用于分支（其余留给最终报告），1秒的分支搜索被取消
+    assert time.monotonic() - start < 2.5
+    assert report.count("（深度") == 0 and "# 学术研究报告" in report
+
+
+if __name__ == "__main__":
+    test_async_citations_follow_query_order()
+    test_round_queries_run_concurrently()
+    test_research_works_inside_running_loop()
+    test_branching_runs_follow_ups_concurrently()
+    test_branching_respects_search_budget()
+    test_incremental_analysis_keeps_prompt_flat()
+    test_stops_early_when_marginal_yield_drops()
+    test_stops_before_budget_runs_out_and_reports_usage()
+    test_branches_leave_time_reserved_for_report()
+    print("✅ 异步研究引擎测试通过")
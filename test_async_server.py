@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+测试asyncio服务模式：与Flask模式相同的路由、SSE推送与Last-Event-ID续传、上千个空闲观看者
+使用本地桩LLM和桩arXiv检索，只访问本机端口
+"""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from async_server import AsyncResearchServer
+from sse_load_test import run_load_test
+from test_async_research import make_researcher
+from test_progress_log import parse_sse
+
+
+@pytest.fixture
+def server(monkeypatch, web_services):
+    import web_interface
+
+    monkeypatch.setattr(web_interface, "SSE_HEARTBEAT_SECONDS", 0.05)
+    with AsyncResearchServer(port=0) as server:
+        yield server
+
+
+def fetch(url, data=None, headers=None):
+    request = urllib.request.Request(url, data=json.dumps(data).encode("utf-8") if data is not None else None,
+                                     headers={'Content-Type': 'application/json', **(headers or {})})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+
+def test_routes_are_served_by_the_flask_app(server):
+    status, body = fetch(server.url + "/")
+    assert status == 200 and "<html" in body.lower()
+
+    status, body = fetch(server.url + "/research", data={'question': "  "})
+    assert status == 400 and json.loads(body) == {'error': '请输入研究问题'}
+
+    status, body = fetch(server.url + "/result/missing")
+    assert status == 404
+
+    status, body = fetch(server.url + "/metrics/sse")
+    assert status == 200 and json.loads(body)['sse_viewers'] == 0
+
+
+def test_sse_stream_matches_event_log_and_resumes(server):
+    import web_interface
+
+    session = web_interface.ResearchSession("sess-async")
+    session.researcher = make_researcher(delay=0.05, follow_up_rounds=0)
+    session.is_running = True
+    web_interface.research_sessions["sess-async"] = session
+
+    research = threading.Thread(target=web_interface.conduct_research_with_progress,
+                                args=("sess-async", "什么是注意力机制"))
+    research.start()
+    status, body = fetch(server.url + "/progress/sess-async")
+    research.join()
+
+    full = parse_sse(body)
+    assert status == 200
+    assert [seq for seq, _ in full if seq is not None] == list(range(1, len(session.progress_log) + 1))
+    assert full[-2][1]['step'] == 'result' and full[-1][1] == {'step': 'done'}
+
+    _, resumed_body = fetch(server.url + "/progress/sess-async", headers={'Last-Event-ID': "3"})
+    resumed = parse_sse(resumed_body)
+    assert [data for _, data in resumed] == [data for seq, data in full if seq is not None and seq > 3] + \
+        [full[-2][1], {'step': 'done'}]
+
+    _, missing = fetch(server.url + "/progress/missing")
+    assert parse_sse(missing) == [(None, {'error': '会话不存在'})]
+    assert server.stats()['sse_viewers'] == 0 and server.stats()['watched_sessions'] == 0
+
+
+def test_thousand_idle_viewers_share_one_thread(web_services):
+    result = run_load_test(viewers=1000, idle=0.2)
+
+    assert result['sse_viewers'] == 1000 and result['done'] == 1000
+    # 观看者是协程，不随连接数增加线程
+    assert result['threads_idle'] <= result['threads_before'] + 1
+    assert result['fanout_max_ms'] < 5000
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+测试批量研究 research_many：并发执行、跨问题共享检索缓存、结果增量回调
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import json
+import time
+
+from main import load_completed_questions
+from search_cache import SearchResultCache
+from test_async_research import StubSearchTool, make_researcher
+
+QUESTIONS = ["什么是注意力机制", "注意力机制有哪些变体", "注意力机制的计算复杂度"]
+
+
+def make_batch_researcher(delay=0.0):
+    researcher = make_researcher(follow_up_rounds=0)
+    researcher.search_tool = StubSearchTool(delay)
+    return researcher
+
+
+def test_questions_share_search_cache():
+    researcher = make_batch_researcher()
+    finished = []
+    records = researcher.research_many(QUESTIONS, concurrency=1, on_result=finished.append)
+
+    # 三个问题的首轮查询相同，只有第一个问题真正检索
+    stats = researcher.search_tool.cache.stats()
+    assert (stats['misses'], stats['hits']) == (3, 6)
+    assert [r['question'] for r in records] == QUESTIONS
+    assert [r['question'] for r in finished] == QUESTIONS
+    # 每个问题的citation独立从1开始编号
+    assert all(r['papers'] == 6 and "[citation:6]" in r['report'] for r in records)
+    assert len({r['session_id'] for r in records}) == 3
+
+
+def test_questions_run_concurrently_under_llm_limit():
+    researcher = make_batch_researcher(delay=0.3)
+    researcher.search_tool.cache = SearchResultCache(ttl=0)  # 不命中缓存，只测并发
+    start = time.monotonic()
+    records = researcher.research_many(QUESTIONS, concurrency=3, llm_concurrency=1)
+    elapsed = time.monotonic() - start
+
+    # 串行执行至少需要 3 × 0.3 秒
+    assert elapsed < 0.8
+    assert all("# 学术研究报告" in r['report'] for r in records)
+
+
+def test_load_completed_questions_skips_failed_and_truncated(tmp_path):
+    out = tmp_path / "results.jsonl"
+    lines = [json.dumps({'question': "a", 'report': "r"}), json.dumps({'question': "b", 'error': "x"}),
+             '{"question": "c", "rep']
+    out.write_text("\n".join(lines), encoding="utf-8")
+    assert load_completed_questions(str(out)) == {"a"}
+
+
+if __name__ == "__main__":
+    import tempfile
+    import pathlib
+    test_questions_share_search_cache()
+    test_questions_run_concurrently_under_llm_limit()
+    test_load_completed_questions_skips_failed_and_truncated(pathlib.Path(tempfile.mkdtemp()))
+    print("✅ 批量研究测试通过")
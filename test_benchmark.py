@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试基准测试工具：分位数统计、指标采集和基线对比门禁
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import copy
+import json
+
+from benchmark import compare_results, main, percentile, run_benchmark
+from test_async_research import make_researcher
+
+
+def test_percentile_interpolates():
+    values = [5.0, 1.0, 3.0, 2.0, 4.0]
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 95) == 4.8
+    assert percentile([2.0], 99) == 2.0
+    assert percentile([], 50) == 0.0
+
+
+def test_run_benchmark_collects_metrics():
+    created = []
+
+    def factory(engine):
+        researcher = make_researcher(delay=0.01, follow_up_rounds=1)
+        created.append(researcher)
+        return researcher
+
+    scenario = {'name': "stub", 'engine': "traditional", 'question': "什么是注意力机制"}
+    results = run_benchmark(factory, [scenario], trials=3, warmup=1)
+    summary = results['scenarios']['stub']['summary']
+
+    # 每次试验（含预热）使用新的研究器
+    assert len(created) == 4
+    assert summary['trials'] == 3 and len(results['scenarios']['stub']['trials']) == 3
+    assert summary['wall_min'] <= summary['wall_p50'] <= summary['wall_p95'] <= summary['wall_max']
+    assert summary['llm_calls'] == 5 and summary['prompt_tokens'] > 0
+    assert set(summary['stages']) == {'initial_thinking', 'query_generation', 'search', 'analysis',
+                                      'final_report'}
+    assert summary['stages']['search'] >= 0.02  # 两轮检索，每轮的查询各0.01秒
+    assert summary['peak_memory_mb'] > 0
+    # 桩检索工具不经过arXiv网关
+    assert summary['arxiv_calls'] == 0
+
+
+def make_result(**summary):
+    base = {'wall_p50': 1.0, 'wall_p95': 1.5, 'llm_calls': 5, 'prompt_tokens': 1000,
+            'completion_tokens': 200, 'arxiv_calls': 5, 'peak_memory_mb': 10.0}
+    base.update(summary)
+    return {'scenarios': {'s': {'summary': base}}}
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = make_result()
+    rows = compare_results(baseline, make_result(wall_p95=1.6, prompt_tokens=1200, peak_memory_mb=10.4))
+    regressed = {r['metric'] for r in rows if r['regressed']}
+    # wall_p95 +6.7% 在阈值内；prompt_tokens +20% 退化；内存差值低于噪声下限
+    assert regressed == {'prompt_tokens'}
+
+    rows = compare_results(baseline, make_result(wall_p95=1.6), metric_thresholds={'wall_p95': 0.05})
+    assert [r['metric'] for r in rows if r['regressed']] == ['wall_p95']
+    # 改进不算退化
+    assert not any(r['regressed'] for r in compare_results(baseline, make_result(wall_p50=0.5)))
+
+
+def test_compare_command_exit_code(tmp_path):
+    baseline_path = tmp_path / "baseline.json"
+    current_path = tmp_path / "current.json"
+    baseline = make_result()
+    baseline_path.write_text(json.dumps(baseline), encoding="utf-8")
+
+    current_path.write_text(json.dumps(copy.deepcopy(baseline)), encoding="utf-8")
+    assert main(["compare", str(baseline_path), str(current_path)]) == 0
+
+    current_path.write_text(json.dumps(make_result(arxiv_calls=8)), encoding="utf-8")
+    assert main(["compare", str(baseline_path), str(current_path)]) == 1
+    assert main(["compare", str(baseline_path), str(current_path), "--metric-threshold", "arxiv_calls=1.0"]) == 0
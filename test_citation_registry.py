@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+测试引用登记表：编号、按编号/论文ID查找、研究结束后释放，以及同一研究器多次研究时编号不漂移
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+from citation_registry import CitationRegistry
+from search_tool import SearchResult
+from test_async_research import StubSearchTool, make_researcher
+
+
+def paper(paper_id, title=None):
+    return SearchResult(title=title or f"paper {paper_id}", url=f"http://arxiv.org/abs/{paper_id}",
+                        snippet="s", content="s", date_published="2024-01-01", paper_id=paper_id)
+
+
+def test_register_and_lookup():
+    registry = CitationRegistry()
+    first, second, again = paper("2401.00001v1"), paper("2401.00002"), paper("2401.00001v2")
+    assert registry.register_all([first, second, again]) == [first, second, again]
+
+    assert [r.citation for r in (first, second, again)] == ["citation:1", "citation:2", "citation:3"]
+    assert registry["citation:2"] is second and registry.get(3) is again
+    assert "citation:4" not in registry and registry.get("bogus") is None
+    # 同一论文的不同版本指向首次出现的编号
+    assert registry.citation_for(again) == "citation:1"
+    assert list(registry) == ["citation:1", "citation:2", "citation:3"]
+
+
+def test_release_keeps_count_and_restore_continues_numbering():
+    registry = CitationRegistry()
+    results = registry.register_all([paper("a"), paper("b")])
+    registry.release()
+    assert len(registry) == 0 and registry.count == 2 and registry.released
+
+    restored = CitationRegistry.restore(results, count=2)
+    assert restored["citation:2"].paper_id == "b"
+    assert restored.register(paper("c")) == "citation:3"
+
+
+def test_numbering_restarts_for_each_research():
+    researcher = make_researcher(follow_up_rounds=0)
+    first = researcher.research("什么是注意力机制")
+    first_count = researcher.citation_counter
+    researcher.search_tool = StubSearchTool()  # 检索工具会跳过已搜索过的查询，换一个新的
+    second = researcher.research("什么是注意力机制")
+
+    # 同一研究器的第二次研究从citation:1重新编号，结束后不再持有论文对象
+    assert first == second
+    assert researcher.citation_counter == first_count == 6
+    assert len(researcher.citations) == 0
+
+
+if __name__ == "__main__":
+    test_register_and_lookup()
+    test_release_keeps_count_and_restore_continues_numbering()
+    test_numbering_restarts_for_each_research()
+    print("✅ 引用登记表测试通过")
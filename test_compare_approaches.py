@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+测试方法对比器的并发执行：每次运行使用状态独立的研究器，两种方法共享检索缓存
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import time
+
+from compare_approaches import ApproachComparator
+from test_agent_tool_calls import TOOL_TURN, make_agent
+from test_async_research import make_researcher
+
+
+class StatelessAgentLLM:
+    """并发的多个Agent共享同一个LLM：按prompt内容而不是调用次数决定响应"""
+
+    def response(self, prompt):
+        if "Tool Results:" not in prompt:
+            return TOOL_TURN
+        return "# 研究报告\n注意力机制的定义、原理与应用[citation:1]。"
+
+
+def make_comparator(max_workers, shared_cache=True, delay=0.1):
+    comparator = ApproachComparator(max_workers=max_workers, shared_cache=shared_cache)
+    comparator.traditional_researcher = make_researcher(delay=delay, follow_up_rounds=0)
+    comparator.agent_researcher = make_agent(delay=delay)
+    comparator.agent_researcher.llm = StatelessAgentLLM()
+    for researcher in (comparator.traditional_researcher, comparator.agent_researcher):
+        researcher.search_tool.cache = comparator.search_cache
+    return comparator
+
+
+def test_runs_are_concurrent_and_isolated():
+    comparator = make_comparator(max_workers=6)
+    start = time.monotonic()
+    results = comparator.run_comprehensive_comparison()
+    elapsed = time.monotonic() - start
+
+    runs = [case[key] for case in results["test_results"] for key in ("traditional_result", "agent_result")]
+    assert [case["test_case"]["id"] for case in results["test_results"]] == [c["id"] for c in comparator.test_cases]
+    assert all(run["success"] for run in runs)
+    # 三个用例提出相同的查询，查询去重和citation编号互不影响
+    assert [run["citations_count"] for run in runs] == [6, 6] * 3
+    assert elapsed < sum(run["time_cost"] for run in runs) * 0.6
+    # 模板研究器本身不执行研究
+    assert not comparator.traditional_researcher.search_tool.searched_queries
+    assert comparator.agent_researcher.citation_counter == 0
+
+
+def test_shared_cache_serves_identical_data_to_later_runs():
+    comparator = make_comparator(max_workers=1)
+    comparator.run_comprehensive_comparison()
+    stats = comparator.search_cache.stats()
+    # 第一个用例：传统方法3个查询 + Agent的3个查询（transformer重复）；之后的用例全部命中
+    assert stats['misses'] == 5 and stats['hits'] == 13
+
+    assert make_comparator(max_workers=1, shared_cache=False).search_cache is None
+
+
+def test_search_time_is_reported_separately_from_engine_time():
+    comparator = make_comparator(max_workers=2, delay=0.2)
+    results = comparator.run_comprehensive_comparison()
+    runs = [case[key] for case in results["test_results"] for key in ("traditional_result", "agent_result")]
+
+    # 并发运行时先检索的一方承担0.2秒网络延迟、后到的命中共享缓存；桩LLM的引擎耗时都很短
+    assert max(run["search_time"] for run in runs) >= 0.2
+    assert all(run["engine_time"] < 0.15 for run in runs)
+    assert all(abs(run["search_time"] + run["engine_time"] - run["time_cost"]) < 1e-9 for run in runs)
+    efficiency = results["test_results"][0]["quality_analysis"]["efficiency"]
+    assert efficiency["time_diff"] == abs(efficiency["traditional_engine_time"] - efficiency["agent_engine_time"])
+    assert "引擎" in comparator.generate_comparison_report(results)
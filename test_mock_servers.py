@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+测试本地模拟服务：两种引擎通过真实HTTP与模拟LLM和模拟arXiv完成研究，错误注入、限流和输出速度可控
+只访问本机端口，不访问任何外部服务
+"""
+
+import time
+
+import pytest
+
+from deep_research_agentic_by_deepseek import DeepSeekAgenticResearcher
+from deep_researcher import DeepResearcher
+from llm import estimate_tokens
+from mock_servers import MockArxivServer, MockLLMServer, attach_mock_servers
+from search_tool import ArxivSearchTool
+
+FIXTURES = [
+    {'id': "1706.03762", 'title': "Attention Is All You Need", 'summary': "The Transformer architecture.",
+     'authors': ["Ashish Vaswani"], 'categories': ["cs.CL"], 'published': "2017-06-12"},
+    {'id': "2004.05150", 'title': "Longformer", 'summary': "Sparse attention for long documents.",
+     'authors': ["Iz Beltagy"], 'categories': ["cs.CL"], 'published': "2020-04-10"},
+]
+
+
+@pytest.fixture
+def servers():
+    with MockLLMServer() as llm_server, MockArxivServer() as arxiv_server:
+        yield llm_server, arxiv_server
+
+
+def test_traditional_engine_against_mock_servers(servers):
+    llm_server, arxiv_server = servers
+    researcher = attach_mock_servers(DeepResearcher("deepseek-v3"), llm_server, arxiv_server)
+    report = researcher.research("什么是注意力机制")
+
+    assert "# 学术研究报告" in report and "## 6. 前沿趋势与发展" in report
+    # 首轮3个查询 + 1轮后续查询2个
+    assert arxiv_server.stats()['requests'] == 5
+    assert researcher.citation_counter == 25
+    assert llm_server.stats()['requests'] == researcher.llm.total_usage['calls']
+    assert researcher.llm.total_usage['prompt_tokens'] == llm_server.stats()['prompt_tokens']
+
+
+def test_agent_engine_streams_tool_calls_from_mock(servers):
+    llm_server, arxiv_server = servers
+    agent = attach_mock_servers(DeepSeekAgenticResearcher("deepseek-v3"), llm_server, arxiv_server)
+    report = agent.research("什么是注意力机制")
+
+    assert report.startswith("# 研究报告")
+    assert sorted(arxiv_server.queries) == ["topic 0 attention", "topic 0 transformer"]
+    assert llm_server.stats()['stream_requests'] == 2
+
+
+def test_fixtures_and_rate_limiting():
+    with MockArxivServer(fixtures=FIXTURES, min_interval=0.2) as arxiv_server:
+        tool = ArxivSearchTool()
+        tool.base_url = arxiv_server.url
+        # 客户端不限速：第二个请求被服务端限流，网关按Retry-After等待后重试
+        tool.gateway = arxiv_server.make_gateway()
+        tool.gateway._limiter.min_interval = 0
+        titles = [r.title for r in tool._search_arxiv_api("sparse attention", 5)]
+        start = time.monotonic()
+        again = tool._search_arxiv_api("transformer architecture", 5)
+
+        assert titles == ["Longformer", "Attention Is All You Need"]
+        assert [r.paper_id for r in again] == ["1706.03762"]
+        assert time.monotonic() - start >= 0.15
+        assert arxiv_server.stats() == {'requests': 2, 'throttled': 1, 'queries': 2}
+
+
+def test_error_injection_and_output_speed():
+    with MockLLMServer(tokens_per_second=500, script=[("你好", "你好，" * 50)]) as llm_server:
+        llm = llm_server.make_llm()
+        start = time.monotonic()
+        deltas = list(llm.stream_response("你好"))
+        assert "".join(deltas) == "你好，" * 50 and len(deltas) > 1
+        # 约113个token按500 tokens/秒输出
+        completion_tokens = estimate_tokens("你好，" * 50)
+        assert time.monotonic() - start >= completion_tokens / 500 * 0.9
+        assert llm.last_usage == {'prompt_tokens': 2, 'completion_tokens': completion_tokens, 'estimated': False}
+
+        llm_server.inject_errors(5)
+        assert "请求失败" in llm.response("你好")
+        assert llm.response("你好") == "你好，" * 50
+        assert llm_server.stats()['errors'] == 5
+
+
+def test_stream_response_handles_gateway_without_sse():
+    # 网关忽略stream参数，200返回普通JSON补全：直接使用其内容，不再请求一次
+    with MockLLMServer(supports_stream=False, script=[("你好", "hello world")]) as llm_server:
+        llm = llm_server.make_llm()
+        assert list(llm.stream_response("你好")) == ["hello world"]
+        assert llm_server.stats()['requests'] == 1
+        assert llm.last_usage['completion_tokens'] == estimate_tokens("hello world")
+
+    # SSE流中没有任何内容：退回非流式调用
+    with MockLLMServer(script=lambda prompt: "") as llm_server:
+        llm = llm_server.make_llm()
+        assert "".join(llm.stream_response("你好")) == ""
+        assert llm_server.stats()['requests'] == 2 and llm_server.stats()['stream_requests'] == 1
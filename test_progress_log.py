@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+测试进度事件日志和SSE推送：阻塞等待立即唤醒、空闲时才发心跳、Last-Event-ID断点续传
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import json
+import threading
+import time
+
+from progress_log import ProgressLog
+from test_async_research import make_researcher
+
+
+def test_read_blocks_until_append_or_close():
+    log = ProgressLog()
+    assert log.read(0, timeout=0) == []
+
+    woke = []
+
+    def reader():
+        start = time.monotonic()
+        woke.append((log.read(0, timeout=5), time.monotonic() - start))
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    time.sleep(0.05)
+    assert log.append({'step': 'start'}) == 1
+    thread.join()
+    [(entries, elapsed)] = woke
+    assert entries == [(1, {'step': 'start'})] and elapsed < 1
+
+    log.append({'step': 'thinking'})
+    assert log.read(1, timeout=0) == [(2, {'step': 'thinking'})]
+    # 日志只追加：同一序号可以被多次读取
+    assert [seq for seq, _ in log.read(0, timeout=0)] == [1, 2]
+
+    start = time.monotonic()
+    threading.Timer(0.05, log.close).start()
+    assert log.read(2, timeout=5) == [] and time.monotonic() - start < 1
+    assert log.closed and len(log) == 2
+
+
+def parse_sse(body):
+    """解析SSE文本为 [(id或None, data字典)]"""
+    messages = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if 'data' in fields:
+            messages.append((int(fields['id']) if 'id' in fields else None, json.loads(fields['data'])))
+    return messages
+
+
+def test_sse_replays_from_last_event_id(monkeypatch, web_services):
+    import web_interface
+
+    monkeypatch.setattr(web_interface, "SSE_HEARTBEAT_SECONDS", 0.05)
+    session = web_interface.ResearchSession("sess-sse")
+    session.researcher = make_researcher(delay=0.05, follow_up_rounds=0)
+    session.is_running = True
+    web_interface.research_sessions["sess-sse"] = session
+
+    client = web_interface.app.test_client()
+    research = threading.Thread(target=web_interface.conduct_research_with_progress,
+                                args=("sess-sse", "什么是注意力机制"))
+    research.start()
+    full = parse_sse(client.get("/progress/sess-sse").get_data(as_text=True))
+    research.join()
+
+    ids = [seq for seq, _ in full if seq is not None]
+    assert ids == list(range(1, len(session.progress_log) + 1))
+    assert full[-2][1]['step'] == 'result' and full[-1][1] == {'step': 'done'}
+    # 心跳不带序号，不影响重连位置
+    assert all(seq is None for seq, data in full if data['step'] == 'heartbeat')
+
+    # 断线重连：只推送Last-Event-ID之后的事件，然后是最终结果
+    resumed = parse_sse(client.get("/progress/sess-sse", headers={'Last-Event-ID': str(ids[4])})
+                        .get_data(as_text=True))
+    assert [seq for seq, _ in resumed if seq is not None] == ids[5:]
+    replayed = [data for seq, data in full if seq is not None and seq > ids[4]]
+    assert [data for _, data in resumed] == replayed + [full[-2][1], {'step': 'done'}]
+
+
+def test_report_deltas_are_coalesced_before_logging(web_services):
+    import web_interface
+
+    session = web_interface.ResearchSession("sess-delta")
+    session.add_progress('start', '🔬 开始研究问题', 5)
+    for _ in range(1000):
+        session.add_report_delta("字")
+    session.add_report_delta("新", reset=True)
+    for _ in range(99):
+        session.add_report_delta("文")
+    session.add_progress('complete', '🎉 研究完成！', 100)
+
+    # 逐token的片段合并成少量事件，进度事件不被淹没，拼接结果和顺序不变
+    steps = [event['step'] for _, event in session.progress_log.read(0, timeout=0)]
+    assert len(steps) < 10 and steps[0] == 'start' and steps[-1] == 'complete'
+    deltas = [event for _, event in session.progress_log.read(0, timeout=0) if event['step'] == 'report_delta']
+    reset_at = max(i for i, event in enumerate(deltas) if event['reset'])
+    assert ''.join(event['content'] for event in deltas[reset_at:]) == "新" + "文" * 99
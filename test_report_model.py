@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+测试结构化报告模型，以及Web的 /result/<id>?format=json 和 /citations/<id> 接口
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+from report_model import split_sections
+from test_async_research import make_researcher
+
+
+def test_split_sections_ignores_headings_in_code():
+    sections = split_sections("前言\n# 标题\n正文\n```\n# 注释\n```\n## 小节\n内容")
+    assert [(s['level'], s['title']) for s in sections] == [(0, ""), (1, "标题"), (2, "小节")]
+    assert "# 注释" in sections[1]['content']
+
+
+def test_research_builds_structured_report():
+    researcher = make_researcher(follow_up_rounds=1)
+    markdown = researcher.research("什么是注意力机制")
+    report = researcher.last_report
+
+    assert report.markdown == markdown
+    assert [s['title'] for s in report.sections] == ["学术研究报告", "1. 执行摘要"]
+    assert [c['citation'] for c in report.citations] == [f"citation:{i}" for i in range(1, 11)]
+    assert report.citations[0]['title'] == "attention mechanism paper 0"
+    assert report.stats['rounds'] == 2 and report.stats['papers'] == 10
+    assert report.stats['date_range'] == ["2024-01-01", "2024-01-02"]
+    # 引用表与Markdown索引一致，但不需要解析Markdown
+    assert report.to_dict(include_markdown=False).keys() == {'question', 'sections', 'citations',
+                                                              'stats', 'created_at'}
+
+
+def test_web_result_json_and_citations(web_services):
+    import web_interface
+
+    session = web_interface.ResearchSession("sess-json")
+    researcher = make_researcher(follow_up_rounds=0)
+    session.researcher = researcher
+    web_interface.research_sessions["sess-json"] = session
+    client = web_interface.app.test_client()
+    try:
+        assert client.get("/citations/sess-json").status_code == 404
+        web_interface.conduct_research_with_progress("sess-json", "什么是注意力机制")
+
+        data = client.get("/result/sess-json?format=json").get_json()
+        assert data['report']['sections'][0]['title'] == "学术研究报告"
+        assert data['report']['markdown'] == client.get("/result/sess-json").get_json()['result']
+
+        citations = client.get("/citations/sess-json").get_json()['citations']
+        assert len(citations) == 6 and citations[5]['citation'] == "citation:6"
+        assert client.get("/citations/missing").status_code == 404
+    finally:
+        del web_interface.research_sessions["sess-json"]
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+测试研究报告存储：重复问题秒回、新鲜期、全文检索和Web检索接口
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import time
+
+from report_store import ReportStore, normalize_question
+from test_async_research import make_researcher
+
+
+def make_store(tmp_path, **kwargs):
+    return ReportStore(str(tmp_path / "reports.db"), **kwargs)
+
+
+def test_exact_and_similar_lookup(tmp_path):
+    store = make_store(tmp_path)
+    report_id = store.save("什么是Transformer架构？", "# 报告\nTransformer依赖自注意力机制。",
+                           [{'citation': "citation:1", 'title': "Attention Is All You Need"}], rounds=2)
+
+    assert normalize_question("什么是 Transformer 架构?") == normalize_question("Transformer架构是什么")
+    hit = store.lookup("transformer架构是什么？")
+    assert hit['id'] == report_id and hit['match'] == "exact"
+    assert hit['citations'][0]['title'] == "Attention Is All You Need"
+
+    similar = store.lookup("什么是Transformer的架构")
+    assert similar['match'] == "similar" and similar['similarity'] >= 0.9
+    assert store.lookup("Transformer架构的训练成本") is None
+
+
+def test_similar_lookup_requires_same_versions(tmp_path):
+    store = make_store(tmp_path)
+    store.save("Llama 2 微调方法综述", "# Llama 2 报告", [])
+    store.save("GPT-4 的推理能力评测", "# GPT-4 报告", [])
+
+    # 编辑相似度超过阈值，但版本号不同
+    assert store.lookup("Llama 3 微调方法综述") is None
+    assert store.lookup("GPT-5 的推理能力评测") is None
+    assert store.lookup("GPT-4o 的推理能力评测") is None
+    assert store.lookup("llama 2微调方法的综述")['report'] == "# Llama 2 报告"
+
+
+def test_freshness_window(tmp_path):
+    store = make_store(tmp_path, freshness_seconds=60)
+    store.save("扩散模型综述", "# 报告", [])
+    assert store.lookup("扩散模型综述") is not None
+    assert store.lookup("扩散模型综述", freshness_seconds=0) is None
+
+    store._conn.execute("UPDATE reports SET created_at = ?", (time.time() - 120,))
+    assert store.lookup("扩散模型综述") is None
+    # 过期报告仍可检索
+    assert [r['question'] for r in store.search("扩散模型")] == ["扩散模型综述"]
+
+
+def test_full_text_search(tmp_path):
+    store = make_store(tmp_path)
+    store.save("大模型推理优化", "# 报告\n投机解码和KV cache量化可以降低推理延迟。", [])
+    store.save("图神经网络应用", "# 报告\n图神经网络用于分子性质预测。", [])
+
+    results = store.search("投机解码")
+    assert [r['question'] for r in results] == ["大模型推理优化"]
+    assert "**投机解**" in results[0]['snippet']
+    assert store.search("投机解码 分子性质") == []
+    assert store.search("quantization") == []
+    assert store.search('"; DROP TABLE reports; --') == []
+
+
+def test_repeat_question_is_answered_from_store(tmp_path):
+    store = make_store(tmp_path)
+    researcher = make_researcher(follow_up_rounds=0)
+    researcher.report_store = store
+    first = researcher.research("什么是注意力机制")
+    llm_calls = researcher.llm.calls
+
+    second = researcher.research("什么是注意力机制？")
+    assert second == first
+    assert researcher.llm.calls == llm_calls
+    assert len(researcher.last_citations) == 6
+
+    researcher.reuse_reports = False
+    researcher.search_tool.searched_queries.clear()
+    researcher.research("什么是注意力机制")
+    assert researcher.llm.calls > llm_calls
+    assert len(store.search("注意力机制")) == 2
+
+
+def test_failed_report_is_not_stored(tmp_path):
+    store = make_store(tmp_path)
+    researcher = make_researcher(follow_up_rounds=0)
+    researcher.report_store = store
+    answer = researcher.llm.response
+
+    def failing(prompt):
+        if "学术研究报告" in prompt:
+            return "所有API路径都请求失败，请检查API密钥和URL"
+        return answer(prompt)
+
+    researcher.llm.response = failing
+    report = researcher.research("什么是注意力机制")
+    # 退回备用报告，但不写入存储，下次同一问题重新研究
+    assert "本报告采用了精简模式" in report and researcher.last_report_failed
+    assert store.lookup("什么是注意力机制") is None
+
+    researcher.llm.response = answer
+    researcher.search_tool.searched_queries.clear()
+    researcher.research("什么是注意力机制")
+    assert not researcher.last_report_failed
+    assert store.lookup("什么是注意力机制")['match'] == "exact"
+
+
+def test_web_report_search_endpoint(tmp_path, monkeypatch, web_services):
+    import web_interface
+
+    store = make_store(tmp_path)
+    store.save("大模型推理优化", "# 报告\n投机解码降低推理延迟。", [])
+    monkeypatch.setattr(web_interface, "report_store", store)
+    client = web_interface.app.test_client()
+
+    results = client.get("/reports/search?q=投机解码").get_json()['results']
+    assert results[0]['question'] == "大模型推理优化"
+    report = client.get(f"/reports/{results[0]['id']}").get_json()
+    assert report['report'].startswith("# 报告")
+    assert client.get("/reports/search").status_code == 400
+    assert client.get("/reports/999").status_code == 404
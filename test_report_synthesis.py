@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+测试map-reduce报告综合：所有论文都参与报告，批次并行调用LLM
+使用本地桩LLM，不访问任何外部服务
+"""
+
+import re
+import threading
+import time
+
+from deep_researcher import DeepResearcher
+from research_budget import ResearchBudget
+from search_tool import ArxivSearchTool, SearchResult
+
+
+class RecordingLLM:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def response(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+        time.sleep(self.delay)
+        cited = re.findall(r"\[citation:\d+\]", prompt)
+        if "请从以下论文中提取" in prompt or "请合并以下多组论文发现" in prompt:
+            return "\n".join(f"- [方法] 发现 {c}" for c in dict.fromkeys(cited))
+        return "# 学术研究报告\n\n## 1. 执行摘要\n" + " ".join(dict.fromkeys(cited))
+
+
+def make_papers(count):
+    papers = []
+    for i in range(1, count + 1):
+        paper = SearchResult(title=f"Paper {i}", url=f"http://arxiv.org/abs/{i}", snippet=f"abstract {i}",
+                             content=f"abstract {i}", date_published="2024-01-01", paper_id=str(i))
+        paper.citation = f"citation:{i}"
+        papers.append(paper)
+    return papers
+
+
+def make_researcher(llm):
+    researcher = DeepResearcher("stub", search_tool=ArxivSearchTool())
+    researcher.llm = llm
+    return researcher
+
+
+def test_small_result_set_uses_single_prompt():
+    llm = RecordingLLM()
+    make_researcher(llm)._generate_core_report("问题", make_papers(5))
+    assert len(llm.prompts) == 1
+    assert "相关论文（精选）" in llm.prompts[0]
+
+
+def test_map_reduce_covers_every_paper():
+    llm = RecordingLLM()
+    report = make_researcher(llm)._generate_core_report("问题", make_papers(95))
+
+    # 10批map + 3组reduce + 1组reduce + 最终报告
+    map_prompts = [p for p in llm.prompts if "请从以下论文中提取" in p]
+    reduce_prompts = [p for p in llm.prompts if "请合并以下多组论文发现" in p]
+    assert len(map_prompts) == 10
+    assert len(reduce_prompts) == 4
+    assert "各批论文的结构化发现（已合并）" in llm.prompts[-1]
+    for i in range(1, 96):
+        assert f"[citation:{i}]" in report
+
+
+def test_map_batches_run_in_parallel():
+    llm = RecordingLLM(delay=0.2)
+    researcher = make_researcher(llm)
+    researcher.report_mode = "map_reduce"
+    start = time.monotonic()
+    researcher._generate_core_report("问题", make_papers(40))
+
+    # 4批map并行 + 1次reduce + 最终报告，串行执行至少需要 6 × 0.2 秒
+    assert time.monotonic() - start < 1.0
+
+
+def test_map_reduce_charges_budget_for_every_call():
+    llm = RecordingLLM()
+    researcher = make_researcher(llm)
+    researcher.budget = ResearchBudget(max_llm_calls=100)
+    researcher._generate_core_report("问题", make_papers(95))
+
+    assert researcher._map_reduce_calls(95) == 14
+    assert researcher.budget.llm_calls == len(llm.prompts) == 15
+
+
+def test_map_reduce_falls_back_to_single_prompt_when_budget_is_short():
+    llm = RecordingLLM()
+    researcher = make_researcher(llm)
+    researcher.budget = ResearchBudget(max_llm_calls=5)
+    report = researcher._generate_core_report("问题", make_papers(95))
+
+    assert len(llm.prompts) == 1 and "相关论文（精选）" in llm.prompts[0]
+    assert researcher.budget.llm_calls == 1 and not researcher.last_report_failed
+    assert "# 学术研究报告" in report
+
+
+def test_refused_report_call_falls_back():
+    llm = RecordingLLM()
+    researcher = make_researcher(llm)
+    researcher.budget = ResearchBudget(max_llm_calls=2)
+    researcher.budget.llm_calls = 2
+    report = researcher._generate_core_report("问题", make_papers(5))
+
+    assert llm.prompts == [] and researcher.last_report_failed
+    assert "本报告采用了精简模式" in report and "研究预算已用尽" in report
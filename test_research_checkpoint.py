@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+测试研究检查点与恢复：最终报告阶段进程退出后，resume只重做未完成的阶段
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import time
+
+from deep_researcher import DeepResearcher
+from research_budget import ResearchBudget
+from research_checkpoint import CheckpointStore
+from search_tool import ArxivSearchTool, SearchResult
+
+
+class ProcessKilled(BaseException):
+    """模拟进程被杀（不会被研究流程中的except Exception吞掉）"""
+
+
+class StubLLM:
+    def __init__(self, die_on_report=False):
+        self.die_on_report = die_on_report
+        self.prompts = []
+
+    def response(self, prompt):
+        self.prompts.append(prompt)
+        if "生成第一轮arXiv搜索查询" in prompt:
+            return "attention||transformer"
+        if "后续查询" in prompt:
+            if "基于以下第1轮" in prompt:
+                return "分析：继续。\n\n证据摘要：第1轮摘要\n\n后续查询：sparse attention"
+            return "分析：足够。\n\n证据摘要：第2轮摘要\n\n后续查询：无"
+        if "学术研究报告" in prompt:
+            if self.die_on_report:
+                raise ProcessKilled()
+            return "# 学术研究报告\n\n## 1. 执行摘要\n结论[citation:1]。"
+        return "初步分析"
+
+
+class CountingSearchTool(ArxivSearchTool):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def _search_single(self, query, max_results, date_from=None, categories=None):
+        self.calls += 1
+        return [SearchResult(title=f"{query} paper", url=f"http://arxiv.org/abs/{query}", snippet="s",
+                             content="s", date_published="2024-01-01", authors=["A"], paper_id=query)]
+
+
+def make_researcher(store, llm):
+    researcher = DeepResearcher("stub", search_tool=CountingSearchTool(), checkpoint_store=store)
+    researcher.llm = llm
+    return researcher
+
+
+def test_resume_after_crash_in_final_answer(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    crashed = make_researcher(store, StubLLM(die_on_report=True))
+    try:
+        crashed.research("什么是注意力机制", session_id="sess1")
+        assert False, "应当在生成报告时中断"
+    except ProcessKilled:
+        pass
+
+    state = store.load("sess1")
+    assert state['stage'] == 'round_2_analysis'
+    assert [len(r['results']) for r in state['rounds']] == [2, 1]
+    assert store.list_sessions()[0]['session_id'] == "sess1"
+
+    llm = StubLLM()
+    resumed = make_researcher(store, llm)
+    report = resumed.resume("sess1")
+
+    # 只重做最终报告：不再搜索，不再做前面的LLM调用
+    assert resumed.search_tool.calls == 0
+    assert len(llm.prompts) == 1 and "学术研究报告" in llm.prompts[0]
+    assert "**搜索轮数**: 2 轮迭代搜索" in report
+    assert "[citation:3]" in report
+    assert store.load("sess1")['stage'] == 'done'
+    assert store.list_sessions() == []
+
+    # 已完成的会话直接返回结果
+    assert make_researcher(store, StubLLM()).resume("sess1") == report
+
+
+def test_resume_mid_round_reuses_searched_papers(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    researcher = make_researcher(store, StubLLM())
+    researcher.research("什么是注意力机制", session_id="sess2")
+
+    # 回退到第1轮搜索完成、尚未分析的状态
+    state = store.load("sess2")
+    state['rounds'] = state['rounds'][:1]
+    state['rounds'][0]['analysis'] = None
+    state.update(stage='round_1_search', search_round=1, search_done=False,
+                 current_queries=state['first_queries'], citation_counter=2,
+                 searched_queries=state['rounds'][0]['queries'])
+    del state['final_answer']
+    store.save("sess2", state)
+
+    resumed = make_researcher(store, StubLLM())
+    report = resumed.resume("sess2")
+    # 第1轮不重新搜索，只搜索第2轮的新查询
+    assert resumed.search_tool.calls == 1
+    assert "**检索论文**: 3 篇学术论文" in report
+
+
+def test_resume_keeps_budget_usage_and_query_dedupe(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    crashed = make_researcher(store, StubLLM(die_on_report=True))
+    crashed.budget = ResearchBudget(max_search_calls=10, max_llm_calls=20)
+    crashed.max_rounds = 7
+    try:
+        crashed.research("什么是注意力机制", session_id="sess3")
+    except ProcessKilled:
+        pass
+    state = store.load("sess3")
+    assert state['searched_queries'] == ["attention", "sparse attention", "transformer"]
+    assert state['budget']['search_calls'] == 3 and state['budget']['llm_calls'] == 4
+
+    # 恢复方不传入预算和配置：按检查点中的原始上限和轮数继续
+    resumed = make_researcher(store, StubLLM())
+    resumed.resume("sess3")
+    assert resumed.max_rounds == 7 and resumed.budget.max_search_calls == 10
+    # 恢复后接着计数，不从零开始；已搜索过的查询不会再次检索
+    assert resumed.budget.search_calls == 3 and resumed.budget.llm_calls == 5
+    assert resumed.search_tool.searched_queries == {"attention", "sparse attention", "transformer"}
+
+
+def test_finished_checkpoints_expire(tmp_path):
+    store = CheckpointStore(str(tmp_path), done_ttl=60)
+    make_researcher(store, StubLLM()).research("什么是注意力机制", session_id="finished")
+    try:
+        make_researcher(store, StubLLM(die_on_report=True)).research("什么是注意力机制", session_id="running")
+    except ProcessKilled:
+        pass
+
+    assert store.purge_expired() == 0
+    assert store.purge_expired(now=time.time() + 120) == 1
+    assert store.load("finished") is None and store.load("running")['stage'] == 'round_2_analysis'
+
+
+def test_resume_in_the_middle_of_branches(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    crashed = make_researcher(store, StubLLM())
+    crashed.branching = True
+
+    async def killed_during_branches(*args, **kwargs):
+        raise ProcessKilled()
+
+    crashed._explore_branches = killed_during_branches
+    try:
+        crashed.research("什么是注意力机制", session_id="branches")
+        assert False, "应当在展开分支时中断"
+    except ProcessKilled:
+        pass
+    state = store.load("branches")
+    assert state['stage'] == 'round_1_branches' and state['branch_queries'] == ["sparse attention"]
+
+    resumed = make_researcher(store, StubLLM())
+    resumed.branching = True
+    report = resumed.resume("branches")
+    # 只重新展开分支：第1轮不重做，分支发现进入报告
+    assert resumed.search_tool.calls == 1
+    assert len(store.load("branches")['rounds']) == 1
+    assert "**sparse attention**（深度1，1篇论文）" in report
+
+
+def test_resume_finished_session_rebuilds_report(tmp_path):
+    from report_store import ReportStore
+
+    store = CheckpointStore(str(tmp_path))
+    researcher = make_researcher(store, StubLLM())
+    report = researcher.research("什么是注意力机制", session_id="sess5")
+
+    # 报告写入报告存储之前进程退出：检查点已是done，报告存储里还没有这份报告
+    reports = ReportStore(str(tmp_path / "reports.db"))
+    resumed = make_researcher(store, StubLLM())
+    resumed.report_store = reports
+    assert resumed.resume("sess5") == report
+
+    # 结构化报告和引用列表从检查点重建，报告补写进报告存储
+    assert resumed.last_report is not None and resumed.last_report.markdown == report
+    assert [c['citation'] for c in resumed.last_citations] == ["citation:1", "citation:2", "citation:3"]
+    assert resumed.last_report.stats['rounds'] == 2 and resumed.last_report.stats['resumed']
+    hit = reports.lookup("什么是注意力机制")
+    assert hit['session_id'] == "sess5" and hit['report'] == report and hit['papers'] == 3
+
+    # 再次恢复不会重复写入
+    again = make_researcher(store, StubLLM())
+    again.report_store = reports
+    again.resume("sess5")
+    assert again.last_citations == resumed.last_citations
+    assert reports._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 1
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+测试研究进度事件总线，以及Web进度映射直接消费真实研究引擎的事件
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import research_events as events
+from research_events import EventBus, StageTimer
+from test_async_research import make_researcher
+
+
+def test_emit_without_subscribers_is_noop():
+    bus = EventBus()
+    assert not bus.active
+    with bus.stage("idle"):
+        pass
+    bus.emit(events.QUERIES, queries=["x"])
+
+
+def test_subscriber_filter_and_unsubscribe():
+    bus = EventBus()
+    received = []
+    unsubscribe = bus.subscribe(received.append, [events.QUERIES])
+    bus.emit(events.QUERIES, "s1", queries=["a"])
+    bus.emit(events.ANALYSIS, "s1", analysis="ignored")
+    unsubscribe()
+    bus.emit(events.QUERIES, "s1", queries=["b"])
+
+    assert [e.data['queries'] for e in received] == [["a"]]
+    assert received[0].to_dict()['session_id'] == "s1"
+
+
+def test_failing_subscriber_does_not_break_research():
+    researcher = make_researcher(follow_up_rounds=0)
+    researcher.events.subscribe(lambda event: 1 / 0)
+    assert "# 学术研究报告" in researcher.research("什么是注意力机制")
+
+
+def test_research_publishes_stage_timings_and_usage():
+    researcher = make_researcher(follow_up_rounds=1)
+    received = []
+    researcher.events.subscribe(received.append)
+    timer = StageTimer(researcher.events)
+    researcher.research("什么是注意力机制", session_id="sess")
+
+    types = [e.type for e in received]
+    assert types[0] == events.RESEARCH_START and types[-1] == events.RESEARCH_END
+    assert all(e.session_id == "sess" for e in received)
+
+    stages = [e.data['stage'] for e in received if e.type == events.STAGE_END]
+    assert stages == ['initial_thinking', 'query_generation', 'search', 'analysis',
+                      'search', 'analysis', 'final_report']
+    assert set(timer.totals()) == set(stages)
+
+    counts = [e.data['count'] for e in received if e.type == events.QUERY_RESULT]
+    assert counts == [2, 2, 2, 2, 2]
+
+    llm_calls = [e for e in received if e.type == events.LLM_CALL]
+    assert len(llm_calls) == 5
+    assert all(e.data['prompt_tokens'] > 0 for e in llm_calls)
+
+
+def test_report_streams_deltas_that_add_up_to_final_report():
+    researcher = make_researcher(follow_up_rounds=0)
+    stub = researcher.llm
+
+    def stream_response(prompt):
+        yield from stub.response(prompt).splitlines(keepends=True)
+
+    researcher.llm.stream_response = stream_response
+    received = []
+    researcher.events.subscribe(received.append, [events.REPORT_DELTA, events.STAGE_END])
+    report = researcher.research("什么是注意力机制")
+
+    deltas = [e.data['text'] for e in received if e.type == events.REPORT_DELTA]
+    # 核心报告逐段到达，统计信息和引用索引作为最后一段
+    assert deltas[0] == "# 学术研究报告\n"
+    assert "### 📖 论文引用索引" in deltas[-1]
+    assert "".join(deltas) == report
+    # 所有增量都在final_report阶段结束之前发出
+    assert received[-1].type == events.STAGE_END and received[-1].data['stage'] == 'final_report'
+
+
+def test_web_progress_reporter_consumes_engine_events():
+    from web_interface import ProgressReporter
+
+    class FakeSession:
+        def __init__(self):
+            self.steps = []
+            self.report = ""
+
+        def add_progress(self, step, content, progress=None):
+            self.steps.append((step, progress))
+
+        def add_report_delta(self, text, reset=False):
+            self.report = text if reset else self.report + text
+
+    researcher = make_researcher(follow_up_rounds=1)
+    session = FakeSession()
+    researcher.events.subscribe(ProgressReporter(session, researcher.max_rounds))
+    report = researcher.research("什么是注意力机制")
+
+    steps = [step for step, _ in session.steps]
+    assert steps[:5] == ['start', 'thinking', 'thinking_result', 'query_gen', 'queries']
+    assert steps.count('search_start') == 2
+    assert 'continue' in steps and 'search_complete' in steps
+    assert steps[-1] == 'final_gen'
+    assert session.report == report
+    progresses = [p for _, p in session.steps]
+    assert progresses == sorted(progresses)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+测试研究任务池：固定并发、排队位置与预计等待时间推送、队列满时拒绝（Web返回429和Retry-After）
+不访问任何外部服务
+"""
+
+import threading
+
+import pytest
+
+from research_pool import QueueFullError, ResearchWorkerPool
+
+
+def test_pool_limits_concurrency_and_reports_queue_positions():
+    pool = ResearchWorkerPool(workers=2, max_queue=2, initial_duration=60)
+    release = threading.Event()
+    started = []
+    lock = threading.Lock()
+    updates = {}
+
+    def job(name):
+        with lock:
+            started.append(name)
+        release.wait(5)
+
+    def on_queue(name):
+        return lambda position, eta: updates.setdefault(name, []).append((position, eta))
+
+    assert pool.submit("a", job, "a", on_queue=on_queue("a")) == 0
+    assert pool.submit("b", job, "b", on_queue=on_queue("b")) == 0
+    assert pool.submit("c", job, "c", on_queue=on_queue("c")) == 1
+    assert pool.submit("d", job, "d", on_queue=on_queue("d")) == 2
+    with pytest.raises(QueueFullError) as excinfo:
+        pool.submit("e", job, "e")
+    # 平均60秒一个研究、2个工作线程：约30秒空出一个位置
+    assert excinfo.value.retry_after == 30
+
+    assert updates["c"] == [(1, 60)] and updates["d"] == [(2, 60)]
+    assert "a" not in updates and pool.position("d") == 2
+    stats = pool.stats()
+    assert stats['running'] == 2 and stats['queued'] == 2 and stats['rejected'] == 1
+
+    release.set()
+    pool.shutdown()
+    assert sorted(started) == ["a", "b", "c", "d"]
+    # c开始后d前进到第1位
+    assert updates["d"][1][0] == 1
+    stats = pool.stats()
+    assert stats['completed'] == 4 and stats['queued'] == 0 and stats['avg_duration'] < 60
+
+
+def test_failed_job_does_not_stop_worker():
+    pool = ResearchWorkerPool(workers=1, max_queue=5)
+    done = []
+
+    def boom():
+        raise RuntimeError("研究失败")
+
+    pool.submit("bad", boom)
+    pool.submit("good", done.append, "ok")
+    pool.shutdown()
+    assert done == ["ok"]
+    assert pool.stats()['failed'] == 1 and pool.stats()['completed'] == 1
+
+
+def test_web_rejects_with_429_when_queue_full(monkeypatch, web_services):
+    import web_interface
+
+    release = threading.Event()
+    pool = ResearchWorkerPool(workers=1, max_queue=1, initial_duration=30)
+    monkeypatch.setattr(web_interface, "research_pool", pool)
+    # 不真正运行研究：工作线程阻塞到测试结束
+    monkeypatch.setattr(web_interface, "conduct_research_with_progress", lambda *args: release.wait(5))
+
+    client = web_interface.app.test_client()
+    first = client.post("/research", json={'question': "问题一"})
+    second = client.post("/research", json={'question': "问题二"})
+    third = client.post("/research", json={'question': "问题三"})
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert third.status_code == 429
+    assert third.headers['Retry-After'] == "30"
+    assert third.get_json() == {'error': '研究队列已满，请稍后重试', 'retry_after': 30}
+    # 被拒绝的请求不留下会话
+    assert len(web_interface.research_sessions) == 2
+
+    queued = web_interface.research_sessions[second.get_json()['session_id']]
+    [(_, message)] = queued.progress_log.read(0, timeout=0)
+    assert message['step'] == 'queue' and message['position'] == 1 and message['eta'] == 30
+    assert "第 1 位" in message['content']
+
+    metrics = client.get("/metrics/queue").get_json()
+    assert metrics['running'] == 1 and metrics['queued'] == 1 and metrics['rejected'] == 1
+    release.set()
+    pool.shutdown()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+测试研究过程录制与回放：回放不访问LLM和arXiv，报告与录制时完全一致
+使用本地桩LLM和桩arXiv响应，不访问任何外部服务
+"""
+
+import time
+
+import pytest
+
+from deep_research_agentic_by_deepseek import DeepSeekAgenticResearcher
+from deep_researcher import DeepResearcher
+from research_trace import TraceMissError, TraceRecorder, TraceReplayer
+from search_gateway import ArxivSearchGateway
+from search_tool import ArxivSearchTool
+from test_agent_tool_calls import StubAgentLLM
+from test_async_research import StubLLM
+from test_search_gateway import StubResponse
+
+ATOM_ENTRY = """<entry><id>http://arxiv.org/abs/{id}</id><title>{query} paper</title>
+<summary>abstract of {query}</summary><published>2024-01-01T00:00:00Z</published>
+<author><name>Alice</name></author><category term="cs.LG"/></entry>"""
+
+
+def atom_fetcher(calls):
+    def fetcher(url, params, timeout):
+        calls.append(params['search_query'])
+        query = params['search_query'][4:]
+        entries = "".join(ATOM_ENTRY.format(id=f"{query.replace(' ', '-')}-{i}", query=f"{query} {i}")
+                          for i in range(2))
+        return StubResponse(text=f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>')
+    return fetcher
+
+
+def offline_fetcher(url, params, timeout):
+    raise AssertionError("回放时不应访问arXiv")
+
+
+class OfflineLLM:
+    def response(self, prompt):
+        raise AssertionError("回放时不应调用LLM")
+
+
+def make_researcher(fetcher):
+    tool = ArxivSearchTool(gateway=ArxivSearchGateway(min_interval=0, fetcher=fetcher))
+    return DeepResearcher("stub", search_tool=tool)
+
+
+def record_run(path):
+    calls = []
+    researcher = make_researcher(atom_fetcher(calls))
+    researcher.llm = StubLLM(follow_up_rounds=1)
+    recorder = TraceRecorder(str(path))
+    recorder.attach(researcher)
+    report = researcher.research("什么是注意力机制")
+    recorder.save()
+    return report, calls
+
+
+def test_replay_reproduces_report_offline(tmp_path):
+    path = tmp_path / "run.jsonl.gz"
+    report, calls = record_run(path)
+    assert len(calls) == 5
+
+    researcher = make_researcher(offline_fetcher)
+    researcher.llm = OfflineLLM()
+    replayer = TraceReplayer(str(path))
+    replayer.attach(researcher)
+
+    assert researcher.research("什么是注意力机制") == report
+    assert replayer.stats['arxiv'] == 5 and replayer.stats['misses'] == 0
+    assert researcher.llm.total_usage['calls'] == replayer.stats['llm']
+
+
+def test_replay_latency_scaling(tmp_path):
+    path = tmp_path / "run.jsonl"
+    recorder = TraceRecorder(str(path))
+    recorder.record_llm("stub", "你好", "", 0.4, deltas=[[0.2, "你"], [0.4, "好"]])
+    recorder.save()
+
+    llm = TraceReplayer(str(path), latency_scale=0.5).llm("stub")
+    start = time.monotonic()
+    assert list(llm.stream_response("你好")) == ["你", "好"]
+    assert 0.2 <= time.monotonic() - start < 0.35
+
+    fast = TraceReplayer(str(path)).llm("stub")
+    start = time.monotonic()
+    assert fast.response("你好") == "你好"
+    # 同一请求的录制用完后重复最后一条
+    assert fast.response("你好") == "你好"
+    assert time.monotonic() - start < 0.1
+    with pytest.raises(TraceMissError):
+        fast.response("没有录制的提示词")
+
+
+def test_agent_stream_is_recorded_and_replayed(tmp_path):
+    path = tmp_path / "agent.jsonl"
+    calls = []
+    tool = ArxivSearchTool(gateway=ArxivSearchGateway(min_interval=0, fetcher=atom_fetcher(calls)))
+    agent = DeepSeekAgenticResearcher("stub", search_tool=tool)
+    agent.llm = StubAgentLLM()
+    recorder = TraceRecorder(str(path))
+    recorder.attach(agent)
+    report = agent.research("什么是注意力机制")
+    recorder.save()
+
+    tool = ArxivSearchTool(gateway=ArxivSearchGateway(min_interval=0, fetcher=offline_fetcher))
+    replay_agent = DeepSeekAgenticResearcher("stub", search_tool=tool)
+    replay_agent.llm = OfflineLLM()
+    TraceReplayer(str(path)).attach(replay_agent)
+    assert replay_agent.research("什么是注意力机制").split("耗时")[0] == report.split("耗时")[0]
+    assert replay_agent.citation_counter == agent.citation_counter == 6
+
+
+def test_replay_on_another_day_uses_recorded_date(tmp_path, monkeypatch):
+    path = tmp_path / "run.jsonl.gz"
+    report, _ = record_run(path)
+
+    # 提示词包含当前日期：第二天回放时沿用trace头中的录制日期，提示词哈希不变
+    monkeypatch.setattr(time, "strftime", lambda fmt, *args: "2099-12-31, Thursday")
+    researcher = make_researcher(offline_fetcher)
+    researcher.llm = OfflineLLM()
+    replayer = TraceReplayer(str(path))
+    replayer.attach(researcher)
+
+    assert replayer.current_date and replayer.current_date != "2099-12-31, Thursday"
+    assert researcher.research("什么是注意力机制") == report
+    assert replayer.stats['misses'] == 0
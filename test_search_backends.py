@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+测试多后端并发检索：RRF合并、后端截止时间、延迟统计
+使用本地桩后端，不访问真实arXiv
+"""
+
+import time
+
+from citation_registry import CitationRegistry
+from search_backends import (FederatedSearchTool, LocalIndexBackend, build_default_search_tool,
+                             default_backend_stats, normalize_paper_key)
+from search_tool import SearchResult
+
+
+def make_paper(paper_id, title, content="", date_published="", categories=None):
+    return SearchResult(title=title, url=f"http://arxiv.org/abs/{paper_id}", snippet=content,
+                        content=content, paper_id=paper_id, date_published=date_published,
+                        categories=categories)
+
+
+class StubBackend:
+    def __init__(self, name, results, delay=0.0):
+        self.name = name
+        self.results = results
+        self.delay = delay
+
+    def search(self, query, max_results):
+        time.sleep(self.delay)
+        return self.results[:max_results]
+
+
+def test_normalize_paper_key_ignores_version():
+    assert normalize_paper_key(make_paper("2401.00001v2", "A")) == normalize_paper_key(make_paper("2401.00001v1", "B"))
+    untitled = SearchResult(title="Attention Is All You Need!", url="", snippet="")
+    assert normalize_paper_key(untitled) == "title:attentionisallyouneed"
+
+
+def test_rrf_merges_duplicates_across_backends():
+    shared = make_paper("2401.00001v1", "Shared Paper", "short")
+    shared_rich = make_paper("2401.00001v2", "Shared Paper", "a much longer abstract")
+    only_a = make_paper("2401.00002v1", "Only A")
+    only_b = make_paper("2401.00003v1", "Only B")
+
+    tool = FederatedSearchTool([
+        StubBackend("a", [only_a, shared]),
+        StubBackend("b", [shared_rich, only_b]),
+    ])
+    results = tool.search_papers(["query"], max_results=5)
+
+    assert [r.paper_id for r in results][0] == "2401.00001v2"
+    assert results[0].content == "a much longer abstract"
+    assert len(results) == 3
+
+
+def test_slow_backend_does_not_block_round():
+    fast = StubBackend("fast", [make_paper("1", "Fast")])
+    slow = StubBackend("slow", [make_paper("2", "Slow")], delay=1.0)
+    tool = FederatedSearchTool([fast, slow], deadlines={"slow": 0.1})
+
+    start = time.monotonic()
+    results = tool.search_papers(["query"], max_results=5)
+    assert time.monotonic() - start < 0.8
+    assert [r.title for r in results] == ["Fast"]
+
+    stats = tool.backend_stats()
+    assert stats["slow"]["timeouts"] == 1
+    assert stats["fast"]["calls"] == 1 and stats["fast"]["last_latency"] >= 0
+
+
+def test_late_arxiv_backend_stops_using_gateway():
+    import threading
+
+    from search_backends import ArxivBackend
+    from search_gateway import ArxivSearchGateway
+    from search_tool import ArxivSearchTool
+
+    calls = []
+    release = threading.Event()
+
+    def fetcher(url, params, timeout):
+        calls.append(params['search_query'])
+        release.wait(2)
+        return type("Response", (), {'status_code': 200, 'text': "<feed/>", 'headers': {}})()
+
+    gateway = ArxivSearchGateway(min_interval=0, fetcher=fetcher)
+    busy = threading.Thread(target=gateway.fetch, args=("http://stub", {'search_query': "busy"}, "other"))
+    busy.start()
+    time.sleep(0.05)
+
+    fast = StubBackend("fast", [make_paper("1", "Fast")])
+    tool = FederatedSearchTool([fast, ArxivBackend(ArxivSearchTool(gateway=gateway))], deadlines={"arxiv": 0.1})
+    assert [r.title for r in tool.search_papers(["query"], max_results=5)] == ["Fast"]
+    release.set()
+    busy.join(2)
+    time.sleep(0.1)
+
+    # 超过截止时间的arXiv检索从网关队列中撤回，不再发出请求
+    assert calls == ["busy"]
+    assert gateway.stats()['abandoned'] == 1 and gateway.stats()['queued'] == {}
+
+
+def test_local_index_learns_from_merged_results(tmp_path):
+    index = LocalIndexBackend(str(tmp_path / "index.json"))
+    tool = FederatedSearchTool([StubBackend("remote", [make_paper("3", "Graph Neural Networks")]), index])
+    tool.search_papers(["gnn"], max_results=5)
+    index.save()
+
+    reloaded = LocalIndexBackend(str(tmp_path / "index.json"))
+    assert [r.title for r in reloaded.search("graph networks", 5)] == ["Graph Neural Networks"]
+
+
+def test_local_index_returns_copies():
+    index = LocalIndexBackend()
+    tool = FederatedSearchTool([StubBackend("remote", [make_paper("4", "Mixture of Experts")]), index])
+    registry = CitationRegistry()
+    registry.register_all(tool.search_papers(["mixture of experts"], max_results=5))
+    # 同一篇论文第二次出现（来自本地索引）分配新编号，不改写第一次的结果
+    offline = FederatedSearchTool([index])
+    registry.register_all(offline.search_papers(["mixture of experts"], max_results=5))
+    registry.register_all(offline.search_papers(["experts"], max_results=5))
+
+    assert registry.get("citation:1").citation == "citation:1"
+    assert registry.get("citation:2").citation == "citation:2"
+    assert registry.get("citation:3").citation == "citation:3"
+    assert not hasattr(index.search("experts", 5)[0], "citation")
+
+
+class FilteringBackend(StubBackend):
+    def search(self, query, max_results, date_from=None, categories=None):
+        self.filters = (date_from, categories)
+        return super().search(query, max_results)
+
+
+def test_filters_are_passed_to_backends():
+    remote = FilteringBackend("remote", [make_paper("5", "Old Graph Paper", date_published="2019-01-01",
+                                                    categories=["cs.LG"])])
+    index = LocalIndexBackend()
+    index.add([make_paper("6", "New Graph Paper", date_published="2024-05-01", categories=["cs.CL"]),
+               make_paper("7", "Graph Survey", date_published="2024-06-01", categories=["cs.LG"])])
+    tool = FederatedSearchTool([remote, index])
+
+    results = tool.search_papers(["graph"], max_results=5, date_from="2024-01-01", categories=["cs.LG"])
+    assert remote.filters == ("2024-01-01", ["cs.LG"])
+    # 本地索引按日期和类别过滤；远端结果由远端自己负责
+    assert sorted(r.title for r in results) == ["Graph Survey", "Old Graph Paper"]
+
+
+def test_default_tool_shares_index_and_saves_it(tmp_path):
+    path = str(tmp_path / "shared_index.json")
+    first = build_default_search_tool(index_path=path, session_id="s1")
+    second = build_default_search_tool(index_path=path, session_id="s2")
+    assert first.index is second.index and first is not second
+    assert first.backends[0].tool.session_id == "s1" and second.backends[0].tool.session_id == "s2"
+
+    # 有新论文时按save_interval自动保存
+    first.index.save_interval = 0
+    first.backends[0] = StubBackend("arxiv", [make_paper("8", "Diffusion Models")])
+    first.search_papers(["diffusion"], max_results=5)
+    assert [r.title for r in LocalIndexBackend(path).search("diffusion", 5)] == ["Diffusion Models"]
+    assert default_backend_stats()["arxiv"]["calls"] >= 1
+
+
+def test_web_search_metrics(web_services):
+    import web_interface
+
+    metrics = web_interface.app.test_client().get("/metrics/search").get_json()
+    assert set(metrics) == {'gateway', 'backends'} and 'requests' in metrics['gateway']
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+测试进程级arXiv网关：请求合并、Retry-After退避、会话公平排队
+使用本地桩响应，不访问真实arXiv
+"""
+
+import threading
+import time
+
+from search_gateway import ArxivSearchGateway, SearchGatewayError
+
+
+class StubResponse:
+    def __init__(self, status_code=200, text="<feed/>", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+def test_coalesce_identical_queries():
+    """不同会话的相同在途查询只发出一次请求"""
+    calls = []
+    release = threading.Event()
+
+    def fetcher(url, params, timeout):
+        calls.append(params['search_query'])
+        release.wait(2)
+        return StubResponse(text="shared")
+
+    gateway = ArxivSearchGateway(min_interval=0, fetcher=fetcher)
+    results = []
+
+    def worker(session_id):
+        results.append(gateway.fetch("http://stub", {'search_query': 'all:transformer'}, session_id))
+
+    threads = [threading.Thread(target=worker, args=(f"s{i}",)) for i in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    release.set()
+    for t in threads:
+        t.join(2)
+
+    assert results == ["shared"] * 5
+    assert len(calls) == 1
+    assert gateway.stats()['coalesced'] == 4
+
+
+def test_retry_after_is_honored():
+    """429响应按Retry-After等待后重试"""
+    responses = [StubResponse(429, headers={'Retry-After': '0.3'}), StubResponse(200, text="ok")]
+
+    def fetcher(url, params, timeout):
+        return responses.pop(0)
+
+    gateway = ArxivSearchGateway(min_interval=0, fetcher=fetcher)
+    start = time.monotonic()
+    assert gateway.fetch("http://stub", {'q': 1}) == "ok"
+    assert time.monotonic() - start >= 0.3
+    stats = gateway.stats()
+    assert stats['throttled'] == 1 and stats['retries'] == 1
+
+
+def test_retries_exhausted_raise():
+    gateway = ArxivSearchGateway(min_interval=0, max_retries=1, backoff_base=0.01,
+                                 fetcher=lambda url, params, timeout: StubResponse(503))
+    try:
+        gateway.fetch("http://stub", {'q': 1})
+        assert False, "应当抛出SearchGatewayError"
+    except SearchGatewayError as e:
+        assert e.status_code == 503
+
+
+def test_fair_round_robin_between_sessions():
+    """一个会话排了很多查询时，另一个会话的请求不会被排到最后"""
+    order = []
+    gate = threading.Event()
+
+    def fetcher(url, params, timeout):
+        gate.wait(2)
+        order.append(params['q'])
+        return StubResponse(text=params['q'])
+
+    gateway = ArxivSearchGateway(min_interval=0, fetcher=fetcher)
+    threads = []
+    for i in range(4):
+        threads.append(threading.Thread(target=gateway.fetch, args=("http://stub", {'q': f"a{i}"}, "A")))
+    threads.append(threading.Thread(target=gateway.fetch, args=("http://stub", {'q': "b0"}, "B")))
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    gate.set()
+    for t in threads:
+        t.join(2)
+
+    # a0已在处理中，剩余请求中B应在A的第二个请求后立即被调度
+    assert order.index("b0") <= 2
+
+
+def test_deadline_abandons_queued_request():
+    """调用方超过截止时间后，仍在排队的请求出队，不再发出HTTP请求"""
+    calls = []
+    release = threading.Event()
+
+    def fetcher(url, params, timeout):
+        calls.append(params['q'])
+        release.wait(2)
+        return StubResponse(text=params['q'])
+
+    gateway = ArxivSearchGateway(min_interval=0, fetcher=fetcher)
+    busy = threading.Thread(target=gateway.fetch, args=("http://stub", {'q': "busy"}, "A"))
+    busy.start()
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    try:
+        gateway.fetch("http://stub", {'q': "late"}, "B", deadline=time.monotonic() + 0.1)
+        assert False, "应当抛出SearchGatewayError"
+    except SearchGatewayError:
+        pass
+    assert time.monotonic() - start < 0.5
+    release.set()
+    busy.join(2)
+    time.sleep(0.05)
+
+    assert calls == ["busy"]
+    stats = gateway.stats()
+    assert stats['abandoned'] == 1 and stats['inflight'] == 0 and stats['queued'] == {}
+
+
+def test_deadline_stops_retries_of_abandoned_request():
+    """退避期间调用方已放弃的请求不再重试"""
+    calls = []
+
+    def fetcher(url, params, timeout):
+        calls.append(params['q'])
+        return StubResponse(503)
+
+    gateway = ArxivSearchGateway(min_interval=0, max_retries=3, backoff_base=0.4, fetcher=fetcher)
+    try:
+        gateway.fetch("http://stub", {'q': 1}, deadline=time.monotonic() + 0.1)
+        assert False, "应当抛出SearchGatewayError"
+    except SearchGatewayError:
+        pass
+    time.sleep(1.2)  # 第一次退避为1秒
+
+    assert len(calls) == 1
+    stats = gateway.stats()
+    assert stats['retries'] == 1 and stats['http_calls'] == 1 and stats['errors'] == 0
+    assert stats['inflight'] == 0
+
+
+if __name__ == "__main__":
+    test_coalesce_identical_queries()
+    test_retry_after_is_honored()
+    test_retries_exhausted_raise()
+    test_fair_round_robin_between_sessions()
+    test_deadline_abandons_queued_request()
+    test_deadline_stops_retries_of_abandoned_request()
+    print("✅ 网关测试通过")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+测试Web研究会话管理：数量上限、空闲TTL淘汰、落盘后 /result 仍可访问、指标
+使用本地桩LLM和桩arXiv检索，不访问任何外部服务
+"""
+
+import os
+import subprocess
+import sys
+
+from session_manager import SessionManager
+from test_async_research import make_researcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSession:
+    def __init__(self, result=None, is_running=False):
+        self.result = result
+        self.report = None
+        self.is_running = is_running
+
+
+def test_capacity_evicts_least_recently_used_finished_sessions(tmp_path):
+    sessions = SessionManager(max_sessions=2, spill_dir=str(tmp_path))
+    sessions["running"] = FakeSession(is_running=True)
+    sessions["a"] = FakeSession(result="报告A")
+    sessions["b"] = FakeSession(result="报告B")
+    assert "a" not in sessions and "running" in sessions
+
+    sessions.get("b")
+    sessions["c"] = FakeSession(result="报告C")
+    # 进行中的会话从不淘汰，会话数可以暂时超过上限
+    assert "b" not in sessions and len(sessions) == 2
+    assert sessions.load_spilled("a")['result'] == "报告A"
+    assert sessions.stats()['evicted'] == 2 and sessions.stats()['spilled_files'] == 2
+    assert sessions.load_spilled("../etc/passwd") is None
+
+
+def test_idle_sessions_are_reaped(tmp_path):
+    clock = FakeClock()
+    sessions = SessionManager(idle_ttl=60, spill_dir=str(tmp_path), clock=clock)
+    sessions["old"] = FakeSession(result="旧报告")
+    sessions["busy"] = FakeSession(is_running=True)
+    clock.now = 30
+    sessions["new"] = FakeSession(result="新报告")
+    sessions.get("old")
+
+    clock.now = 80
+    assert sessions.reap() == 0
+    clock.now = 200
+    assert sessions.reap() == 2
+    assert "busy" in sessions and len(sessions) == 1
+    assert sessions.stats()['reaped'] == 2
+
+
+def test_web_result_survives_eviction(tmp_path, monkeypatch, web_services):
+    import web_interface
+
+    sessions = SessionManager(max_sessions=1, spill_dir=str(tmp_path))
+    monkeypatch.setattr(web_interface, "research_sessions", sessions)
+    session = web_interface.ResearchSession("sess-evict")
+    session.researcher = make_researcher(follow_up_rounds=0)
+    sessions["sess-evict"] = session
+    web_interface.conduct_research_with_progress("sess-evict", "什么是注意力机制")
+    result = session.result
+
+    sessions["sess-other"] = web_interface.ResearchSession("sess-other")
+    assert "sess-evict" not in sessions
+
+    client = web_interface.app.test_client()
+    assert client.get("/result/sess-evict").get_json() == {'is_running': False, 'result': result}
+    report = client.get("/result/sess-evict?format=json").get_json()['report']
+    assert report['sections'][0]['title'] == "学术研究报告"
+    assert len(client.get("/citations/sess-evict").get_json()['citations']) == 6
+    assert client.get("/result/missing").status_code == 404
+
+    metrics = client.get("/metrics/sessions").get_json()
+    assert metrics['sessions'] == 1 and metrics['spilled'] == 1 and metrics['process_rss_mb'] > 0
+
+
+def test_importing_web_interface_has_no_side_effects(tmp_path):
+    # 导入时不启动清理线程、不创建会话/检查点目录、不打开报告数据库
+    code = ("import threading, web_interface; "
+            "assert web_interface.research_sessions is None and web_interface.report_store is None; "
+            "assert threading.active_count() == 1")
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], cwd=str(tmp_path), env=env, check=True)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,93 @@
+"""
+DeepSeek工具调用的增量解析器
+
+消费流式输出的文本片段，识别
+    <|tool▁calls▁begin|><|tool▁call▁begin|>name<|tool▁sep|>args<|tool▁call▁end|>...<|tool▁calls▁end|>
+每当一个工具调用的结束标记到达就立即返回该调用，调用方可以在模型继续生成的同时开始执行。
+标记可能被切分在相邻的两个片段中，解析器只在标记完整出现后才推进。
+"""
+
+from dataclasses import dataclass
+from typing import List
+
+TOOL_CALLS_BEGIN = "<|tool▁calls▁begin|>"
+TOOL_CALLS_END = "<|tool▁calls▁end|>"
+TOOL_CALL_BEGIN = "<|tool▁call▁begin|>"
+TOOL_CALL_END = "<|tool▁call▁end|>"
+TOOL_SEP = "<|tool▁sep|>"
+
+
+@dataclass
+class ToolCall:
+    name: str
+    arguments: str
+    index: int  # 在整段响应中的序号
+
+
+class ToolCallStreamParser:
+    def __init__(self):
+        self._parts: List[str] = []
+        self._buffer = ""  # 尚未消费的文本（从当前扫描位置开始）
+        self._state = "text"  # text | calls | call
+        self.calls: List[ToolCall] = []
+        self.blocks_closed = 0  # 完整出现的 tool_calls 块数
+
+    @property
+    def text(self) -> str:
+        """目前收到的完整文本"""
+        return "".join(self._parts)
+
+    @property
+    def has_tool_calls(self) -> bool:
+        return self.blocks_closed > 0
+
+    def feed(self, delta: str) -> List[ToolCall]:
+        """输入一个文本片段，返回本次新完成的工具调用"""
+        self._parts.append(delta)
+        self._buffer += delta
+        completed = []
+        while True:
+            if self._state == "text":
+                if not self._consume_until(TOOL_CALLS_BEGIN):
+                    break
+                self._state = "calls"
+            elif self._state == "calls":
+                begin = self._buffer.find(TOOL_CALL_BEGIN)
+                end = self._buffer.find(TOOL_CALLS_END)
+                if end != -1 and (begin == -1 or end < begin):
+                    self._buffer = self._buffer[end + len(TOOL_CALLS_END):]
+                    self.blocks_closed += 1
+                    self._state = "text"
+                elif begin != -1:
+                    self._buffer = self._buffer[begin + len(TOOL_CALL_BEGIN):]
+                    self._state = "call"
+                else:
+                    break
+            else:
+                end = self._buffer.find(TOOL_CALL_END)
+                if end == -1:
+                    break
+                body = self._buffer[:end]
+                self._buffer = self._buffer[end + len(TOOL_CALL_END):]
+                self._state = "calls"
+                name, _, arguments = body.partition(TOOL_SEP)
+                call = ToolCall(name.strip(), arguments.strip(), len(self.calls))
+                self.calls.append(call)
+                completed.append(call)
+        return completed
+
+    def _consume_until(self, marker: str) -> bool:
+        """跳过marker之前的普通文本；marker未完整出现时保留可能是其前缀的尾部"""
+        pos = self._buffer.find(marker)
+        if pos == -1:
+            self._buffer = self._buffer[-(len(marker) - 1):]
+            return False
+        self._buffer = self._buffer[pos + len(marker):]
+        return True
+
+
+def parse_tool_calls(text: str) -> List[ToolCall]:
+    """解析一段完整响应中的全部工具调用"""
+    parser = ToolCallStreamParser()
+    parser.feed(text)
+    return parser.calls
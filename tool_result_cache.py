@@ -0,0 +1,98 @@
+"""
+Agent工具结果缓存 - 单次Agent研究（一次多轮对话）内的查询结果复用
+
+Agent经常在后续轮次重复发出已执行过的查询（或只是大小写、词序、单复数不同的查询）。
+检索工具会跳过已搜索过的查询并返回空列表，模型看到"未找到相关论文"后往往继续重试。
+缓存按规范化的词集合记录每个查询已分配citation的结果，重复或近似重复的查询不再检索，
+直接返回对前文结果的紧凑引用，并统计避免的调用次数。
+"""
+
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from search_tool import SearchResult
+
+_TOKEN = re.compile(r"[0-9a-z]+|[\u4e00-\u9fff]+")
+
+
+def query_terms(query: str) -> FrozenSet[str]:
+    """规范化查询为词集合：全半角统一、小写、去标点，英文词去掉复数s"""
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    terms = set()
+    for token in _TOKEN.findall(text):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.add(token)
+    return frozenset(terms)
+
+
+class ToolResultCache:
+    def __init__(self, similarity: float = 0.8):
+        """similarity: 两个查询词集合的Jaccard相似度达到该值视为近似重复"""
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries: Dict[FrozenSet[str], Dict[str, Any]] = {}
+        self.hits = 0  # 规范化后完全相同
+        self.near_hits = 0  # 近似重复
+        self.misses = 0
+
+    def _find(self, query: str) -> Optional[Dict[str, Any]]:
+        terms = query_terms(query)
+        if not terms:
+            return None
+        entry = self._entries.get(terms)
+        if entry is not None:
+            return entry
+        best, best_score = None, 0.0
+        for key, candidate in self._entries.items():
+            score = len(terms & key) / len(terms | key)
+            if score > best_score:
+                best, best_score = candidate, score
+        return best if best_score >= self.similarity else None
+
+    def peek(self, query: str) -> Optional[Dict[str, Any]]:
+        """查找但不计入统计（用于流式提前检索时判断是否需要检索）"""
+        with self._lock:
+            return self._find(query)
+
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """命中时返回 {'query': 原查询, 'results': 已分配citation的结果, 'exact': bool}"""
+        with self._lock:
+            entry = self._find(query)
+            if entry is None:
+                self.misses += 1
+                return None
+            exact = entry['terms'] == query_terms(query)
+            if exact:
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            return {'query': entry['query'], 'results': entry['results'], 'exact': exact}
+
+    def store(self, query: str, results: List[SearchResult]):
+        terms = query_terms(query)
+        if not terms:
+            return
+        with self._lock:
+            self._entries.setdefault(terms, {'query': query, 'terms': terms, 'results': list(results)})
+
+    @property
+    def avoided(self) -> int:
+        return self.hits + self.near_hits
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'avoided': self.hits + self.near_hits,
+            }
+
+    def release(self):
+        """研究结束：释放缓存的论文对象，只保留计数"""
+        with self._lock:
+            self._entries = {}
@@ -6,105 +6,233 @@ Deep Researcher Web界面
 
 from flask import Flask, render_template, request, jsonify, Response
 from deep_researcher import DeepResearcher
+from research_checkpoint import CheckpointStore
+from report_store import ReportStore
+from session_manager import SessionManager
+from research_pool import QueueFullError, ResearchWorkerPool
+from progress_log import ProgressLog
+from search_backends import default_backend_stats
+from search_gateway import get_search_gateway
+import research_events as events
 import json
-import time
+import os
 import threading
-from queue import Queue
+import time
 import uuid
 
 app = Flask(__name__)
 
-# 存储研究会话
-research_sessions = {}
+# 服务级资源（会话管理、任务池、检查点、报告存储）由 init_services() 创建：
+# 在 __main__、create_app() 或第一次请求时创建，导入本模块不启动线程、不在工作目录创建文件
+# 会话管理：数量上限 + 空闲TTL淘汰，已完成的结果淘汰时落盘，/result 仍可访问
+research_sessions = None
+# 研究任务池：固定数量的工作线程 + 有界排队，突发请求排队而不是同时争抢LLM网关，队列满时返回429
+research_pool = None
+# 研究检查点：服务重启后可通过 /resume/<session_id> 从最后完成的阶段继续
+checkpoint_store = None
+# 报告存储：新鲜期内的重复问题直接返回历史报告，/reports/search 检索历史报告
+report_store = None
+
+# SSE连接空闲多少秒发送一次心跳（有事件时不发）
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+# 流式报告片段合并后再写入进度日志：攒够这么多字符或距上次写入超过这么多秒时写入一条
+REPORT_DELTA_FLUSH_CHARS = int(os.getenv('REPORT_DELTA_FLUSH_CHARS', '400'))
+REPORT_DELTA_FLUSH_SECONDS = float(os.getenv('REPORT_DELTA_FLUSH_SECONDS', '0.25'))
+
+def init_services(spill_dir=None, checkpoint_dir=None, report_store_path=None, start_reaper=True):
+    """创建尚未创建的服务级资源（重复调用无副作用）；未指定的路径取环境变量或默认值"""
+    global research_sessions, research_pool, checkpoint_store, report_store
+    if research_sessions is None:
+        research_sessions = SessionManager(
+            max_sessions=int(os.getenv('SESSION_MAX', '200')),
+            idle_ttl=float(os.getenv('SESSION_IDLE_MINUTES', '60')) * 60,
+            spill_dir=spill_dir or os.getenv('SESSION_SPILL_DIR', '.research_sessions'),
+        )
+        if start_reaper:
+            research_sessions.start_reaper(interval=float(os.getenv('SESSION_REAP_SECONDS', '60')))
+    if research_pool is None:
+        research_pool = ResearchWorkerPool(
+            workers=int(os.getenv('RESEARCH_WORKERS', '4')),
+            max_queue=int(os.getenv('RESEARCH_QUEUE', '20')),
+        )
+    if checkpoint_store is None:
+        checkpoint_store = CheckpointStore(
+            checkpoint_dir or os.getenv('CHECKPOINT_DIR', '.research_checkpoints'),
+            done_ttl=float(os.getenv('CHECKPOINT_DONE_HOURS', '24')) * 3600,
+        )
+    if report_store is None:
+        report_store = ReportStore(
+            report_store_path or os.getenv('REPORT_STORE_PATH', 'research_reports.db'),
+            freshness_seconds=float(os.getenv('REPORT_FRESHNESS_HOURS', '168')) * 3600,
+        )
+
+def create_app(**kwargs):
+    """应用工厂：创建服务级资源并返回Flask应用（供 gunicorn 'web_interface:create_app()' 等使用）"""
+    init_services(**kwargs)
+    return app
+
+@app.before_request
+def _ensure_services():
+    # 直接以 web_interface:app 启动时，在第一次请求时创建服务级资源
+    init_services()
 
 class ResearchSession:
     def __init__(self, session_id):
         self.session_id = session_id
-        self.researcher = DeepResearcher("deepseek-v3")
+        # 共享进程级arXiv网关，按会话公平排队
+        self.researcher = DeepResearcher("deepseek-v3", session_id=session_id,
+                                         checkpoint_store=checkpoint_store, report_store=report_store)
         self.researcher.max_rounds = 5
-        self.progress_queue = Queue()
+        self.progress_log = ProgressLog()  # 只追加的进度事件日志，SSE按序号读取
         self.is_running = False
         self.result = None
+        self.report = None  # 结构化报告（ResearchReport）
+        # 尚未写入进度日志的报告片段：逐token写入会让日志里的片段远多于进度事件，重放时淹没进度
+        self._delta_lock = threading.Lock()
+        self._pending_delta = []
+        self._pending_delta_reset = False
+        self._pending_delta_since = 0.0
         
     def add_progress(self, step, content, progress=None):
         """添加进度信息"""
-        self.progress_queue.put({
+        self.flush_report_delta()
+        self.progress_log.append({
             'step': step,
             'content': content,
             'progress': progress,
             'timestamp': time.strftime("%H:%M:%S")
         })
+    
+    def add_queue_position(self, position, eta):
+        """排队进度：当前排在第几位、预计多少秒后开始"""
+        self.flush_report_delta()
+        self.progress_log.append({
+            'step': 'queue',
+            'content': f'⏳ 排队中，第 {position} 位，预计 {eta} 秒后开始',
+            'position': position,
+            'eta': eta,
+            'progress': 0,
+            'timestamp': time.strftime("%H:%M:%S")
+        })
+    
+    def add_report_delta(self, text, reset=False):
+        """
+        添加流式生成的报告片段（前端按顺序拼接，reset时清空已收到的内容）
+        
+        片段先合并，攒够 REPORT_DELTA_FLUSH_CHARS 个字符或超过 REPORT_DELTA_FLUSH_SECONDS 秒时
+        作为一条事件写入；写入其他进度事件前先写入已攒的片段，保证顺序不变
+        """
+        with self._delta_lock:
+            if reset:
+                # 重新生成：之前攒下的片段作废，合并后的片段带上reset
+                self._pending_delta = []
+                self._pending_delta_reset = True
+            if not self._pending_delta:
+                self._pending_delta_since = time.monotonic()
+            self._pending_delta.append(text)
+            if (sum(len(part) for part in self._pending_delta) < REPORT_DELTA_FLUSH_CHARS
+                    and time.monotonic() - self._pending_delta_since < REPORT_DELTA_FLUSH_SECONDS):
+                return
+            self._flush_pending_delta()
+    
+    def flush_report_delta(self):
+        """把已攒的报告片段写入进度日志"""
+        with self._delta_lock:
+            self._flush_pending_delta()
+    
+    def _flush_pending_delta(self):
+        if not self._pending_delta and not self._pending_delta_reset:
+            return
+        self.progress_log.append({'step': 'report_delta', 'content': ''.join(self._pending_delta),
+                                  'reset': self._pending_delta_reset})
+        self._pending_delta = []
+        self._pending_delta_reset = False
 
-def conduct_research_with_progress(session_id, question):
-    """带进度反馈的研究函数"""
+class ProgressReporter:
+    """把研究引擎发布的结构化事件转换为前端的进度步骤"""
+    
+    def __init__(self, session, max_rounds):
+        self.session = session
+        # 搜索进度 - 确保每轮搜索占用合理的进度区间
+        total_rounds = min(max_rounds, 3)  # 预估最多3轮
+        self.progress_per_round = 50 / total_rounds  # 50%的进度用于搜索
+        self.round = 1
+        self.round_count = 0
+        self.round_titles = []
+    
+    def _progress(self, fraction):
+        progress_base = 30 + (self.round - 1) * self.progress_per_round
+        return min(85, int(progress_base + self.progress_per_round * fraction))
+    
+    def __call__(self, event):
+        data = event.data
+        add = self.session.add_progress
+        
+        if event.type == events.REPORT_DELTA:
+            self.session.add_report_delta(data['text'], data.get('reset', False))
+        elif event.type == events.RESEARCH_START:
+            add('start', f'🔬 开始研究问题: {data["question"]}', 5)
+        elif event.type == events.STAGE_START:
+            stage = data['stage']
+            if stage == 'initial_thinking':
+                add('thinking', '🧠 正在进行初步思考和分析...', 10)
+            elif stage == 'query_generation':
+                add('query_gen', '🔍 正在生成搜索查询...', 25)
+            elif stage == 'search':
+                self.round = data['round']
+                self.round_count = 0
+                self.round_titles = []
+            elif stage == 'analysis':
+                add('analysis', f'📊 正在分析第{data["round"]}轮搜索结果...', self._progress(0.5))
+            elif stage == 'final_report':
+                add('final_gen', '📝 正在生成最终研究报告...', 85)
+        elif event.type == events.THINKING:
+            add('thinking_result', f'📋 初步分析完成:\n{data["analysis"][:300]}...', 20)
+        elif event.type == events.QUERIES:
+            if data.get('branch'):
+                add('search_queries', f'🌿 分支搜索: {", ".join(data["queries"])}', self._progress(0.1))
+                return
+            if data['round'] == 1:
+                add('queries', f'📝 生成搜索查询: {", ".join(data["queries"])}', 30)
+            self.round = data['round']
+            add('search_start', f'🔍 第{self.round}轮搜索开始', self._progress(0))
+            add('search_queries', f'搜索查询: {", ".join(data["queries"])}', self._progress(0.1))
+        elif event.type == events.QUERY_RESULT:
+            self.round_count += data['count']
+            self.round_titles.extend(data['titles'])
+        elif event.type == events.STAGE_END and data['stage'] == 'search':
+            add('search_results', f'📄 找到 {self.round_count} 篇论文', self._progress(0.3))
+            if self.round_titles:
+                titles = [t[:50] + "..." if len(t) > 50 else t for t in self.round_titles[:3]]
+                add('paper_titles', '关键论文:\n• ' + '\n• '.join(titles), self._progress(0.4))
+        elif event.type == events.ANALYSIS:
+            add('analysis_result', f'✅ 第{data["round"]}轮分析完成', self._progress(0.7))
+            next_queries = data.get('next_queries')
+            if data.get('stop_reason'):
+                add('search_complete', f'⏹️ 提前停止搜索：{data["stop_reason"]}', self._progress(0.9))
+            elif next_queries:
+                add('continue', f'🔮 发现需要进一步研究: {", ".join(next_queries[:2])}...', self._progress(0.8))
+            else:
+                add('search_complete', '✅ 搜索完成，信息已足够全面', self._progress(0.9))
+        elif event.type == events.ERROR:
+            add('search_error', f'⚠️ 研究阶段 {data["stage"]} 出现问题: {data["error"]}', self._progress(0.5))
+
+
+def conduct_research_with_progress(session_id, question, resume=False):
+    """带进度反馈的研究函数：订阅研究引擎的事件流，直接运行真实的研究流程"""
     session = research_sessions[session_id]
     session.is_running = True
+    researcher = session.researcher
+    unsubscribe = researcher.events.subscribe(ProgressReporter(session, researcher.max_rounds))
     
     try:
-        session.add_progress('start', f'🔬 开始研究问题: {question}', 5)
-        
-        # 初步思考
-        session.add_progress('thinking', '🧠 正在进行初步思考和分析...', 10)
-        initial_analysis = session.researcher._initial_thinking(question, time.strftime("%Y-%m-%d, %A"))
-        session.add_progress('thinking_result', f'📋 初步分析完成:\n{initial_analysis[:300]}...', 20)
-        
-        # 生成查询
-        session.add_progress('query_gen', '🔍 正在生成搜索查询...', 25)
-        first_queries = session.researcher._extract_first_search_queries(question, initial_analysis)
-        session.add_progress('queries', f'📝 生成搜索查询: {", ".join(first_queries)}', 30)
-        
-        all_search_results = []
-        search_round = 1
-        current_queries = first_queries
-        
-        while current_queries and search_round <= session.researcher.max_rounds:
-            # 搜索进度 - 确保每轮搜索占用合理的进度区间
-            total_rounds = min(session.researcher.max_rounds, 3)  # 预估最多3轮
-            progress_per_round = 50 / total_rounds  # 50%的进度用于搜索
-            progress_base = 30 + (search_round - 1) * progress_per_round
-            
-            session.add_progress('search_start', f'🔍 第{search_round}轮搜索开始', int(progress_base))
-            session.add_progress('search_queries', f'搜索查询: {", ".join(current_queries)}', int(progress_base + progress_per_round * 0.1))
-            
-            # 执行搜索
-            try:
-                round_results = session.researcher._conduct_search_round(current_queries)
-                all_search_results.extend(round_results)
-                
-                session.add_progress('search_results', f'📄 找到 {len(round_results)} 篇论文', int(progress_base + progress_per_round * 0.3))
-                
-                # 显示部分论文标题
-                if round_results:
-                    titles = [r.title[:50] + "..." if len(r.title) > 50 else r.title for r in round_results[:3]]
-                    session.add_progress('paper_titles', f'关键论文:\n• ' + '\n• '.join(titles), int(progress_base + progress_per_round * 0.4))
-                
-                # 分析结果
-                session.add_progress('analysis', f'📊 正在分析第{search_round}轮搜索结果...', int(progress_base + progress_per_round * 0.5))
-                analysis_and_queries = session.researcher._analyze_results_and_generate_queries(
-                    question, round_results, search_round
-                )
-                
-                session.add_progress('analysis_result', f'✅ 第{search_round}轮分析完成', int(progress_base + progress_per_round * 0.7))
-                
-                # 检查是否继续
-                next_queries = analysis_and_queries.get('next_queries')
-                if next_queries:
-                    session.add_progress('continue', f'🔮 发现需要进一步研究: {", ".join(next_queries[:2])}...', int(progress_base + progress_per_round * 0.8))
-                    current_queries = next_queries
-                    search_round += 1
-                else:
-                    session.add_progress('search_complete', '✅ 搜索完成，信息已足够全面', int(progress_base + progress_per_round * 0.9))
-                    break
-                    
-            except Exception as e:
-                session.add_progress('search_error', f'⚠️ 第{search_round}轮搜索出现问题: {str(e)}', int(progress_base + progress_per_round * 0.5))
-                break
-        
-        # 生成最终答案
-        session.add_progress('final_gen', '📝 正在生成最终研究报告...', 85)
-        final_answer = session.researcher._generate_final_answer(question, all_search_results, search_round)
+        if resume:
+            final_answer = researcher.resume(session_id)
+        else:
+            final_answer = researcher.research(question, session_id=session_id)
         
         session.add_progress('complete', '🎉 研究完成！', 100)
+        session.report = researcher.last_report
         session.result = final_answer
         
     except Exception as e:
@@ -112,7 +240,24 @@ def conduct_research_with_progress(session_id, question):
         session.result = f"研究失败: {str(e)}"
     
     finally:
+        unsubscribe()
+        session.flush_report_delta()
         session.is_running = False
+        session.progress_log.close()
+
+def submit_research(session, question, resume=False):
+    """提交研究到任务池；队列已满时移除会话并返回429响应，成功时返回None"""
+    try:
+        research_pool.submit(session.session_id, conduct_research_with_progress,
+                             session.session_id, question, resume,
+                             on_queue=session.add_queue_position)
+    except QueueFullError as e:
+        del research_sessions[session.session_id]
+        response = jsonify({'error': '研究队列已满，请稍后重试', 'retry_after': e.retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    return None
 
 @app.route('/')
 def index():
@@ -131,54 +276,97 @@ def start_research():
     # 创建新的研究会话
     session_id = str(uuid.uuid4())
     session = ResearchSession(session_id)
+    session.is_running = True  # 加入会话表前标记为进行中，避免开始前被淘汰
     research_sessions[session_id] = session
     
-    # 在后台线程中开始研究
-    research_thread = threading.Thread(
-        target=conduct_research_with_progress,
-        args=(session_id, question)
-    )
-    research_thread.daemon = True
-    research_thread.start()
+    # 交给研究任务池，工作线程都忙时排队
+    rejected = submit_research(session, question)
+    if rejected is not None:
+        return rejected
     
     return jsonify({'session_id': session_id})
 
+@app.route('/resume/<session_id>', methods=['POST'])
+def resume_research(session_id):
+    """从检查点恢复中断的研究（例如服务重启后）"""
+    if session_id in research_sessions and research_sessions[session_id].is_running:
+        return jsonify({'error': '研究正在进行中'}), 409
+    
+    state = checkpoint_store.load(session_id)
+    if state is None:
+        return jsonify({'error': '检查点不存在'}), 404
+    
+    session = ResearchSession(session_id)
+    session.is_running = True  # 加入会话表前标记为进行中，避免开始前被淘汰
+    research_sessions[session_id] = session
+    
+    rejected = submit_research(session, state['question'], resume=True)
+    if rejected is not None:
+        return rejected
+    
+    return jsonify({'session_id': session_id, 'stage': state['stage']})
+
+def parse_last_event_id(value):
+    """解析 Last-Event-ID，无效时从头推送"""
+    try:
+        return max(0, int(value or 0))
+    except ValueError:
+        return 0
+
+def sse_message(data, event_id=None):
+    """格式化一条SSE消息；只有进度日志中的事件带序号"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+SSE_RETRY = "retry: 3000\n\n"
+SSE_HEARTBEAT = sse_message({'step': 'heartbeat'})
+
+def final_messages(session):
+    """研究结束后推送的最终结果和结束标记"""
+    messages = []
+    if session.result:
+        messages.append(sse_message({'step': 'result', 'content': session.result, 'progress': 100}))
+    messages.append(sse_message({'step': 'done'}))
+    return messages
+
 @app.route('/progress/<session_id>')
 def get_progress(session_id):
-    """获取研究进度（SSE流）"""
+    """获取研究进度（SSE流）；重连时按 Last-Event-ID 从断点之后继续推送"""
+    cursor = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    
     def generate_progress():
-        if session_id not in research_sessions:
-            yield f"data: {json.dumps({'error': '会话不存在'})}\n\n"
+        nonlocal cursor
+        session = research_sessions.get(session_id)
+        if session is None:
+            yield sse_message({'error': '会话不存在'})
             return
         
-        session = research_sessions[session_id]
-        
         try:
-            while session.is_running or not session.progress_queue.empty():
-                try:
-                    if not session.progress_queue.empty():
-                        progress_data = session.progress_queue.get_nowait()
-                        yield f"data: {json.dumps(progress_data, ensure_ascii=False)}\n\n"
-                    else:
-                        time.sleep(0.5)  # 短暂等待
-                        # 发送心跳保持连接
-                        yield f"data: {json.dumps({'step': 'heartbeat'})}\n\n"
-                except Exception as e:
-                    print(f"Progress queue error: {e}")
+            yield SSE_RETRY
+            log = session.progress_log
+            while True:
+                finished = log.closed or not session.is_running
+                # 阻塞等待新事件，空闲满一个心跳间隔才发送心跳
+                entries = log.read(cursor, timeout=0 if finished else SSE_HEARTBEAT_SECONDS)
+                for seq, progress_data in entries:
+                    yield sse_message(progress_data, seq)
+                    cursor = seq
+                if entries:
+                    continue
+                if finished:
                     break
+                if not log.closed:
+                    yield SSE_HEARTBEAT
             
             # 发送最终结果
-            if session.result:
-                yield f"data: {json.dumps({'step': 'result', 'content': session.result, 'progress': 100}, ensure_ascii=False)}\n\n"
-            
-            yield f"data: {json.dumps({'step': 'done'})}\n\n"
+            yield from final_messages(session)
             
         except GeneratorExit:
             # 客户端断开连接
             print(f"Client disconnected from session {session_id}")
         except Exception as e:
             print(f"SSE error: {e}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_message({'error': str(e)})
     
     response = Response(generate_progress(), mimetype='text/event-stream')
     response.headers['Cache-Control'] = 'no-cache'
@@ -188,15 +376,73 @@ def get_progress(session_id):
 
 @app.route('/result/<session_id>')
 def get_result(session_id):
-    """获取研究结果"""
-    if session_id not in research_sessions:
-        return jsonify({'error': '会话不存在'}), 404
+    """获取研究结果；format=json时返回结构化报告（章节、引用表、统计信息）"""
+    session = research_sessions.get(session_id)
+    if session is None:
+        # 会话已被淘汰时从落盘结果读取
+        spilled = research_sessions.load_spilled(session_id)
+        if spilled is None:
+            return jsonify({'error': '会话不存在'}), 404
+        if request.args.get('format') == 'json':
+            if spilled['report'] is None:
+                return jsonify({'is_running': False, 'report': None}), 404
+            return jsonify({'is_running': False, 'report': spilled['report']})
+        return jsonify({'is_running': False, 'result': spilled['result']})
+    
+    if request.args.get('format') == 'json':
+        if session.report is None:
+            return jsonify({'is_running': session.is_running, 'report': None}), 202 if session.is_running else 404
+        return jsonify({'is_running': session.is_running, 'report': session.report.to_dict()})
     
-    session = research_sessions[session_id]
     return jsonify({
         'is_running': session.is_running,
         'result': session.result
     })
 
+@app.route('/citations/<session_id>')
+def get_citations(session_id):
+    """获取研究报告的引用表（前端引用弹窗使用）"""
+    session = research_sessions.get(session_id)
+    if session is None:
+        spilled = research_sessions.load_spilled(session_id)
+        if spilled is not None and spilled['report'] is not None:
+            return jsonify({'citations': spilled['report']['citations']})
+    if session is None or session.report is None:
+        return jsonify({'error': '会话不存在或报告尚未生成'}), 404
+    return jsonify({'citations': session.report.citations})
+
+@app.route('/metrics/sessions')
+def session_metrics():
+    """会话指标：会话数、进行中数量、估算内存、进程RSS、淘汰与落盘计数"""
+    return jsonify(research_sessions.stats())
+
+@app.route('/metrics/search')
+def search_metrics():
+    """检索指标：arXiv网关统计，以及启用多后端检索时各后端的调用次数、超时和平均延迟"""
+    return jsonify({'gateway': get_search_gateway().stats(), 'backends': default_backend_stats()})
+
+@app.route('/metrics/queue')
+def queue_metrics():
+    """研究任务池指标：工作线程数、进行中、排队中、拒绝次数和平均研究耗时"""
+    return jsonify(research_pool.stats())
+
+@app.route('/reports/search')
+def search_reports():
+    """全文检索历史研究报告"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': '请输入检索关键词'}), 400
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify({'query': query, 'results': report_store.search(query, limit)})
+
+@app.route('/reports/<int:report_id>')
+def get_report(report_id):
+    """获取一份历史研究报告"""
+    report = report_store.get(report_id)
+    if report is None:
+        return jsonify({'error': '报告不存在'}), 404
+    return jsonify(report)
+
 if __name__ == '__main__':
+    init_services()
     app.run(debug=True, host='0.0.0.0', port=8081)
\ No newline at end of file